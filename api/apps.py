@@ -7,3 +7,10 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.signals
+
+        from django.conf import settings
+
+        if settings.QUERY_PROFILING_SAMPLE_RATE > 0:
+            from api.profiling import install_serializer_timing
+
+            install_serializer_timing()
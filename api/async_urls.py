@@ -0,0 +1,9 @@
+from django.urls import path
+from .async_views import product_list, product_detail, user_cart
+
+
+urlpatterns = [
+    path("products/", product_list, name="async_product_list"),
+    path("products/<int:pk>/", product_detail, name="async_product_detail"),
+    path("cart/", user_cart, name="async_user_cart"),
+]
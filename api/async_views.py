@@ -0,0 +1,131 @@
+"""
+Async variants of the hottest catalog and cart endpoints.
+
+These are plain Django async views, routed under ``/api/async/``; under an
+ASGI server they do not tie up a worker thread while waiting on the
+database. Responses match the DRF views in ``api.views``.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from .authentication import StatelessJWTAuthentication
+from .cache import not_modified, set_validators
+from .compiled import compile_serializer
+from .models import Cart, CartItem, InsufficientStock, Product
+from .pagination import KeysetPagination
+from .renderers import ORJSONRenderer
+from .serializers import CartItemSerializer, CartOperationSerializer, ProductSerializer
+from .views import cart_data, cart_entity_tag, cart_item_rows, parse_product_fields, project_products
+
+KEYSET_COLUMNS = tuple(name.lstrip("-") for name in KeysetPagination.ordering)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(ORJSONRenderer().render(data), status=status_code, content_type="application/json")
+
+
+def async_api_view(methods):
+    """Authenticate with a JWT and map API errors to JSON, like ``APIView``."""
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response(
+                    {"detail": f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+            try:
+                auth = await StatelessJWTAuthentication().aauthenticate(request)
+                if auth is None:
+                    return json_response(
+                        {"detail": "Authentication credentials were not provided."}, status.HTTP_401_UNAUTHORIZED
+                    )
+                request.user = auth[0]
+                request.data = json.loads(request.body) if request.body else {}
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return json_response({"detail": exc.detail}, exc.status_code)
+            except Http404:
+                return json_response({"detail": "No matching object found."}, status.HTTP_404_NOT_FOUND)
+            except ValueError:
+                return json_response({"detail": "Malformed request."}, status.HTTP_400_BAD_REQUEST)
+
+        return wrapper
+
+    return decorator
+
+
+@async_api_view(["GET"])
+async def product_list(request):
+    drf_request = Request(request)
+    fields = parse_product_fields(request.GET.get("fields"))
+    queryset = project_products(Product.objects.defer("search_vector").with_live_stock(), fields, KeysetPagination)
+
+    compiled = compile_serializer(ProductSerializer, tuple(fields) if fields else None, KEYSET_COLUMNS)
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(compiled.rows(queryset), drf_request)
+    return json_response(paginator.get_paginated_response(compiled.data(page)).data)
+
+
+@async_api_view(["GET"])
+async def product_detail(request, pk):
+    fields = parse_product_fields(request.GET.get("fields"))
+    queryset = project_products(Product.objects.defer("search_vector").with_live_stock(), fields, KeysetPagination)
+    try:
+        product = await queryset.aget(pk=pk)
+    except Product.DoesNotExist:
+        raise Http404
+    return json_response(ProductSerializer(product, fields=fields).data)
+
+
+@async_api_view(["GET", "POST", "DELETE"])
+async def user_cart(request):
+    user_id = request.user.id
+
+    if request.method == "GET":
+        try:
+            cart = await Cart.objects.select_related("user").with_totals().aget(user_id=user_id)
+        except Cart.DoesNotExist:
+            raise Http404
+        etag = cart_entity_tag(cart, "json")
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        response = json_response(cart_data(cart, [row async for row in cart_item_rows(cart)]))
+        set_validators(response, etag, private=True)
+        return response
+
+    if request.method == "DELETE":
+        # The body may be any JSON value, such as a list.
+        if not isinstance(request.data, dict):
+            return json_response({"detail": "Expected a JSON object."}, status.HTTP_400_BAD_REQUEST)
+        try:
+            product_id = int(request.data.get("product_id"))
+        except (TypeError, ValueError):
+            raise Http404
+        deleted = await sync_to_async(CartItem.objects.remove)(user_id, [product_id])
+        if not deleted:
+            raise Http404
+        return json_response({"detail": "Item removed from cart"}, status.HTTP_204_NO_CONTENT)
+
+    data = CartOperationSerializer(data=request.data)
+    if not data.is_valid() or data.validated_data["op"] != "add":
+        return json_response(data.errors or {"error": "Only add is supported"}, status.HTTP_400_BAD_REQUEST)
+    # The upsert is a raw statement; Django has no async cursor for it.
+    try:
+        items = await sync_to_async(CartItem.objects.add)(
+            user_id, {data.validated_data["product_id"]: data.validated_data["quantity"]}
+        )
+    except InsufficientStock:
+        return json_response({"error": "Insufficient stock"}, status.HTTP_400_BAD_REQUEST)
+    if not items:
+        raise Http404
+    return json_response(CartItemSerializer(items[0]).data, status.HTTP_201_CREATED)
@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+USER_CLAIMS = ("username", "is_active", "is_staff", "is_superuser")
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the claims in ``USER_CLAIMS``."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from access token claims.
+
+    The active, staff and superuser flags are not taken from the token but
+    from ``get_user_state``, so revoking them takes effect within
+    ``AUTH_USER_STATE_CACHE_TIMEOUT`` seconds rather than when the token
+    expires. Attributes that are not claims are read from the ``User`` row,
+    which is only loaded the first time such an attribute is used.
+    """
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def state(self):
+        return get_user_state(self.id)
+
+    @cached_property
+    def is_active(self):
+        return self.state is not None and self.state["is_active"]
+
+    @cached_property
+    def is_staff(self):
+        return self.state is not None and self.state["is_staff"]
+
+    @cached_property
+    def is_superuser(self):
+        return self.state is not None and self.state["is_superuser"]
+
+    @cached_property
+    def instance(self):
+        return User.objects.get(pk=self.id)
+
+    def __str__(self):
+        return self.username
+
+    def __getattr__(self, attr):
+        if attr.startswith("_") or attr == "token":
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.instance, attr)
+
+
+STATE_FIELDS = ("is_active", "is_staff", "is_superuser")
+
+
+def _state_key(user_id):
+    return f"auth:state:{user_id}"
+
+
+def get_user_state(user_id):
+    """The user's ``STATE_FIELDS`` as a dict, or None if the user is gone; cached for a few seconds."""
+    key = _state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        # False marks a missing user, so that it is cached too.
+        state = User.objects.filter(pk=user_id).values(*STATE_FIELDS).first() or False
+        cache.set(key, state, settings.AUTH_USER_STATE_CACHE_TIMEOUT)
+    return state or None
+
+
+async def aget_user_state(user_id):
+    key = _state_key(user_id)
+    state = await cache.aget(key)
+    if state is None:
+        state = await User.objects.filter(pk=user_id).values(*STATE_FIELDS).afirst() or False
+        await cache.aset(key, state, settings.AUTH_USER_STATE_CACHE_TIMEOUT)
+    return state or None
+
+
+def forget_user_state(user_id):
+    cache.delete(_state_key(user_id))
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that does not load the ``User`` row.
+
+    The user is rebuilt from token claims; its active, staff and superuser
+    flags are read through a short-lived cache (see ``ClaimsUser``). Tokens
+    issued without the claims fall back to the regular database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if "is_active" not in validated_token:
+            return super().get_user(validated_token)
+
+        user = api_settings.TOKEN_USER_CLASS(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+    async def aauthenticate(self, request):
+        """Async counterpart of ``authenticate`` for plain Django async views."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if "is_active" not in validated_token:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+            user = await User.objects.filter(pk=user_id, is_active=True).afirst()
+            if user is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            return user, validated_token
+
+        user = api_settings.TOKEN_USER_CLASS(validated_token)
+        user.state = await aget_user_state(user.id)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user, validated_token
@@ -0,0 +1,221 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from .routers import primary_reads
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def cache_stats():
+    """Hit/miss counters of the catalog cache for this process."""
+    with _stats_lock:
+        return {"hits": _stats["hits"], "misses": _stats["misses"]}
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def _version_key(name):
+    return f"catalog:version:{name}"
+
+
+def _changed_key(name):
+    return f"catalog:changed:{name}"
+
+
+def get_versions(*names):
+    """
+    Current version of each namespace.
+
+    Versions never expire. A namespace whose version was evicted gets a new,
+    time based one, so entries written under the old version stay unreachable.
+    """
+    cache = get_cache()
+    keys = [_version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*names):
+    cache = get_cache()
+    for name in names:
+        try:
+            cache.incr(_version_key(name))
+        except ValueError:
+            cache.set(_version_key(name), time.time_ns(), timeout=None)
+    if settings.DATABASE_REPLICAS:
+        # Replicas may not have the change yet; see ``recently_changed``.
+        cache.set_many({_changed_key(name): True for name in names}, settings.REPLICA_PIN_SECONDS)
+
+
+def recently_changed(*names):
+    """Whether any namespace was bumped within the last ``REPLICA_PIN_SECONDS``."""
+    if not settings.DATABASE_REPLICAS:
+        return False
+    return bool(get_cache().get_many([_changed_key(name) for name in names]))
+
+
+def invalidate_objects(model, pks):
+    """Drop cached lists of ``model`` and the cached detail of each pk."""
+    label = model._meta.model_name
+    bump_versions(f"{label}:list", *(f"{label}:{pk}" for pk in pks))
+
+
+def invalidate_model(model):
+    """Drop every cached response of ``model``."""
+    bump_versions(model._meta.model_name)
+
+
+def invalidate_on_commit(model, pks=None):
+    if pks is None:
+        transaction.on_commit(lambda: invalidate_model(model))
+    else:
+        pks = list(pks)
+        transaction.on_commit(lambda: invalidate_objects(model, pks))
+
+
+def entity_tag(*parts):
+    return quote_etag(hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest())
+
+
+def not_modified(request, etag):
+    """A 304 response if the request's ``If-None-Match`` matches ``etag``, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+    return response
+
+
+def set_validators(response, etag, last_modified=None, private=False):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    # Caches must revalidate every time rather than guess a freshness
+    # lifetime from Last-Modified; the ETag makes that revalidation cheap.
+    patch_cache_control(response, no_cache=True, **{"private" if private else "public": True})
+
+
+def _updated_at(row):
+    if isinstance(row, models.Model):
+        return None if "updated_at" in row.get_deferred_fields() else row.updated_at
+    return getattr(row, "updated_at", None)
+
+
+def latest_update(rows):
+    """Newest ``updated_at`` of the given instance(s) or named rows, skipping those without it."""
+    if rows is None:
+        return None
+    if isinstance(rows, models.Model):
+        rows = [rows]
+    return max((updated for updated in map(_updated_at, rows) if updated is not None), default=None)
+
+
+class CachedResponseMixin:
+    """
+    Caches ``list`` and ``retrieve`` responses of a read-mostly viewset.
+
+    Keys embed the model version plus the list or object version, so writes
+    only have to bump a counter (see ``api.signals``) instead of finding and
+    deleting every cached variant of a page.
+
+    The ETag is derived from the same key, so a matching ``If-None-Match``
+    is answered with a 304 from the version counters alone, without a
+    database query. That holds only as long as every write bumps them,
+    including the stock and reservation counters, which change through
+    ``ProductQuerySet.reserve``, ``rebalance``, ``InventoryShard.objects.take``,
+    expired holds and checkout. Last-Modified is the newest ``updated_at``
+    served; it is sent for information only, because stock changes do not
+    touch it.
+
+    Misses right after a bump are built from the primary, so a lagging
+    replica's rows are never cached under the new version.
+    """
+
+    cache_timeout = None
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return settings.CATALOG_CACHE_TIMEOUT
+
+    def get_cache_key(self, scope):
+        label = self.queryset.model._meta.model_name
+        self.cache_names = [label, f"{label}:{scope}"]
+        versions = ":".join(str(version) for version in get_versions(*self.cache_names))
+        digest = hashlib.md5(self.request.get_full_path().encode()).hexdigest()
+        return f"catalog:response:{label}:{scope}:{versions}:{digest}"
+
+    def get_serializer(self, *args, **kwargs):
+        if args:
+            # The page or instance being served, for Last-Modified.
+            self.served = args[0]
+        return super().get_serializer(*args, **kwargs)
+
+    def cached_response(self, key, build):
+        etag = entity_tag(key, self.request.accepted_renderer.format)
+        response = not_modified(self.request, etag)
+        if response is not None:
+            return response
+
+        cache = get_cache()
+        entry = cache.get(key)
+        if entry is not None:
+            _record("hits")
+            data, last_modified = entry
+            response = Response(data)
+        else:
+            _record("misses")
+            self.served = None
+            with primary_reads() if recently_changed(*self.cache_names) else nullcontext():
+                response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            if response.streaming:
+                # Too large to cache, but the key still identifies it.
+                set_validators(response, etag)
+                return response
+            last_modified = latest_update(self.served)
+            cache.set(key, (response.data, last_modified), self.get_cache_timeout())
+        set_validators(response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_cache_key("list")
+        return self.cached_response(key, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        # Object versions are bumped under the primary key as written by
+        # str(), so another spelling ("07") would never see a bump.
+        try:
+            canonical = str(self.queryset.model._meta.pk.to_python(lookup))
+        except ValidationError:
+            canonical = None
+        if canonical != lookup:
+            raise NotFound()
+        key = self.get_cache_key(lookup)
+        return self.cached_response(key, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,167 @@
+import csv
+import json
+import re
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from rest_framework import serializers
+
+from .cache import invalidate_on_commit
+from .models import Category, Product
+from .serializers import ProductSerializer
+
+FORMATS = ("csv", "jsonl")
+EXPORT_FIELDS = ("id", "name", "description", "price", "stock", "category")
+UPDATE_FIELDS = ("name", "description", "price", "stock", "category", "updated_at")
+MAX_REPORTED_ERRORS = 100
+
+
+class ProductImportSerializer(ProductSerializer):
+    id = serializers.IntegerField(required=False, min_value=1)
+    category = serializers.CharField(max_length=120, required=False, allow_null=True)
+
+
+# Bytes that are not UTF-8, as decoded with errors="surrogateescape".
+UNDECODABLE = re.compile("[\udc80-\udcff]")
+
+
+def read_rows(lines, file_format):
+    """
+    Yield one dict per record of a CSV or JSON Lines text stream.
+
+    Records that cannot be read (malformed JSON or CSV, or text that was not
+    UTF-8 when ``lines`` is decoded with ``errors="surrogateescape"``) are
+    yielded as a ``ValidationError`` in their place, so the other records are
+    still imported and the bad ones are reported by number.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as exc:
+                yield serializers.ValidationError(f"Invalid CSV: {exc}")
+                continue
+            if any(isinstance(value, str) and UNDECODABLE.search(value) for value in row.values()):
+                yield serializers.ValidationError("Not valid UTF-8.")
+                continue
+            yield {key: value for key, value in row.items() if value != ""}
+    else:
+        for line in lines:
+            if not line.strip():
+                continue
+            if UNDECODABLE.search(line):
+                yield serializers.ValidationError("Not valid UTF-8.")
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield serializers.ValidationError(f"Invalid JSON: {exc}")
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _resolve_categories(names, category_map):
+    missing = {name for name in names if name and name not in category_map}
+    if missing:
+        Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+        category_map.update(Category.objects.filter(name__in=missing).values_list("name", "id"))
+        invalidate_on_commit(Category)
+
+
+def _reset_id_sequence():
+    # Explicit ids do not advance the sequence, so new rows could collide.
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Product]):
+            cursor.execute(sql)
+
+
+def import_products(rows, chunk_size=1000):
+    """
+    Validate and upsert product rows in chunks.
+
+    Rows with an ``id`` update that product (or create it with that id), the
+    others are inserted; when a chunk names an id more than once, its last row
+    wins. The stock of sharded products is spread over their shards. Invalid
+    rows are skipped and reported by number.
+    """
+    validator = ProductImportSerializer()
+    category_map = dict(Category.objects.values_list("name", "id"))
+    imported, rejected, errors = 0, 0, []
+
+    numbered = enumerate(rows, start=1)
+    for chunk in _chunks(numbered, chunk_size):
+        valid = []
+        for number, row in chunk:
+            try:
+                if isinstance(row, serializers.ValidationError):
+                    raise row
+                valid.append(validator.run_validation(row))
+            except serializers.ValidationError as exc:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": number, "errors": exc.detail})
+
+        if not valid:
+            continue
+        with transaction.atomic():
+            _resolve_categories([data.get("category") for data in valid], category_map)
+            products = []
+            for data in valid:
+                category = data.pop("category", None)
+                products.append(Product(**data, category_id=category_map.get(category)))
+
+            # ON CONFLICT cannot update the same row twice in one statement.
+            upserts = {product.id: product for product in products if product.id is not None}
+            if upserts:
+                Product.objects.bulk_create(
+                    upserts.values(),
+                    update_conflicts=True,
+                    unique_fields=["id"],
+                    update_fields=UPDATE_FIELDS,
+                )
+                _reset_id_sequence()
+                # Their stock lives in the shards; the column was only overwritten.
+                for pid in Product.objects.filter(id__in=upserts, shards__gt=0).values_list("id", flat=True):
+                    Product.objects.rebalance(pid, stock=upserts[pid].stock)
+            Product.objects.bulk_create([product for product in products if product.id is None])
+            invalidate_on_commit(Product)
+        imported += len(products)
+
+    return {"imported": imported, "rejected": rejected, "errors": errors}
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_products(file_format, chunk_size=2000):
+    """Yield the catalog as CSV or JSON Lines, one line at a time."""
+    rows = (
+        Product.objects.with_live_stock()
+        .order_by("id")
+        .values_list("id", "name", "description", "price", "live_stock", "category__name")
+        .iterator(chunk_size=chunk_size)
+    )
+    if file_format == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            yield encoder.encode(dict(zip(EXPORT_FIELDS, row))) + "\n"
@@ -0,0 +1,225 @@
+"""
+Read paths of model serializers compiled to plain functions over rows.
+
+``compile_serializer`` generates one function per serializer (and field
+selection) that turns a ``values_list()`` row into the dict the serializer
+would return, so hot listings skip model instances and DRF's per-field
+attribute lookups. Fields that are not plain columns must be described in
+the serializer's ``compiled_fields``: ``{name: (columns, function)}``,
+where the function gets those columns' values and returns the output.
+"""
+import decimal
+import functools
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .profiling import serializing
+from .renderers import StreamingJSONListRenderer
+
+# Fields whose to_representation returns column values unchanged.
+PASSTHROUGH_FIELDS = {
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+}
+
+
+class CompiledSerializer:
+    def __init__(self, columns, to_representation):
+        self.columns = columns
+        self.to_representation = to_representation
+
+    def rows(self, queryset):
+        return queryset.values_list(*self.columns, named=True)
+
+    def data(self, rows):
+        to_representation = self.to_representation
+        # DateTimeField looks this up for every value.
+        current = timezone.get_current_timezone() if settings.USE_TZ else None
+        with serializing():
+            return [to_representation(row, current) for row in rows]
+
+    def batches(self, rows, size):
+        """Serialized lists of up to ``size`` rows, consuming ``rows`` lazily."""
+        rows = iter(rows)
+        while batch := list(islice(rows, size)):
+            yield self.data(batch)
+
+
+def decimal_to_string(field):
+    """``field.to_representation`` for Decimals, without its per-call context copy, or None."""
+    coerce = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce or field.localize or field.decimal_places is None or field.normalize_output:
+        return None
+    exponent = decimal.Decimal(".1") ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return f"{value.quantize(exponent, rounding=field.rounding, context=context):f}"
+
+    return convert
+
+
+def datetime_to_string(field):
+    """``field.to_representation`` for ISO 8601 output in the current timezone, or None."""
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601 or hasattr(field, "timezone"):
+        return None
+
+    def convert(value, current):
+        if current is None or not timezone.is_aware(value):
+            return field.to_representation(value)
+        try:
+            value = value.astimezone(current).isoformat()
+        except OverflowError:
+            return field.to_representation(value)
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    return convert
+
+
+@functools.lru_cache(maxsize=128)
+def compile_serializer(serializer_class, fields=None, extra=()):
+    """
+    Compile ``serializer_class``, restricted to ``fields`` if given.
+
+    ``extra`` columns are fetched but not serialized, such as the keyset
+    columns a paginator needs. Raises ImproperlyConfigured for fields that
+    cannot be read from columns.
+    """
+    serializer = serializer_class(fields=list(fields)) if fields else serializer_class()
+    model = serializer.Meta.model
+    computed = getattr(serializer_class, "compiled_fields", {})
+    columns = []
+    namespace = {}
+    # Fields whose converter also takes the current timezone.
+    zoned = set()
+
+    def column(name):
+        if name not in columns:
+            columns.append(name)
+        return f"row[{columns.index(name)}]"
+
+    items = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in computed:
+            sources, function = computed[name]
+            namespace[f"f_{name}"] = function
+            items.append(f"{name!r}: f_{name}({', '.join(column(source) for source in sources)})")
+            continue
+
+        if isinstance(field, serializers.SerializerMethodField) or len(field.source_attrs) != 1:
+            raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} needs a compiled_fields entry.")
+        if type(field) in PASSTHROUGH_FIELDS or (
+            type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None
+        ):
+            convert = None
+        elif type(field) is serializers.DecimalField:
+            convert = decimal_to_string(field) or field.to_representation
+        elif type(field) is serializers.DateTimeField:
+            convert = datetime_to_string(field)
+            if convert is None:
+                convert = field.to_representation
+            else:
+                zoned.add(name)
+        elif isinstance(field, (serializers.RelatedField, serializers.BaseSerializer)):
+            raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} needs a compiled_fields entry.")
+        else:
+            convert = field.to_representation
+
+        try:
+            value = column(model._meta.get_field(field.source).attname)
+        except FieldDoesNotExist:
+            # An annotation.
+            value = column(field.source)
+        if convert is None:
+            items.append(f"{name!r}: {value}")
+        else:
+            namespace[f"f_{name}"] = convert
+            args = f"{value}, current" if name in zoned else value
+            items.append(f"{name!r}: None if {value} is None else f_{name}({args})")
+
+    for name in extra:
+        column(name)
+    source = "def to_representation(row, current):\n    return {" + ", ".join(items) + "}\n"
+    exec(source, namespace)
+    return CompiledSerializer(columns, namespace["to_representation"])
+
+
+class CompiledListMixin:
+    """
+    Builds ``list`` responses with the compiled serializer.
+
+    With ``streamed`` set, unpaginated lists and JSON pages of at least
+    ``STREAMING_LIST_MIN_ROWS`` rows are streamed from a server-side cursor
+    instead of being built in memory. Streamed pages put ``next`` after the
+    results, since it is only known once they are fetched.
+    """
+
+    streamed = False
+
+    def get_compiled_serializer(self, fields=None):
+        ordering = getattr(self.pagination_class, "ordering", ())
+        return compile_serializer(self.get_serializer_class(), fields, tuple(name.lstrip("-") for name in ordering))
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        rows = compiled.rows(self.filter_queryset(self.get_queryset()))
+        if self.should_stream():
+            return self.stream_list(compiled, rows)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            # Read by CachedResponseMixin for Last-Modified.
+            self.served = page
+            return self.get_paginated_response(compiled.data(page))
+        self.served = rows = list(rows)
+        return Response(compiled.data(rows))
+
+    def should_stream(self):
+        renderer = self.request.accepted_renderer
+        if not self.streamed or not isinstance(renderer, JSONRenderer):
+            return False
+        if renderer.get_indent(self.request.accepted_media_type, {}) is not None:
+            return False
+        if self.paginator is None:
+            return True
+        return (
+            hasattr(self.paginator, "stream_queryset")
+            and self.paginator.get_page_size(self.request) >= settings.STREAMING_LIST_MIN_ROWS
+        )
+
+    def stream_list(self, compiled, rows):
+        # The body is fetched after the view returns, outside any routing
+        # the view applied, so pin the database now.
+        rows = rows.using(rows.db)
+        renderer = StreamingJSONListRenderer()
+        chunk_size = settings.STREAMING_LIST_CHUNK_SIZE
+        paginator = self.paginator
+        if paginator is None:
+            body = renderer.render_stream(compiled.batches(rows.iterator(chunk_size=chunk_size), chunk_size))
+        else:
+            # Decodes the cursor now; only fetching the rows is deferred.
+            page = paginator.get_page_queryset(rows, self.request)
+            fetched = paginator.stream_queryset(page, chunk_size)
+            body = renderer.render_stream(
+                compiled.batches(fetched, chunk_size),
+                prefix=b'{"results":',
+                suffix=lambda: b"," + renderer.render({"next": paginator.get_next_link()})[1:],
+            )
+        return StreamingHttpResponse(body, content_type=renderer.media_type)
@@ -0,0 +1,200 @@
+"""
+Response compression negotiated from ``Accept-Encoding``.
+
+zstd and brotli are used when their packages (``zstandard``, ``brotli``)
+are installed, gzip always. Buffered responses are compressed once they
+reach ``COMPRESSION_MIN_SIZE`` bytes. Streamed responses are compressed as
+they go and flushed after the first chunk and then every
+``COMPRESSION_FLUSH_SIZE`` bytes of input, so the client gets data as
+soon as it is produced without paying for a flush per tiny chunk.
+"""
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class GzipEncoder:
+    def __init__(self):
+        # wbits=31 writes the gzip header and trailer.
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    def __init__(self):
+        # Quality 11 is meant for static assets; 5 compresses better than
+        # gzip at a similar speed.
+        self.compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# In order of preference when the client accepts several equally.
+ENCODERS = {
+    name: encoder
+    for name, encoder, available in (
+        ("zstd", ZstdEncoder, zstandard is not None),
+        ("br", BrotliEncoder, brotli is not None),
+        ("gzip", GzipEncoder, True),
+    )
+    if available
+}
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` from an ``Accept-Encoding`` header."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """The best installed coding the client accepts, or None."""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in ENCODERS:
+        q = accepted.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class StreamCompressor:
+    def __init__(self, encoder, flush_size):
+        self.encoder = encoder
+        self.flush_size = flush_size
+        self.pending = None
+
+    def feed(self, chunk):
+        data = self.encoder.compress(chunk)
+        if self.pending is None or self.pending + len(chunk) >= self.flush_size:
+            self.pending = 0
+            return data + self.encoder.flush()
+        self.pending += len(chunk)
+        return data
+
+    def compress(self, chunks):
+        for chunk in chunks:
+            data = self.feed(chunk)
+            if data:
+                yield data
+        yield self.encoder.finish()
+
+    async def acompress(self, chunks):
+        async for chunk in chunks:
+            data = self.feed(chunk)
+            if data:
+                yield data
+        yield self.encoder.finish()
+
+
+class CompressionMiddleware:
+    """Compresses JSON and text responses with the best coding the client accepts."""
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        coding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if coding is None:
+            return response
+        encoder = ENCODERS[coding]()
+
+        if response.streaming:
+            stream = StreamCompressor(encoder, settings.COMPRESSION_FLUSH_SIZE)
+            if response.is_async:
+                response.streaming_content = stream.acompress(response.streaming_content)
+            else:
+                response.streaming_content = stream.compress(response.streaming_content)
+            # The length of the compressed stream is not known in advance.
+            del response.headers["Content-Length"]
+        else:
+            compressed = encoder.compress(response.content) + encoder.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # The body is no longer byte-for-byte the one the ETag names.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = coding
+        return response
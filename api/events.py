@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import OrderEvent
+from .tasks import PROCESSING_QUEUED_KEY, process_placed_orders
+
+
+def publish_order_placed(order_id):
+    """
+    Record an order-placed event in the current transaction.
+
+    The event is stored with the order, so it survives anything that happens
+    after the commit; processing is queued once the transaction commits.
+    """
+    OrderEvent.objects.create(order_id=order_id)
+    transaction.on_commit(queue_processing)
+
+
+def queue_processing():
+    """
+    Queue ``process_placed_orders`` to run in ``ORDER_EVENTS_MAX_DELAY``
+    seconds, unless that is already queued, so that events published in the
+    meantime are handled as one batch. The beat schedule covers events whose
+    task was never queued.
+    """
+    if cache.add(PROCESSING_QUEUED_KEY, True, settings.ORDER_EVENTS_MAX_DELAY):
+        process_placed_orders.apply_async(countdown=settings.ORDER_EVENTS_MAX_DELAY)
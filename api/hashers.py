@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id with its cost taken from ``settings.PASSWORD_ARGON2``.
+
+    Existing hashes made with other parameters, or with another hasher in
+    ``PASSWORD_HASHERS``, are upgraded the next time their owner logs in.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2["time_cost"]
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2["memory_cost"]
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2["parallelism"]
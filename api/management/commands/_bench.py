@@ -0,0 +1,158 @@
+"""Helpers shared by the ``bench_*`` management commands."""
+import random
+import statistics
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import Cart, CartItem, Category, Order, OrderItem, Product, User
+
+
+WORDS = (
+    "garden hose lamp desk chair table steel wooden cotton leather blue red green black white "
+    "small large portable wireless electric manual outdoor indoor kitchen office kids travel "
+    "premium classic modern vintage compact heavy light soft durable waterproof organic smart "
+    "bottle bag shoe shirt jacket watch phone cable charger speaker headphone keyboard mouse "
+    "monitor camera lens tripod tent stove knife pan pot mug plate towel pillow blanket rug"
+).split()
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back.
+
+    Requests built with ``APIRequestFactory`` use the ``testserver`` host, so
+    it is allowed for the duration of the block.
+    """
+    try:
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def seed_catalog(size, categories=20, batch_size=5000):
+    rng = random.Random(size)
+    suffix = uuid.uuid4().hex[:8]
+    category_objs = Category.objects.bulk_create(
+        Category(name=f"bench-{suffix}-{i}") for i in range(categories)
+    )
+    for start in range(0, size, batch_size):
+        Product.objects.bulk_create(
+            Product(
+                name=" ".join(rng.choices(WORDS, k=3)).capitalize(),
+                description=" ".join(rng.choices(WORDS, k=60)),
+                price=Decimal(i % 10000) / 100 + 1,
+                stock=i % 500,
+                category=category_objs[i % categories],
+            )
+            for i in range(start, min(start + batch_size, size))
+        )
+    return category_objs
+
+
+def seed_users(count, prefix, password=None, batch_size=1000):
+    """
+    Insert users and their carts with bulk_create.
+
+    The password is hashed once and shared, which is what makes this fast;
+    ``bulk_create`` skips the signal that normally creates carts.
+    """
+    password_hash = make_password(password)
+    users = []
+    for start in range(0, count, batch_size):
+        batch = User.objects.bulk_create(
+            User(
+                username=f"{prefix}-{i}@example.com",
+                email=f"{prefix}-{i}@example.com",
+                password=password_hash,
+            )
+            for i in range(start, min(start + batch_size, count))
+        )
+        for cart in Cart.objects.bulk_create(Cart(user=user) for user in batch):
+            cart.user.cart = cart
+        users.extend(batch)
+    return users
+
+
+def fill_carts(users, products, per_cart, rng, batch_size=5000):
+    """Put ``per_cart`` distinct products, given as ``(id, price)``, in each cart."""
+    items = [
+        CartItem(cart=user.cart, product_id=product_id, quantity=rng.randint(1, 3))
+        for user in users
+        for product_id, _ in rng.sample(products, per_cart)
+    ]
+    CartItem.objects.bulk_create(items, batch_size=batch_size)
+
+
+def seed_orders(users, products, per_user, rng, lines=3, batch_size=5000):
+    """Create order history without touching stock."""
+    orders, order_items = [], []
+    for user in users:
+        for _ in range(per_user):
+            order = Order(user=user, total_price=0)
+            for product_id, price in rng.sample(products, lines):
+                quantity = rng.randint(1, 3)
+                order_items.append(OrderItem(
+                    order=order, product_id=product_id, quantity=quantity, price=price, line_total=price * quantity
+                ))
+                order.total_price += price * quantity
+            orders.append(order)
+    Order.objects.bulk_create(orders, batch_size=batch_size)
+    for item in order_items:
+        item.created_at = item.order.created_at
+    OrderItem.objects.bulk_create(order_items, batch_size=batch_size)
+    return orders
+
+
+def seed_store(users, products, prefix, password, categories=20, items_per_cart=3, orders_per_user=2, seed=0):
+    """Seed a catalog, users with filled carts and their order history; returns the users."""
+    rng = random.Random(seed)
+    category_objs = seed_catalog(products, categories)
+    catalog = list(Product.objects.filter(category__in=category_objs).values_list("id", "price"))
+    user_objs = seed_users(users, prefix, password)
+    fill_carts(user_objs, catalog, items_per_cart, rng)
+    seed_orders(user_objs, catalog, orders_per_user, rng)
+    return user_objs
+
+
+def bench_user(**extra):
+    return User.objects.create_user(username=f"bench-{uuid.uuid4().hex}", password=None, **extra)
+
+
+def call_view(view, path, user, method="get", data=None):
+    factory = APIRequestFactory()
+    if method == "get":
+        request = factory.get(path)
+    else:
+        request = getattr(factory, method)(path, data, format="json")
+    force_authenticate(request, user=user)
+    response = view(request)
+    if response.streaming:
+        # Fetch the body, so it is part of what is measured.
+        b"".join(response.streaming_content)
+    else:
+        response.render()
+    return response
+
+
+def measure(fn, repeat=5):
+    """Median wall time in ms and the query count of one call of ``fn``."""
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            result = fn()
+            timings.append((time.perf_counter() - start) * 1000)
+    return {"ms": statistics.median(timings), "queries": len(ctx), "result": result}
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import partitions
+from api.models import RollupMark
+
+
+class Command(BaseCommand):
+    help = (
+        "Detach the monthly order and order-line partitions before --before (YYYY-MM) from the "
+        "live tables. Detached months are kept as plain tables unless --drop is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", required=True, help="First month to keep, as YYYY-MM.")
+        parser.add_argument("--drop", action="store_true", help="Drop the detached tables.")
+        parser.add_argument(
+            "--force", action="store_true", help="Archive even months the sales rollups have not covered yet."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            before = datetime.strptime(options["before"], "%Y-%m").replace(tzinfo=timezone.utc)
+        except ValueError:
+            raise CommandError(f"Invalid --before {options['before']!r}; expected YYYY-MM.")
+        if not partitions.is_partitioned():
+            raise CommandError("Orders are not partitioned; see ORDER_PARTITIONING.")
+
+        # Detached orders can no longer be rolled up into the sales reports.
+        rolled_up = RollupMark.objects.filter(name="sales").values_list("position", flat=True).first()
+        if not options["force"] and (rolled_up is None or rolled_up < before):
+            raise CommandError(
+                f"Sales are only rolled up to {rolled_up or 'nothing'}; run backfill_sales_rollups or use --force."
+            )
+
+        months = partitions.archive(before, drop=options["drop"])
+        if not months:
+            self.stdout.write("Nothing to archive.")
+        for month in months:
+            action = "Dropped" if options["drop"] else "Detached"
+            self.stdout.write(f"{action} api_order_p{month:%Y_%m} and api_orderitem_p{month:%Y_%m}.")
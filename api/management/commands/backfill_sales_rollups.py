@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.models import RollupMark
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold order history into the hourly and daily sales rollups, one chunk per transaction, "
+        "resuming from the high-water mark. --rebuild empties the rollups and starts from the "
+        "first order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-hours", type=float, default=24.0)
+        parser.add_argument("--until", help="ISO timestamp to stop at; default SALES_ROLLUP_LAG seconds ago.")
+        parser.add_argument("--rebuild", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["until"]:
+            until = parse_datetime(options["until"])
+            if until is None:
+                raise CommandError(f"Invalid --until {options['until']!r}.")
+            if timezone.is_naive(until):
+                until = timezone.make_aware(until)
+        else:
+            until = timezone.now() - timedelta(seconds=settings.SALES_ROLLUP_LAG)
+        if options["chunk_hours"] <= 0:
+            raise CommandError("--chunk-hours must be positive.")
+
+        if options["rebuild"]:
+            RollupMark.objects.rebuild("sales")
+        chunks = RollupMark.objects.advance("sales", until, timedelta(hours=options["chunk_hours"]))
+        position = RollupMark.objects.filter(name="sales").values_list("position", flat=True).first()
+        self.stdout.write(f"Rolled up {chunks} chunks; sales are complete up to {position or 'the first order'}.")
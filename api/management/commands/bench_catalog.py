@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from api.views import ProductViewSet
+
+from ._bench import bench_user, call_view, measure, rolled_back, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Compare the unpaginated product listing with keyset pages at several catalog sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--pages", type=int, default=20, help="Pages to walk with the cursor.")
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--fields", default="id,name,price,stock,category")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        # cache_timeout=0 keeps the response cache out of the measurements.
+        unpaginated = ProductViewSet.as_view({"get": "list"}, pagination_class=None, cache_timeout=0)
+        paginated = ProductViewSet.as_view({"get": "list"}, cache_timeout=0)
+        page_size = options["page_size"]
+
+        for size in options["sizes"]:
+            with rolled_back():
+                seed_catalog(size)
+                user = bench_user()
+
+                full = measure(lambda: call_view(unpaginated, "/api/products/", user), options["repeat"])
+                self.report(size, "full table", full)
+
+                path = f"/api/products/?page_size={page_size}"
+                first = measure(lambda: call_view(paginated, path, user), options["repeat"])
+                self.report(size, "keyset first page", first)
+
+                projected = f"{path}&fields={options['fields']}"
+                self.report(size, "keyset + fields", measure(lambda: call_view(paginated, projected, user), options["repeat"]))
+
+                def walk():
+                    url = path
+                    for _ in range(options["pages"]):
+                        url = call_view(paginated, url, user).data["next"]
+                        if url is None:
+                            break
+                    return url
+
+                deep = measure(walk, options["repeat"])
+                deep["ms"] /= options["pages"]
+                deep["queries"] /= options["pages"]
+                self.report(size, f"keyset avg of {options['pages']} pages", deep)
+
+    def report(self, size, label, stats):
+        self.stdout.write(f"{size:>9} products  {label:<28} {stats['ms']:>10.2f} ms  {stats['queries']:>5} queries")
@@ -0,0 +1,71 @@
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from api.models import CartItem, Product, User
+from api.views import UserOrderView
+
+from ._bench import call_view, seed_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Check out a single hot product from many threads and report orders/sec, once per "
+        "inventory shard count (0 keeps the stock on the product row)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=500)
+        parser.add_argument("--stock", type=int, default=400)
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--shards", type=int, nargs="+", default=[1, 16])
+
+    def handle(self, *args, **options):
+        for shards in options["shards"]:
+            self.stdout.write(f"-- {shards} shards")
+            self.run(shards, options)
+
+    def run(self, shards, options):
+        prefix = f"bench-{uuid.uuid4().hex[:8]}"
+        product = Product.objects.create(
+            name=f"{prefix}-hot", description="", price=Decimal("9.99"), stock=options["stock"]
+        )
+        Product.objects.rebalance(product.pk, shards)
+        users = seed_users(options["buyers"], prefix)
+        CartItem.objects.bulk_create(
+            CartItem(cart=user.cart, product=product, quantity=1) for user in users
+        )
+        view = UserOrderView.as_view()
+
+        def checkout(user):
+            try:
+                return call_view(view, "/api/orders/", user, method="post").status_code
+            finally:
+                connection.close()
+
+        try:
+            # Without a broker the order e-mails are sent in-process; keep them off the console.
+            with override_settings(
+                ALLOWED_HOSTS=["testserver"], EMAIL_BACKEND="django.core.mail.backends.dummy.EmailBackend"
+            ):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(options["threads"]) as pool:
+                    statuses = Counter(pool.map(checkout, users))
+                elapsed = time.perf_counter() - start
+
+            remaining = Product.objects.get(pk=product.pk).current_stock
+            sold = options["stock"] - remaining
+            self.stdout.write(f"responses: {dict(statuses)}")
+            self.stdout.write(f"sold {sold} of {options['stock']}, remaining stock {remaining}")
+            self.stdout.write(f"{statuses[201] / elapsed:.1f} orders/sec over {elapsed:.2f}s")
+            if sold != statuses[201] or remaining < 0:
+                self.stderr.write("stock and successful orders disagree")
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+            product.delete()
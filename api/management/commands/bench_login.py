@@ -0,0 +1,48 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from api.views import UserLoginView
+
+from ._bench import rolled_back, seed_users
+
+
+class Command(BaseCommand):
+    help = "Report single-core logins/sec for each configured password hasher."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=3.0, help="Time spent on each hasher.")
+        parser.add_argument("--hashers", nargs="+", help="Defaults to the PASSWORD_HASHERS setting.")
+
+    def handle(self, *args, **options):
+        password = "bench-" + uuid.uuid4().hex
+        # The benchmark logs in far faster than the configured rates allow.
+        view = UserLoginView.as_view(throttle_classes=[])
+        self.stdout.write(f"{'hasher':<52} {'hashes/s':>10} {'logins/s':>10}")
+        for path in options["hashers"] or settings.PASSWORD_HASHERS:
+            with override_settings(PASSWORD_HASHERS=[path]), rolled_back():
+                hasher = get_hasher()
+                encoded = make_password(password)
+                hashes = self.rate(lambda: hasher.verify(password, encoded), options["seconds"])
+
+                user = seed_users(1, f"bench-{uuid.uuid4().hex[:8]}", password)[0]
+                data = {"email": user.email, "password": password}
+                logins = self.rate(lambda: self.login(view, data), options["seconds"])
+            self.stdout.write(f"{path:<52} {hashes:>10.1f} {logins:>10.1f}")
+
+    def login(self, view, data):
+        response = view(APIRequestFactory().post("/api/auth/login/", data, format="json"))
+        assert response.status_code == 200, response.data
+
+    def rate(self, fn, seconds):
+        calls = 0
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < seconds:
+            fn()
+            calls += 1
+        return calls / elapsed
@@ -0,0 +1,281 @@
+import json
+import random
+import re
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client as DjangoClient
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from api.authentication import ClaimsRefreshToken
+from api.models import Product, User
+
+from ._bench import rolled_back, seed_store
+from .loadtest import Client as HTTPClient
+
+DEFAULT_MIX = "login=1,browse=5,product=3,cart_add=3,checkout=1,orders=1"
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class InProcessSession:
+    """Calls the app through the Django test client, counting queries directly."""
+
+    def __init__(self, user, password):
+        self.user, self.password = user, password
+        self.client = DjangoClient()
+        token = ClaimsRefreshToken.for_user(user).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def request(self, method, path, payload=None, auth=True):
+        headers = self.headers if auth else {}
+        with CaptureQueriesContext(connection) as queries:
+            if method == "GET":
+                response = self.client.get(path, headers=headers)
+            else:
+                response = self.client.post(path, payload, content_type="application/json", headers=headers)
+        return response.status_code, response.content, len(queries)
+
+
+class HTTPSession:
+    """
+    Calls a running server over keep-alive HTTP.
+
+    Query counts come from the ``Server-Timing`` header, so they are only
+    known for requests the server's profiling middleware sampled.
+    """
+
+    def __init__(self, base_url, user, password):
+        self.user, self.password = user, password
+        self.client = HTTPClient(base_url)
+        status, data, _ = self.request(
+            "POST", "/api/auth/login/", {"email": user.email, "password": password}, auth=False
+        )
+        if status != 200:
+            raise CommandError(f"Login as {user.email} failed with HTTP {status}")
+        self.token = json.loads(data)["access"]
+
+    def request(self, method, path, payload=None, auth=True):
+        self.client.token = self.token if auth else None
+        status, data, headers = self.client.request(method, path, payload, with_headers=True)
+        match = SERVER_TIMING_QUERIES.search(headers.get("Server-Timing", ""))
+        return status, data, int(match.group(1)) if match else None
+
+
+def login(session, rng, products):
+    return [session.request(
+        "POST", "/api/auth/login/", {"email": session.user.email, "password": session.password}, auth=False
+    )]
+
+
+def browse(session, rng, products):
+    return [session.request("GET", "/api/products/?page_size=20&fields=id,name,price,stock")]
+
+
+def product(session, rng, products):
+    return [session.request("GET", f"/api/products/{rng.choice(products)}/")]
+
+
+def cart_add(session, rng, products):
+    return [session.request("POST", "/api/cart/", {"product_id": rng.choice(products), "quantity": 1})]
+
+
+def checkout(session, rng, products):
+    return [
+        session.request("POST", "/api/cart/", {"product_id": rng.choice(products), "quantity": 1}),
+        session.request("POST", "/api/orders/"),
+    ]
+
+
+def orders(session, rng, products):
+    return [session.request("GET", "/api/orders/")]
+
+
+SCENARIOS = {fn.__name__: fn for fn in (login, browse, product, cart_add, checkout, orders)}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise CommandError(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}.")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def summarize(samples, elapsed):
+    latencies = [sample["seconds"] for sample in samples]
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    counted = sum(sample["counted"] for sample in samples)
+    return {
+        "operations": len(samples),
+        "requests": sum(sample["requests"] for sample in samples),
+        "throughput": len(samples) / elapsed,
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000,
+        "queries_per_request": sum(sample["queries"] for sample in samples) / counted if counted else None,
+        "statuses": dict(sum((sample["statuses"] for sample in samples), Counter())),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a weighted mix of login, browse, cart and checkout operations and report latency "
+        "percentiles, throughput and queries per request. Without --url the data is seeded and "
+        "the mix replayed in-process inside a rolled back transaction; with --url it drives a "
+        "running server whose database was seeded by seed_store; raise LOGIN_IP_RATE and "
+        "LOGIN_ACCOUNT_RATE on that server if the mix includes logins."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Default {DEFAULT_MIX}.")
+        parser.add_argument("--duration", type=float, default=30.0)
+        parser.add_argument("--url", help="Base URL of a running server.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Sessions in --url mode.")
+        parser.add_argument("--prefix", help="seed_store prefix of the users to log in as (--url mode).")
+        parser.add_argument("--password", default="bench-pass")
+        parser.add_argument("--users", type=int, default=200, help="Users seeded in-process.")
+        parser.add_argument("--products", type=int, default=5000, help="Products seeded in-process.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument("--baseline", help="Earlier --output file to compare against.")
+
+    def handle(self, *args, **options):
+        started_at = datetime.now(timezone.utc)
+        if options["url"]:
+            samples, elapsed = self.run_http(options)
+        else:
+            samples, elapsed = self.run_in_process(options)
+
+        results = {name: summarize(rows, elapsed) for name, rows in sorted(samples.items())}
+        results["all"] = summarize([row for rows in samples.values() for row in rows], elapsed)
+        self.report(results, options["baseline"])
+
+        if options["output"]:
+            document = {
+                "revision": git_revision(),
+                "started_at": started_at.isoformat(),
+                "target": options["url"] or "in-process",
+                "mix": options["mix"],
+                "duration": elapsed,
+                "concurrency": options["concurrency"] if options["url"] else 1,
+                "results": results,
+            }
+            with open(options["output"], "w") as fh:
+                json.dump(document, fh, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def run_in_process(self, options):
+        # Throttling would reject the repeated logins long before the mix ends.
+        rest_framework = {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {"login_ip": None, "login_account": None}}
+        with rolled_back(), override_settings(REST_FRAMEWORK=rest_framework):
+            users = seed_store(
+                options["users"], options["products"], f"mix-{uuid.uuid4().hex[:8]}", options["password"],
+                seed=options["seed"],
+            )
+            products = self.stocked_products()
+            sessions = [InProcessSession(user, options["password"]) for user in users]
+            return self.replay(lambda rng: rng.choice(sessions), products, options)
+
+    def run_http(self, options):
+        if not options["prefix"]:
+            raise CommandError("--url needs the --prefix used by seed_store.")
+        users = list(User.objects.filter(username__startswith=f"{options['prefix']}-")[: options["concurrency"]])
+        if not users:
+            raise CommandError(f"No users with prefix {options['prefix']!r}; run seed_store first.")
+        products = self.stocked_products()
+        results, lock = [], threading.Lock()
+
+        def worker(index):
+            session = HTTPSession(options["url"], users[index % len(users)], options["password"])
+            outcome = self.replay(lambda rng: session, products, options, seed=options["seed"] + index)
+            with lock:
+                results.append(outcome)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options["concurrency"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if not results:
+            raise CommandError("No session completed.")
+
+        samples = defaultdict(list)
+        for rows, _ in results:
+            for name, entries in rows.items():
+                samples[name].extend(entries)
+        return samples, max(elapsed for _, elapsed in results)
+
+    def stocked_products(self):
+        products = list(Product.objects.filter(stock__gt=0).order_by("-id").values_list("id", flat=True)[:10_000])
+        if not products:
+            raise CommandError("No products in stock; seed some first.")
+        return products
+
+    def replay(self, pick_session, products, options, seed=None):
+        rng = random.Random(options["seed"] if seed is None else seed)
+        names, weights = zip(*options["mix"].items())
+        samples = defaultdict(list)
+        start = time.perf_counter()
+        deadline = start + options["duration"]
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            session = pick_session(rng)
+            began = time.perf_counter()
+            responses = SCENARIOS[name](session, rng, products)
+            counts = [queries for _, _, queries in responses if queries is not None]
+            samples[name].append({
+                "seconds": time.perf_counter() - began,
+                "requests": len(responses),
+                "queries": sum(counts),
+                "counted": len(counts),
+                "statuses": Counter(str(status) for status, _, _ in responses),
+            })
+        return samples, time.perf_counter() - start
+
+    def report(self, results, baseline_path):
+        baseline = {}
+        if baseline_path:
+            with open(baseline_path) as fh:
+                baseline = json.load(fh)["results"]
+
+        self.stdout.write(
+            f"{'scenario':<10} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}  statuses"
+        )
+        for name, row in results.items():
+            queries = "-" if row["queries_per_request"] is None else f"{row['queries_per_request']:.1f}"
+            self.stdout.write(
+                f"{name:<10} {row['throughput']:>8.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                f"{row['p99_ms']:>8.1f} {queries:>6}  {row['statuses']}"
+            )
+            if name in baseline:
+                before = baseline[name]
+                self.stdout.write(
+                    f"{'':<10} {self.change(before['throughput'], row['throughput']):>8} "
+                    f"{self.change(before['p50_ms'], row['p50_ms']):>8} "
+                    f"{self.change(before['p95_ms'], row['p95_ms']):>8} "
+                    f"{self.change(before['p99_ms'], row['p99_ms']):>8}  vs baseline"
+                )
+
+    def change(self, before, after):
+        if not before:
+            return "-"
+        return f"{(after - before) / before * 100:+.0f}%"
@@ -0,0 +1,55 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.models import uuid7
+
+from ._bench import rolled_back
+
+KEYS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert rows keyed by random UUIDv4 and by time-ordered UUIDv7 into scratch copies of "
+        "the order table and report insert throughput and primary key index size. Everything is "
+        "rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'key':<6} {'rows/s':>10} {'pkey MB':>8}")
+        for name, make_key in KEYS.items():
+            with rolled_back():
+                self.run(name, make_key, options)
+
+    def run(self, name, make_key, options):
+        table = f"bench_order_{name}"
+        rows, size = options["rows"], options["batch_size"]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {table} (LIKE api_order INCLUDING DEFAULTS); "
+                f"ALTER TABLE {table} ADD PRIMARY KEY (order_id)"
+            )
+            cursor.execute("SELECT id FROM api_user LIMIT 1")
+            user = cursor.fetchone()
+            user_id = user[0] if user else 0
+            # Keys are made up front so only the inserts are timed.
+            keys = [make_key() for _ in range(rows)]
+            sql = (
+                f"INSERT INTO {table} (order_id, created_at, updated_at, total_price, status, user_id) "
+                "SELECT k, now(), now(), 0, 'pending', %s FROM unnest(%s::uuid[]) AS k"
+            )
+            start = time.perf_counter()
+            for offset in range(0, rows, size):
+                cursor.execute(sql, [user_id, keys[offset:offset + size]])
+            elapsed = time.perf_counter() - start
+
+            cursor.execute(f"SELECT pg_relation_size('{table}_pkey')")
+            index_bytes = cursor.fetchone()[0]
+        self.stdout.write(f"{name:<6} {rows / elapsed:>10.0f} {index_bytes / 2**20:>8.1f}")
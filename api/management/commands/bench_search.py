@@ -0,0 +1,46 @@
+from django.db import connection
+from django.db.models import Q
+from django.core.management.base import BaseCommand
+
+from api.models import Product
+from api.serializers import ProductSerializer
+from api.views import ProductViewSet
+
+from ._bench import bench_user, call_view, measure, rolled_back, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Compare ranked full-text product search with an icontains scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=1_000_000)
+        parser.add_argument("--queries", nargs="+", default=["wireless speaker", "leather", "vintage camera lens"])
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        search = ProductViewSet.as_view({"get": "search"})
+        page_size = options["page_size"]
+
+        with rolled_back():
+            seed_catalog(options["size"])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE api_product")
+            user = bench_user()
+
+            for text in options["queries"]:
+                path = f"/api/products/search/?q={text}&page_size={page_size}"
+                ranked = measure(lambda: call_view(search, path, user), options["repeat"])
+                self.report(text, "full-text search", ranked)
+
+                def scan():
+                    condition = Q()
+                    for word in text.split():
+                        condition &= Q(name__icontains=word) | Q(description__icontains=word)
+                    rows = Product.objects.defer("search_vector").filter(condition).order_by("id")[:page_size]
+                    return ProductSerializer(rows, many=True).data
+
+                self.report(text, "icontains scan", measure(scan, options["repeat"]))
+
+    def report(self, text, label, stats):
+        self.stdout.write(f"{text!r:<24} {label:<18} {stats['ms']:>10.2f} ms  {stats['queries']:>3} queries")
@@ -0,0 +1,63 @@
+import random
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.compiled import compile_serializer
+from api.models import CartItem, Category, Product
+from api.renderers import ORJSONRenderer
+from api.serializers import CartItemSerializer, CategorySerializer, ProductSerializer
+
+from ._bench import fill_carts, measure, rolled_back, seed_catalog, seed_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Objects per second of the DRF serializers with JSONRenderer against the compiled row "
+        "serializers with ORJSONRenderer: serializing, rendering, and both plus the query."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=20_000)
+        parser.add_argument("--categories", type=int, default=1_000)
+        parser.add_argument("--carts", type=int, default=1_000)
+        parser.add_argument("--per-cart", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            seed_catalog(options["products"], options["categories"])
+            users = seed_users(options["carts"], f"bench-serializers-{uuid.uuid4().hex[:8]}")
+            catalog = list(Product.objects.values_list("id", "price"))
+            fill_carts(users, catalog, options["per_cart"], random.Random(0))
+
+            cases = (
+                ("product", ProductSerializer, Product.objects.defer("search_vector").with_live_stock(), ("created_at", "id")),
+                ("category", CategorySerializer, Category.objects.all(), ()),
+                ("cart item", CartItemSerializer, CartItem.objects.with_line_totals(), ()),
+            )
+            self.stdout.write(f"{'serializer':<10} {'stage':<10} {'drf/s':>12} {'compiled/s':>12} {'speedup':>8}")
+            for label, serializer_class, queryset, extra in cases:
+                self.compare(label, serializer_class, queryset.order_by("pk"), extra, options["repeat"])
+
+    def compare(self, label, serializer_class, queryset, extra, repeat):
+        compiled = compile_serializer(serializer_class, None, extra)
+        instances = list(queryset)
+        rows = list(compiled.rows(queryset))
+        drf_data = serializer_class(instances, many=True).data
+        compiled_data = compiled.data(rows)
+        if JSONRenderer().render(drf_data) != ORJSONRenderer().render(compiled_data):
+            raise CommandError(f"The compiled {label} serializer's output differs.")
+
+        stages = (
+            ("serialize", lambda: serializer_class(instances, many=True).data, lambda: compiled.data(rows)),
+            ("render", lambda: JSONRenderer().render(drf_data), lambda: ORJSONRenderer().render(compiled_data)),
+            ("end to end",
+             lambda: JSONRenderer().render(serializer_class(list(queryset), many=True).data),
+             lambda: ORJSONRenderer().render(compiled.data(compiled.rows(queryset)))),
+        )
+        for stage, slow, fast in stages:
+            before = len(instances) / measure(slow, repeat)["ms"] * 1000
+            after = len(rows) / measure(fast, repeat)["ms"] * 1000
+            self.stdout.write(f"{label:<10} {stage:<10} {before:>12,.0f} {after:>12,.0f} {after / before:>7.1f}x")
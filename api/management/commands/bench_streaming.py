@@ -0,0 +1,99 @@
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.compression import ENCODERS, CompressionMiddleware
+from api.views import ProductViewSet
+
+from ._bench import bench_user, rolled_back, seed_catalog
+
+
+def reset_peak_rss():
+    """Reset the process's peak RSS (VmHWM); False where Linux does not allow it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def rss(field):
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def fetch(view, path, user, encoding):
+    """Serve ``path`` through the compression middleware; returns (ttfb, total, body bytes)."""
+    request = APIRequestFactory().get(path, HTTP_ACCEPT_ENCODING=encoding)
+    force_authenticate(request, user=user)
+    start = time.perf_counter()
+    response = view(request)
+    if not response.streaming:
+        response.render()
+    response = CompressionMiddleware(lambda request: response).compress(request, response)
+    chunks = iter(response.streaming_content if response.streaming else [response.content])
+    size = len(next(chunks))
+    ttfb = time.perf_counter() - start
+    size += sum(len(chunk) for chunk in chunks)
+    return ttfb, time.perf_counter() - start, size
+
+
+class Command(BaseCommand):
+    help = (
+        "Time to first byte, total time, body size and peak memory of large product lists, "
+        "built in memory and rendered at once against streamed from a server-side cursor, "
+        "uncompressed and with each installed compression."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=50_000)
+        parser.add_argument("--page-size", type=int, default=500)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        views = {
+            mode: {
+                "page": ProductViewSet.as_view({"get": "list"}, cache_timeout=0, streamed=streamed),
+                "catalog": ProductViewSet.as_view({"get": "list"}, cache_timeout=0, streamed=streamed, pagination_class=None),
+            }
+            for mode, streamed in (("buffered", False), ("streamed", True))
+        }
+        cases = (
+            (f"page of {options['page_size']}", "page", f"/api/products/?page_size={options['page_size']}"),
+            (f"all {options['products']}", "catalog", "/api/products/"),
+        )
+        can_reset_rss = reset_peak_rss()
+
+        with rolled_back():
+            seed_catalog(options["products"])
+            user = bench_user()
+            self.stdout.write(
+                f"{'list':<12} {'mode':<9} {'encoding':<9} {'ttfb ms':>9} {'total ms':>9} "
+                f"{'bytes':>11} {'peak py MB':>11} {'peak rss MB':>12}"
+            )
+            for label, kind, path in cases:
+                for encoding in ("identity", *ENCODERS):
+                    for mode in ("streamed", "buffered"):
+                        view = views[mode][kind]
+                        runs = [fetch(view, path, user, encoding) for _ in range(options["repeat"])]
+                        ttfb = statistics.median(run[0] for run in runs) * 1000
+                        total = statistics.median(run[1] for run in runs) * 1000
+
+                        before = rss("VmRSS")
+                        reset_peak_rss()
+                        tracemalloc.start()
+                        _, _, size = fetch(view, path, user, encoding)
+                        python_peak = tracemalloc.get_traced_memory()[1] / 2**20
+                        tracemalloc.stop()
+                        rss_peak = f"{(rss('VmHWM') - before) / 2**20:>12.1f}" if can_reset_rss else f"{'-':>12}"
+                        self.stdout.write(
+                            f"{label:<12} {mode:<9} {encoding:<9} {ttfb:>9.1f} {total:>9.1f} "
+                            f"{size:>11,} {python_peak:>11.1f} {rss_peak}"
+                        )
@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api.catalog_io import FORMATS, export_products
+
+
+class Command(BaseCommand):
+    help = "Stream the product catalog as CSV or JSON Lines ('-' writes to stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-")
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        stream = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+        try:
+            stream.writelines(export_products(options["format"], options["chunk_size"]))
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
@@ -0,0 +1,32 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalog_io import FORMATS, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = "Upsert products from a CSV or JSON Lines file ('-' reads stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if file_format not in FORMATS:
+            raise CommandError(f"Unknown format {file_format!r}, use --format.")
+
+        # Undecodable bytes are kept as surrogates, as in the upload view, so
+        # read_rows can reject just the records they are in.
+        binary = sys.stdin.buffer if path == "-" else open(path, "rb")
+        stream = io.TextIOWrapper(binary, encoding="utf-8", errors="surrogateescape", newline="")
+        with stream:
+            result = import_products(read_rows(stream, file_format), options["chunk_size"])
+
+        for error in result["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        self.stdout.write(f"Imported {result['imported']} products, rejected {result['rejected']}.")
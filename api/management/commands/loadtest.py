@@ -0,0 +1,109 @@
+import http.client
+import json
+import statistics
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+ENDPOINTS = {
+    "products": "/api/products/",
+    "product-page": "/api/products/?page_size=50&fields=id,name,price,stock",
+    "cart": "/api/cart/",
+    "async-product-page": "/api/async/products/?page_size=50&fields=id,name,price,stock",
+    "async-cart": "/api/async/cart/",
+}
+
+
+class Client:
+    """Keep-alive HTTP client bound to one server."""
+
+    def __init__(self, base_url, token=None):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=30)
+        self.token = token
+
+    def request(self, method, path, payload=None, with_headers=False):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        body = json.dumps(payload) if payload is not None else None
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        if with_headers:
+            return response.status, data, dict(response.getheaders())
+        return response.status, data
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running server with concurrent requests and report requests/sec per endpoint. "
+        "Run it against gunicorn with gthread and with uvicorn workers to compare the sync "
+        "and async stacks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--duration", type=float, default=20.0, help="Seconds per endpoint.")
+
+    def handle(self, *args, **options):
+        token = self.sign_up(options["url"])
+        for name in options["endpoints"]:
+            self.run(name, ENDPOINTS[name], token, options)
+
+    def sign_up(self, base_url):
+        client = Client(base_url)
+        email = f"loadtest-{uuid.uuid4().hex[:12]}@example.com"
+        password = uuid.uuid4().hex
+        status, _ = client.request("POST", "/api/auth/register/", {"email": email, "password": password})
+        if status != 201:
+            raise CommandError(f"Registration failed with HTTP {status}")
+        status, data = client.request("POST", "/api/auth/login/", {"email": email, "password": password})
+        if status != 200:
+            raise CommandError(f"Login failed with HTTP {status}")
+        client.token = json.loads(data)["access"]
+
+        # Put a few products in the cart so the cart endpoint does real work.
+        status, data = client.request("GET", "/api/products/?page_size=5&fields=id")
+        for product in json.loads(data)["results"] if status == 200 else []:
+            client.request("POST", "/api/cart/", {"product_id": product["id"], "quantity": 1})
+        return client.token
+
+    def run(self, name, path, token, options):
+        latencies, errors = [], []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options["duration"]
+
+        def worker():
+            client = Client(options["url"], token)
+            local, failed = [], 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                status, _ = client.request("GET", path)
+                local.append(time.perf_counter() - start)
+                failed += status != 200
+            with lock:
+                latencies.extend(local)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            raise CommandError(f"No requests completed against {path}")
+        cuts = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{name:<14} {len(latencies) / elapsed:>9.1f} req/s  "
+            f"p50 {cuts[49] * 1000:>7.1f} ms  p95 {cuts[94] * 1000:>7.1f} ms  errors {sum(errors)}"
+        )
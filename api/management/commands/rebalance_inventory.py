@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import invalidate_objects
+from api.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Spread a product's stock evenly over N inventory shards. Without --shards the current "
+        "count is kept (evening out drained shards); --shards 0 turns sharding off."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_ids", nargs="+", type=int)
+        parser.add_argument("--shards", type=int)
+        parser.add_argument("--stock", type=int, help="Set the total stock instead of keeping it.")
+
+    def handle(self, *args, **options):
+        if options["shards"] is not None and not 0 <= options["shards"] <= 256:
+            raise CommandError("--shards must be between 0 and 256.")
+        for product_id in options["product_ids"]:
+            try:
+                stock = Product.objects.rebalance(product_id, options["shards"], options["stock"])
+            except Product.DoesNotExist:
+                raise CommandError(f"Product {product_id} does not exist.")
+            shards = Product.objects.values_list("shards", flat=True).get(pk=product_id)
+            self.stdout.write(f"Product {product_id}: {stock} units over {shards or 'no'} shards.")
+        invalidate_objects(Product, options["product_ids"])
@@ -0,0 +1,44 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from ._bench import seed_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a catalog, users with filled carts and order history for bench_mix --url. "
+        "Users are <prefix>-<n>@example.com and share one password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=50_000)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--items-per-cart", type=int, default=3)
+        parser.add_argument("--orders-per-user", type=int, default=2)
+        parser.add_argument("--prefix", default=f"store-{uuid.uuid4().hex[:8]}")
+        parser.add_argument("--password", default="bench-pass")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            users = seed_store(
+                options["users"],
+                options["products"],
+                options["prefix"],
+                options["password"],
+                categories=options["categories"],
+                items_per_cart=options["items_per_cart"],
+                orders_per_user=options["orders_per_user"],
+                seed=options["seed"],
+            )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(
+            f"Seeded {options['products']} products and {len(users)} users with prefix "
+            f"{options['prefix']!r} in {time.perf_counter() - start:.1f}s."
+        )
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ._bench import seed_users
+
+
+class Command(BaseCommand):
+    help = "Bulk-create users (sharing one password hash) together with their carts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("count", type=int)
+        parser.add_argument("--prefix", default="seed", help="Usernames become <prefix>-<n>@example.com.")
+        parser.add_argument("--password", help="Defaults to an unusable password.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            users = seed_users(
+                options["count"], options["prefix"], options["password"], options["batch_size"]
+            )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Created {len(users)} users with carts in {elapsed:.2f}s.")
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+UPDATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION api_product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+CREATE_TRIGGER = """
+CREATE TRIGGER api_product_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, description ON api_product
+FOR EACH ROW EXECUTE FUNCTION api_product_search_vector_update();
+"""
+
+BACKFILL = "UPDATE api_product SET name = name;"
+
+DROP = """
+DROP TRIGGER IF EXISTS api_product_search_vector_trigger ON api_product;
+DROP FUNCTION IF EXISTS api_product_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_cart_orderitem_product_keyset_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(
+            sql=[UPDATE_FUNCTION, CREATE_TRIGGER, BACKFILL],
+            reverse_sql=DROP,
+        ),
+        # Created after the backfill so the rows are indexed in one pass.
+        migrations.AddIndex(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="product_search_vector_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+# Merge duplicate (cart, product) rows into the oldest one before the
+# constraint is added.
+MERGE_DUPLICATES = """
+WITH merged AS (
+    SELECT cart_id, product_id, MIN(id) AS keep_id, SUM(quantity) AS quantity
+    FROM api_cartitem
+    GROUP BY cart_id, product_id
+    HAVING COUNT(*) > 1
+), kept AS (
+    UPDATE api_cartitem i SET quantity = m.quantity
+    FROM merged m
+    WHERE i.id = m.keep_id
+)
+DELETE FROM api_cartitem i
+USING merged m
+WHERE i.cart_id = m.cart_id AND i.product_id = m.product_id AND i.id <> m.keep_id;
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunSQL(MERGE_DUPLICATES, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "product"), name="unique_cart_product"
+            ),
+        ),
+    ]
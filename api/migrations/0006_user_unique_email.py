@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:14
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# Emails that differ only in case would fail the constraint. Which account
+# keeps the address is a decision for a person, so the migration stops and
+# lists them to be merged or corrected by hand first.
+FIND_DUPLICATE_EMAILS = """
+SELECT lower(email), array_agg(id ORDER BY id)
+FROM api_user
+WHERE email <> ''
+GROUP BY lower(email)
+HAVING COUNT(*) > 1
+ORDER BY 1;
+"""
+
+
+def check_duplicate_emails(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(FIND_DUPLICATE_EMAILS)
+        duplicates = cursor.fetchall()
+    if duplicates:
+        raise RuntimeError(
+            "Resolve these accounts that share an email, ignoring case, before migrating:\n"
+            + "\n".join(f"{email}: user ids {', '.join(map(str, ids))}" for email, ids in duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_cartitem_unique_cart_product"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="user",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Lower("email"),
+                condition=models.Q(("email", ""), _negated=True),
+                name="unique_user_email_ci",
+            ),
+        ),
+    ]
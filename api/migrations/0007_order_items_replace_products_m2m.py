@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+# Orders placed before order lines existed only have rows in the M2M table,
+# which recorded neither quantity nor price. Give each of them a single line
+# at the product's current price, flagged as legacy so that nothing reports
+# those placeholders as sales.
+COPY_M2M_ROWS = """
+INSERT INTO api_orderitem (order_id, product_id, quantity, price, line_total, legacy)
+SELECT op.order_id, op.product_id, 1, p.price, p.price, true
+FROM api_order_products op
+JOIN api_product p ON p.id = op.product_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM api_orderitem oi
+    WHERE oi.order_id = op.order_id AND oi.product_id = op.product_id
+);
+DROP TABLE api_order_products;
+"""
+
+RESTORE_M2M_TABLE = """
+CREATE TABLE api_order_products (
+    id bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    order_id uuid NOT NULL REFERENCES api_order (order_id) DEFERRABLE INITIALLY DEFERRED,
+    product_id bigint NOT NULL REFERENCES api_product (id) DEFERRABLE INITIALLY DEFERRED,
+    UNIQUE (order_id, product_id)
+);
+CREATE INDEX api_order_products_product_id_idx ON api_order_products (product_id);
+INSERT INTO api_order_products (order_id, product_id)
+SELECT DISTINCT order_id, product_id FROM api_orderitem;
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_user_unique_email"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="line_total",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            "UPDATE api_orderitem SET line_total = price * quantity;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="legacy",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(COPY_M2M_ROWS, reverse_sql=RESTORE_M2M_TABLE),
+            ],
+            state_operations=[
+                migrations.RemoveField(model_name="order", name="products"),
+                migrations.AddField(
+                    model_name="order",
+                    name="products",
+                    field=models.ManyToManyField(
+                        related_name="products", through="api.OrderItem", to="api.product"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "created_at", "order_id"], name="order_user_created_idx"
+            ),
+        ),
+    ]
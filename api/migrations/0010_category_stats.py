@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Counts move by one per product row. The price range widens with
+# LEAST/GREATEST; it is recomputed from the (category, price) index only when
+# the product that left held the old minimum or maximum.
+UPDATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION api_product_category_stats_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.category_id IS NOT NULL THEN
+        UPDATE api_categorystats s SET
+            product_count = s.product_count - 1,
+            in_stock_count = s.in_stock_count - (OLD.stock > 0)::int,
+            min_price = CASE WHEN OLD.price <= s.min_price
+                THEN (SELECT min(price) FROM api_product WHERE category_id = OLD.category_id)
+                ELSE s.min_price END,
+            max_price = CASE WHEN OLD.price >= s.max_price
+                THEN (SELECT max(price) FROM api_product WHERE category_id = OLD.category_id)
+                ELSE s.max_price END
+        WHERE s.category_id = OLD.category_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.category_id IS NOT NULL THEN
+        INSERT INTO api_categorystats (category_id, product_count, in_stock_count, min_price, max_price)
+        VALUES (NEW.category_id, 1, (NEW.stock > 0)::int, NEW.price, NEW.price)
+        ON CONFLICT (category_id) DO UPDATE SET
+            product_count = api_categorystats.product_count + 1,
+            in_stock_count = api_categorystats.in_stock_count + EXCLUDED.in_stock_count,
+            min_price = LEAST(api_categorystats.min_price, EXCLUDED.min_price),
+            max_price = GREATEST(api_categorystats.max_price, EXCLUDED.max_price);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Ordinary stock decrements do not touch the stats row, so checkouts in one
+# category do not queue on it; only selling out or restocking does.
+CREATE_TRIGGERS = """
+CREATE TRIGGER api_product_category_stats_insert_delete
+AFTER INSERT OR DELETE ON api_product
+FOR EACH ROW EXECUTE FUNCTION api_product_category_stats_update();
+
+CREATE TRIGGER api_product_category_stats_update
+AFTER UPDATE OF category_id, price, stock ON api_product
+FOR EACH ROW
+WHEN (
+    OLD.category_id IS DISTINCT FROM NEW.category_id
+    OR OLD.price IS DISTINCT FROM NEW.price
+    OR (OLD.stock > 0) IS DISTINCT FROM (NEW.stock > 0)
+)
+EXECUTE FUNCTION api_product_category_stats_update();
+"""
+
+BACKFILL = """
+INSERT INTO api_categorystats (category_id, product_count, in_stock_count, min_price, max_price)
+SELECT category_id, count(*), count(*) FILTER (WHERE stock > 0), min(price), max(price)
+FROM api_product
+WHERE category_id IS NOT NULL
+GROUP BY category_id;
+"""
+
+DROP = """
+DROP TRIGGER IF EXISTS api_product_category_stats_insert_delete ON api_product;
+DROP TRIGGER IF EXISTS api_product_category_stats_update ON api_product;
+DROP FUNCTION IF EXISTS api_product_category_stats_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_inventory_shards"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryStats",
+            fields=[
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="api.category",
+                    ),
+                ),
+                ("product_count", models.PositiveIntegerField(default=0)),
+                ("in_stock_count", models.PositiveIntegerField(default=0)),
+                (
+                    "min_price",
+                    models.DecimalField(decimal_places=2, max_digits=10, null=True),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(decimal_places=2, max_digits=10, null=True),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "price"], name="product_category_price_idx"
+            ),
+        ),
+        migrations.RunSQL(
+            sql=[UPDATE_FUNCTION, CREATE_TRIGGERS, BACKFILL],
+            reverse_sql=DROP,
+        ),
+    ]
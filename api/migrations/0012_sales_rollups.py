@@ -0,0 +1,124 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_cart_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategorySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("units", models.PositiveBigIntegerField()),
+                ("revenue", models.DecimalField(decimal_places=2, max_digits=16)),
+                ("orders", models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ProductSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("units", models.PositiveBigIntegerField()),
+                ("revenue", models.DecimalField(decimal_places=2, max_digits=16)),
+                ("orders", models.PositiveIntegerField()),
+                ("min_price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("max_price", models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RollupMark",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=50, primary_key=True, serialize=False),
+                ),
+                ("position", models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["created_at"], name="order_created_idx"),
+        ),
+        migrations.AddField(
+            model_name="categorysales",
+            name="category",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="sales",
+                to="api.category",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productsales",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="sales",
+                to="api.product",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="categorysales",
+            index=models.Index(
+                fields=["period", "bucket", "id"], name="categorysales_bucket_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="categorysales",
+            constraint=models.UniqueConstraint(
+                fields=("period", "category", "bucket"),
+                name="unique_category_sales_bucket",
+                nulls_distinct=False,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productsales",
+            index=models.Index(
+                fields=["period", "bucket", "id"], name="productsales_bucket_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="productsales",
+            constraint=models.UniqueConstraint(
+                fields=("period", "product", "bucket"),
+                name="unique_product_sales_bucket",
+            ),
+        ),
+    ]
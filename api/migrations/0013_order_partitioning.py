@@ -0,0 +1,168 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:10
+
+from datetime import timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+import api.models
+
+TABLES = ("api_order", "api_orderitem")
+
+# Partitioned tables need the partition key in every unique constraint, so
+# their primary keys gain created_at there. Order lines reference their
+# order by both columns; ON UPDATE CASCADE keeps the copies in step.
+PRIMARY_KEYS = {
+    "api_order": {True: "order_id, created_at", False: "order_id"},
+    "api_orderitem": {True: "id, created_at", False: "id"},
+}
+ORDER_FOREIGN_KEY = {
+    True: "FOREIGN KEY (order_id, created_at) REFERENCES api_order (order_id, created_at) "
+          "ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED",
+    False: "FOREIGN KEY (order_id) REFERENCES api_order (order_id) DEFERRABLE INITIALLY DEFERRED",
+}
+ORDER_FOREIGN_KEY_NAME = "api_orderitem_order_fk"
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", [table])
+    return cursor.fetchone()[0]
+
+
+def describe(cursor, table):
+    """Index definitions and foreign keys of ``table``, minus its primary key."""
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass AND NOT x.indisprimary
+        """,
+        [table],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT conname, pg_get_constraintdef(oid), confrelid = 'api_order'::regclass
+        FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f' AND conparentid = 0
+        """,
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+    return indexes, foreign_keys
+
+
+def next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def create_partitions(cursor, table, first, last):
+    """Monthly partitions covering ``first`` to ``last``, plus a default one."""
+    month = first.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month <= last:
+        cursor.execute(
+            f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+            [month, next_month(month)],
+        )
+        month = next_month(month)
+    cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def rebuild(cursor, table, indexes, foreign_keys, partitioned, months):
+    """Recreate ``table`` with the same columns, indexes and keys, partitioned or not, and move its rows."""
+    old = f"{table}_old"
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    cursor.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+    for name, _ in indexes:
+        cursor.execute(f"ALTER INDEX {name} RENAME TO {name[:55]}_old")
+    cursor.execute(
+        "SELECT pg_get_serial_sequence(%s, attname) FROM pg_attribute "
+        "WHERE attrelid = %s::regclass AND attidentity <> ''",
+        [old, old],
+    )
+    for (sequence,) in cursor.fetchall():
+        cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO {old}_seq")
+
+    partition_by = " PARTITION BY RANGE (created_at)" if partitioned else ""
+    cursor.execute(
+        f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY)"
+        f"{partition_by}"
+    )
+    cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({PRIMARY_KEYS[table][partitioned]})")
+    if partitioned:
+        create_partitions(cursor, table, *months)
+    cursor.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    cursor.execute(
+        "SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attidentity <> ''", [table]
+    )
+    for (column,) in cursor.fetchall():
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, %s), coalesce(max({column}), 0) + 1, false) FROM {table}",
+            [table, column],
+        )
+
+    for _, definition in indexes:
+        cursor.execute(definition)
+    for name, definition, to_orders in foreign_keys:
+        if not to_orders:
+            cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+    cursor.execute(f"DROP TABLE {old}")
+
+
+def convert(connection, partitioned):
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor, "api_order") == partitioned:
+            return
+        described = {table: describe(cursor, table) for table in TABLES}
+        for name, _, to_orders in described["api_orderitem"][1]:
+            if to_orders:
+                cursor.execute(f"ALTER TABLE api_orderitem DROP CONSTRAINT {name}")
+
+        cursor.execute("SELECT coalesce(min(created_at), now()), now() + interval '3 months' FROM api_order")
+        months = cursor.fetchone()
+        for table in TABLES:
+            rebuild(cursor, table, *described[table], partitioned, months)
+        cursor.execute(
+            f"ALTER TABLE api_orderitem ADD CONSTRAINT {ORDER_FOREIGN_KEY_NAME} {ORDER_FOREIGN_KEY[partitioned]}"
+        )
+
+
+def partition(apps, schema_editor):
+    if settings.ORDER_PARTITIONING and schema_editor.connection.vendor == "postgresql":
+        convert(schema_editor.connection, True)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        convert(schema_editor.connection, False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="order_id",
+            field=models.UUIDField(
+                db_index=True, default=api.models.uuid7, editable=False, primary_key=True, serialize=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="created_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunSQL(
+            "UPDATE api_orderitem i SET created_at = o.created_at FROM api_order o WHERE o.order_id = i.order_id;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="created_at",
+            field=models.DateTimeField(),
+        ),
+        migrations.RunPython(partition, unpartition),
+    ]
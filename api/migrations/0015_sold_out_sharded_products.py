@@ -0,0 +1,20 @@
+from django.db import migrations
+
+# Sharded products sold out before ``take`` zeroed their stock still count as
+# in stock in CategoryStats; the stats trigger corrects them as they change.
+ZERO_SOLD_OUT = """
+UPDATE api_product p SET stock = 0
+WHERE p.shards > 0 AND p.stock > 0
+AND NOT EXISTS (SELECT 1 FROM api_inventoryshard s WHERE s.product_id = p.id AND s.stock > 0);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_order_events"),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=ZERO_SOLD_OUT, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -1,11 +1,66 @@
-from django.db import models
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Max, OuterRef, Prefetch, Q, Subquery, Sum, When
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+
+from .cache import invalidate_on_commit
 
+import os
+import threading
+import time
 import uuid
 
+
+_uuid7_lock = threading.Lock()
+_uuid7_last = (0, 0)
+
+
+def uuid7():
+    """
+    A time-ordered UUID (RFC 9562 version 7): a 48-bit Unix timestamp in
+    milliseconds followed by 74 random bits, so new keys land at the right-hand
+    edge of a btree index instead of on random pages.
+
+    Keys made by one process within the same millisecond count up from the
+    previous one, so they stay in order and the index only ever splits its
+    last page.
+    """
+    global _uuid7_last
+    with _uuid7_lock:
+        stamp = time.time_ns() // 1_000_000
+        rand = int.from_bytes(os.urandom(10), "big") >> 6
+        last_stamp, last_rand = _uuid7_last
+        if stamp <= last_stamp:
+            stamp, rand = last_stamp, last_rand + 1
+            if rand >> 74:
+                stamp, rand = stamp + 1, 0
+        _uuid7_last = stamp, rand
+    return uuid.UUID(int=stamp << 80 | 0x7 << 76 | (rand >> 62) << 64 | 0x2 << 62 | rand & (1 << 62) - 1)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"Insufficient stock for products {sorted(product_ids)}")
+        self.product_ids = product_ids
+
 class User(AbstractUser):
     phone = models.CharField(max_length=15, blank=True, null=True)
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                Lower("email"), condition=~Q(email=""), name="unique_user_email_ci"
+            ),
+        ]
+
 
 class BaseModel(models.Model):
     created_at = models.DateTimeField(db_column="created_at", auto_now_add=True)
@@ -21,34 +76,317 @@ class Category(BaseModel):
     def __str__(self):
         return self.name
 
+class CategoryStats(models.Model):
+    """
+    Per-category product aggregates.
+
+    Maintained by triggers on the product table (see migration 0010), so
+    every write path, including bulk imports and checkout, keeps it current.
+    """
+
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    product_count = models.PositiveIntegerField(default=0)
+    in_stock_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_live_stock(self):
+        """Annotate ``live_stock``: the shard total for sharded products, else ``stock``."""
+        shard_total = (
+            InventoryShard.objects.filter(product=OuterRef("pk"))
+            .values("product")
+            .annotate(total=Sum("stock"))
+            .values("total")
+        )
+        return self.annotate(live_stock=Case(
+            When(shards__gt=0, then=Subquery(shard_total)),
+            default=F("stock"),
+            output_field=models.PositiveIntegerField(),
+        ))
+
+    def rebalance(self, product_id, shards=None, stock=None):
+        """
+        Spread a product's stock evenly over ``shards`` counter rows.
+
+        ``shards`` defaults to the current count and ``stock`` to the current
+        total; ``shards=0`` moves the stock back onto the product row. Cached
+        responses of the product are dropped on commit.
+        """
+        with transaction.atomic(using=self.db):
+            product = self.select_for_update().get(pk=product_id)
+            rows = InventoryShard.objects.select_for_update().filter(product=product).order_by("shard")
+            if stock is None:
+                stock = sum(row.stock for row in rows) if product.shards else product.stock
+            if shards is None:
+                shards = product.shards
+            rows.delete()
+            InventoryShard.objects.bulk_create(
+                InventoryShard(product=product, shard=i, stock=stock // shards + (i < stock % shards))
+                for i in range(shards)
+            )
+            self.filter(pk=product_id).update(shards=shards, stock=stock)
+            invalidate_on_commit(Product, [product_id])
+        return stock
+
+    def reserve(self, deltas):
+        """
+        Add ``{product_id: delta}`` to the reserved counters in one statement.
+
+        A positive delta only applies while that much stock is still
+        unreserved, so the check and the update are a single atomic step and
+        no product row is locked for longer than the statement. Raises
+        ``InsufficientStock`` naming the products that were asked for more; the
+        caller's transaction must be rolled back then. Cached responses of the
+        products are dropped on commit, since they show what is available.
+        """
+        available = reduce(or_, (
+            Q(id=pid, stock__gte=F("reserved") + delta) if delta > 0 else Q(id=pid)
+            for pid, delta in deltas.items()
+        ))
+        updated = self.filter(available).update(
+            reserved=Case(
+                *[When(id=pid, then=F("reserved") + delta) for pid, delta in deltas.items()],
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+        if updated != len(deltas):
+            raise InsufficientStock({pid for pid, delta in deltas.items() if delta > 0})
+        invalidate_on_commit(Product, deltas)
+
+
 class Product(BaseModel):
     name = models.CharField(max_length=255, db_index=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField()
+    # Units held by carts; always the sum of this product's StockHold rows.
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    # When non-zero, stock lives in this many InventoryShard rows and
+    # ``stock`` is only the total as of the last rebalance, or 0 once
+    # ``InventoryShard.objects.take`` has sold the product out.
+    shards = models.PositiveSmallIntegerField(default=0, editable=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name="products")
+    # Maintained by a database trigger from name (weight A) and description (weight B).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="product_created_id_idx"),
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            # Lets CategoryStats recompute a category's price range cheaply.
+            models.Index(fields=["category", "price"], name="product_category_price_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # ``reserved`` only changes through atomic increments, and ``shards``
+        # and a sharded product's ``stock`` through ``rebalance`` and
+        # ``take``; never write a possibly stale copy back.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            managed = ("reserved", "shards", "stock") if self.shards else ("reserved", "shards")
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in managed and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def current_stock(self):
+        if not self.shards:
+            return self.stock
+        if hasattr(self, "live_stock"):
+            return self.live_stock
+        return self.inventory_shards.aggregate(total=Sum("stock"))["total"] or 0
+
+    @property
+    def available(self):
+        return max(self.current_stock - self.reserved, 0)
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Carts with their total computed in SQL, plus ``priced_at``: the newest
+        update of any product in the cart, which with ``version`` validates a
+        cached copy of the cart.
+        """
+        return self.annotate(
+            items_total=Sum(F("items__product__price") * F("items__quantity")),
+            priced_at=Max("items__product__updated_at"),
+        )
+
+    def with_items(self):
+        """``with_totals`` with the items prefetched."""
+        return self.with_totals().prefetch_related(self.items_prefetch())
+
+    @staticmethod
+    def items_prefetch():
+        return Prefetch("items", queryset=CartItem.objects.with_line_totals())
+
+    def touch(self, user_id):
+        """
+        Bump the version of the user's cart and return its id, or None.
+
+        Every change to a cart's items goes through here first, which also
+        row-locks the cart so its writers queue in one order.
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {self.model._meta.db_table} SET version = version + 1 WHERE user_id = %s RETURNING id",
+                [user_id],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
 
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="cart")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped by CartQuerySet.touch on every item change; the cart's ETag.
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CartQuerySet.as_manager()
 
     def __str__(self):
         return f"Cart of {self.user.username}"
 
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        total = self.items.aggregate(total=Sum(F("product__price") * F("quantity")))["total"]
+        return total or 0
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_line_totals(self):
+        return self.annotate(line_total=F("product__price") * F("quantity"))
+
+    def upsert(self, user_id, quantities, increment=True):
+        """
+        Add ``{product_id: quantity}`` to the user's cart in one statement.
+
+        Existing items are incremented (or overwritten when ``increment`` is
+        false) with INSERT ... ON CONFLICT, so concurrent adds never lose an
+        update. Quantities are capped at ``CART_ITEM_MAX_QUANTITY``. The cart's
+        version is bumped in the same statement, and a user without a cart
+        (one created through ``bulk_create``, say) gets one. Unknown products
+        are skipped. Returns the affected items with ``line_total`` and
+        ``sharded`` set.
+        """
+        item_table = self.model._meta.db_table
+        cart_table = Cart._meta.db_table
+        product_table = Product._meta.db_table
+        cap = int(settings.CART_ITEM_MAX_QUANTITY)
+        update = f"{item_table}.quantity + EXCLUDED.quantity" if increment else "EXCLUDED.quantity"
+        values = ", ".join(["(%s::bigint, %s::bigint)"] * len(quantities))
+        sql = f"""
+            WITH cart AS (
+                INSERT INTO {cart_table} (id, user_id, created_at, version)
+                VALUES (gen_random_uuid(), %s, now(), 1)
+                ON CONFLICT (user_id) DO UPDATE SET version = {cart_table}.version + 1
+                RETURNING id
+            ), upserted AS (
+                INSERT INTO {item_table} (cart_id, product_id, quantity, created_at, updated_at)
+                SELECT c.id, p.id, LEAST(v.quantity, {cap}), now(), now()
+                FROM cart c
+                CROSS JOIN (VALUES {values}) AS v (product_id, quantity)
+                JOIN {product_table} p ON p.id = v.product_id
+                ON CONFLICT (cart_id, product_id)
+                DO UPDATE SET quantity = LEAST({update}, {cap}), updated_at = EXCLUDED.updated_at
+                RETURNING id, cart_id, product_id, quantity
+            )
+            SELECT u.id, u.cart_id, u.product_id, u.quantity, p.price * u.quantity, p.shards > 0
+            FROM upserted u JOIN {product_table} p ON p.id = u.product_id
+        """
+        params = [user_id] + [value for pair in quantities.items() for value in pair]
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        items = []
+        for item_id, cart_id, product_id, quantity, line_total, sharded in rows:
+            item = self.model(id=item_id, cart_id=cart_id, product_id=product_id, quantity=quantity)
+            item.line_total = line_total
+            item.sharded = sharded
+            items.append(item)
+        return items
+
+    def apply(self, user_id, operations):
+        """
+        Apply ``add``/``set``/``remove`` operations to the user's cart.
+
+        Operations are folded into their net effect per product first, so a
+        batch of any size costs at most one DELETE and two upserts.
+        """
+        effects = {}
+        for operation in operations:
+            product_id, op = operation["product_id"], operation["op"]
+            quantity = operation.get("quantity", 0)
+            kind, current = effects.get(product_id, (None, 0))
+            if op == "remove" or (op == "set" and quantity == 0):
+                effects[product_id] = ("remove", 0)
+            elif op == "set" or kind == "remove":
+                effects[product_id] = ("set", quantity)
+            else:
+                effects[product_id] = (kind or "add", current + quantity)
+
+        def by_kind(name):
+            return {pid: quantity for pid, (kind, quantity) in effects.items() if kind == name}
+
+        with transaction.atomic(using=self.db):
+            removed = by_kind("remove")
+            if removed:
+                self.remove(user_id, removed)
+            items = []
+            if by_kind("add"):
+                items += self.upsert(user_id, by_kind("add"))
+            if by_kind("set"):
+                items += self.upsert(user_id, by_kind("set"), increment=False)
+            self.hold_stock(items)
+
+    def add(self, user_id, quantities):
+        """``upsert`` that also holds stock for the new quantities."""
+        with transaction.atomic(using=self.db):
+            items = self.upsert(user_id, quantities)
+            self.hold_stock(items)
+        return items
+
+    def hold_stock(self, items):
+        # Sharded products are not held: their reserved counter would put the
+        # single hot row back on every cart add. Checkout enforces their stock.
+        quantities = {item.product_id: item.quantity for item in items if not item.sharded}
+        if quantities:
+            StockHold.objects.hold(items[0].cart_id, quantities)
+
+    def remove(self, user_id, product_ids):
+        """Delete the user's items for ``product_ids`` and release their holds."""
+        with transaction.atomic(using=self.db):
+            cart_id = Cart.objects.touch(user_id)
+            deleted, _ = self.filter(cart_id=cart_id, product_id__in=product_ids).delete()
+            if deleted:
+                StockHold.objects.hold(cart_id, dict.fromkeys(product_ids, 0))
+        return deleted
+
 
 class CartItem(BaseModel):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cart", "product"], name="unique_cart_product"),
+        ]
+
     @property
     def total_price(self):
         return self.product.price * self.quantity
@@ -61,11 +399,20 @@ class Order(BaseModel):
         ("delivered", "Delivered"),
     ]
 
-    order_id = models.UUIDField(primary_key=True,db_index=True, default=uuid.uuid4, editable=False)
+    order_id = models.UUIDField(primary_key=True,db_index=True, default=uuid7, editable=False)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=12, choices=STATUS, default="pending")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
-    products = models.ManyToManyField(Product, related_name="products")
+    # Read-only view over the order lines; nothing is written through it.
+    products = models.ManyToManyField(Product, through="OrderItem", related_name="products")
+
+    class Meta:
+        indexes = [
+            # Serves the per-user order history, newest first.
+            models.Index(fields=["user", "created_at", "order_id"], name="order_user_created_idx"),
+            # Range scans of the sales rollups.
+            models.Index(fields=["created_at"], name="order_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.order_id}"
@@ -74,4 +421,344 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
-    price = models.DecimalField(max_digits=10, decimal_places=2)
\ No newline at end of file
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2)
+    # Copied from the products of an order placed before order lines existed
+    # (see migration 0007). Quantity and price are placeholders, so the sales
+    # rollups leave these lines out.
+    legacy = models.BooleanField(default=False)
+    # Copy of the order's created_at: the partition key of both tables when
+    # ORDER_PARTITIONING is on (see migration 0013).
+    created_at = models.DateTimeField()
+
+
+class OrderEventQuerySet(models.QuerySet):
+    def claim(self, limit):
+        """
+        Lease up to ``limit`` events to the caller for
+        ``ORDER_EVENTS_CLAIM_TIMEOUT`` seconds, oldest first.
+
+        Events leased to another worker are skipped until the lease runs out,
+        so events of a worker that died are picked up again.
+        """
+        now = timezone.now()
+        with transaction.atomic(using=self.db):
+            events = list(
+                self.select_for_update(skip_locked=True)
+                .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lte=now))
+                .order_by("id")[:limit]
+            )
+            self.filter(id__in=[event.id for event in events]).update(
+                claimed_until=now + timedelta(seconds=settings.ORDER_EVENTS_CLAIM_TIMEOUT)
+            )
+        return events
+
+
+class OrderEvent(models.Model):
+    """
+    Outbox row for a placed order: written in the checkout transaction and
+    deleted once the order's side effects are done (see api.tasks).
+    """
+
+    order_id = models.UUIDField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_until = models.DateTimeField(null=True)
+
+    objects = OrderEventQuerySet.as_manager()
+
+
+class StockHoldQuerySet(models.QuerySet):
+    def hold(self, cart_id, quantities):
+        """
+        Make the cart hold exactly ``{product_id: quantity}``.
+
+        Only the difference from the current holds is reserved or released,
+        and every hold that is kept gets a fresh expiry. Raises
+        ``InsufficientStock`` if a product cannot cover its increase.
+        """
+        # Callers already run in a transaction that they roll back on error.
+        with transaction.atomic(using=self.db, savepoint=False):
+            current = dict(
+                self.select_for_update()
+                .filter(cart_id=cart_id, product_id__in=quantities)
+                .values_list("product_id", "quantity")
+            )
+            deltas = {
+                pid: quantity - current.get(pid, 0)
+                for pid, quantity in quantities.items()
+                if quantity != current.get(pid, 0)
+            }
+            if deltas:
+                Product.objects.reserve(deltas)
+
+            kept = {pid: quantity for pid, quantity in quantities.items() if quantity > 0}
+            if kept:
+                expires_at = timezone.now() + timedelta(seconds=settings.STOCK_HOLD_TTL)
+                self.bulk_create(
+                    [
+                        StockHold(cart_id=cart_id, product_id=pid, quantity=quantity, expires_at=expires_at)
+                        for pid, quantity in kept.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["cart", "product"],
+                    update_fields=["quantity", "expires_at"],
+                )
+            released = [pid for pid in quantities if pid not in kept and pid in current]
+            if released:
+                self.filter(cart_id=cart_id, product_id__in=released).delete()
+
+    def release_expired(self):
+        """
+        Delete expired holds and give their units back, in one statement.
+        Returns the number of products released.
+        """
+        hold_table = self.model._meta.db_table
+        product_table = Product._meta.db_table
+        sql = f"""
+            WITH expired AS (
+                DELETE FROM {hold_table} WHERE expires_at <= now()
+                RETURNING product_id, quantity
+            ), released AS (
+                SELECT product_id, SUM(quantity) AS quantity FROM expired GROUP BY product_id
+            )
+            UPDATE {product_table} p SET reserved = p.reserved - r.quantity
+            FROM released r
+            WHERE p.id = r.product_id
+            RETURNING p.id
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql)
+            released = [pid for pid, in cursor.fetchall()]
+        if released:
+            invalidate_on_commit(Product, released)
+        return len(released)
+
+
+class StockHold(models.Model):
+    """Units of a product set aside for a cart until ``expires_at``."""
+
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="holds")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="holds")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    objects = StockHoldQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cart", "product"], name="unique_hold_cart_product"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="stockhold_expires_idx"),
+        ]
+
+
+class InventoryShardQuerySet(models.QuerySet):
+    def take(self, product_id, quantity):
+        """
+        Remove ``quantity`` units from a sharded product; False if it is short.
+
+        The fast path decrements one random shard that can cover the whole
+        quantity and still keep a unit, skipping shards other checkouts have
+        locked, so concurrent orders for a hot product rarely wait on each
+        other. When every such shard is busy, or no single shard has enough,
+        the product row and then all shards are locked in order and the
+        quantity is taken from the fullest ones. Only that path can sell the
+        product out, and when it does it sets the product's ``stock`` to 0 so
+        ``CategoryStats`` counts it as out of stock. Cached responses of the
+        product are dropped on commit.
+        """
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET stock = stock - %s
+                WHERE id = (
+                    SELECT id FROM {table}
+                    WHERE product_id = %s AND stock > %s
+                    ORDER BY random()
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                """,
+                [quantity, product_id, quantity],
+            )
+            if cursor.rowcount:
+                invalidate_on_commit(Product, [product_id])
+                return True
+
+        # The same lock order as ``rebalance``.
+        products = Product.objects.using(self.db).filter(pk=product_id)
+        list(products.select_for_update(no_key=True).values_list("pk"))
+        shards = list(self.select_for_update().filter(product_id=product_id).order_by("shard"))
+        total = sum(shard.stock for shard in shards)
+        if total < quantity:
+            return False
+        remaining = quantity
+        for shard in sorted(shards, key=lambda shard: -shard.stock):
+            taken = min(shard.stock, remaining)
+            shard.stock -= taken
+            remaining -= taken
+            if not remaining:
+                break
+        self.bulk_update(shards, ["stock"])
+        if total == quantity:
+            products.update(stock=0)
+        invalidate_on_commit(Product, [product_id])
+        return True
+
+
+class InventoryShard(models.Model):
+    """One slice of a sharded product's stock; see ``Product.shards``."""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="inventory_shards")
+    shard = models.PositiveSmallIntegerField()
+    stock = models.PositiveIntegerField()
+
+    objects = InventoryShardQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "shard"], name="unique_product_shard"),
+        ]
+
+
+ROLLUP_PERIODS = [
+    ("hour", "Hour"),
+    ("day", "Day"),
+]
+
+
+class ProductSales(models.Model):
+    """Units and revenue of one product over one hour or day (UTC), from order lines."""
+
+    period = models.CharField(max_length=4, choices=ROLLUP_PERIODS)
+    bucket = models.DateTimeField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="sales")
+    units = models.PositiveBigIntegerField()
+    revenue = models.DecimalField(max_digits=16, decimal_places=2)
+    orders = models.PositiveIntegerField()
+    # Range of the unit prices the product sold at in the bucket.
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["period", "product", "bucket"], name="unique_product_sales_bucket"),
+        ]
+        indexes = [
+            models.Index(fields=["period", "bucket", "id"], name="productsales_bucket_idx"),
+        ]
+
+
+class CategorySales(models.Model):
+    """Units and revenue of one category over one hour or day (UTC), from order lines."""
+
+    period = models.CharField(max_length=4, choices=ROLLUP_PERIODS)
+    bucket = models.DateTimeField()
+    # Null for products without a category.
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, related_name="sales")
+    units = models.PositiveBigIntegerField()
+    revenue = models.DecimalField(max_digits=16, decimal_places=2)
+    orders = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "category", "bucket"], nulls_distinct=False, name="unique_category_sales_bucket"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["period", "bucket", "id"], name="categorysales_bucket_idx"),
+        ]
+
+
+class RollupMarkQuerySet(models.QuerySet):
+    def advance(self, name, until, chunk):
+        """
+        Fold orders placed after the ``name`` mark and up to ``until`` into the
+        sales rollups, ``chunk`` of order time at a time.
+
+        Each chunk is added to the rollups and moves the mark in its own
+        transaction, with the mark row locked, so an interrupted run resumes
+        where it stopped and concurrent runs never count an order twice.
+        Stretches without orders are skipped. Returns the number of chunks.
+        """
+        chunks = 0
+        while True:
+            with transaction.atomic(using=self.db):
+                mark, _ = self.select_for_update().get_or_create(name=name)
+                orders = Order.objects.using(self.db).filter(created_at__lte=until)
+                if mark.position is not None:
+                    orders = orders.filter(created_at__gt=mark.position)
+                first = orders.order_by("created_at").values_list("created_at", flat=True).first()
+                if first is None:
+                    return chunks
+                start = mark.position or first - timedelta(microseconds=1)
+                end = min(first + chunk, until)
+                self.roll_up(start, end)
+                mark.position = end
+                mark.save(update_fields=["position"])
+            chunks += 1
+
+    def roll_up(self, start, end):
+        """
+        Add the order lines of orders placed in (start, end] to both rollup
+        tables, except legacy lines.
+        """
+        order_table = Order._meta.db_table
+        line_table = OrderItem._meta.db_table
+        product_table = Product._meta.db_table
+        product_sales = ProductSales._meta.db_table
+        category_sales = CategorySales._meta.db_table
+        periods = ", ".join(f"('{period}')" for period, _ in ROLLUP_PERIODS)
+        sql = f"""
+            WITH lines AS (
+                SELECT o.created_at, o.order_id, i.product_id, p.category_id, i.quantity, i.price, i.line_total
+                FROM {order_table} o
+                JOIN {line_table} i ON i.order_id = o.order_id
+                JOIN {product_table} p ON p.id = i.product_id
+                WHERE o.created_at > %s AND o.created_at <= %s AND NOT i.legacy
+            ), periods (period) AS (
+                VALUES {periods}
+            ), products AS (
+                INSERT INTO {product_sales} (period, bucket, product_id, units, revenue, orders, min_price, max_price)
+                SELECT s.period, date_trunc(s.period, l.created_at), l.product_id,
+                       sum(l.quantity), sum(l.line_total), count(*), min(l.price), max(l.price)
+                FROM lines l CROSS JOIN periods s
+                GROUP BY 1, 2, 3
+                ON CONFLICT (period, product_id, bucket) DO UPDATE SET
+                    units = {product_sales}.units + EXCLUDED.units,
+                    revenue = {product_sales}.revenue + EXCLUDED.revenue,
+                    orders = {product_sales}.orders + EXCLUDED.orders,
+                    min_price = LEAST({product_sales}.min_price, EXCLUDED.min_price),
+                    max_price = GREATEST({product_sales}.max_price, EXCLUDED.max_price)
+            )
+            INSERT INTO {category_sales} (period, bucket, category_id, units, revenue, orders)
+            SELECT s.period, date_trunc(s.period, l.created_at), l.category_id,
+                   sum(l.quantity), sum(l.line_total), count(DISTINCT l.order_id)
+            FROM lines l CROSS JOIN periods s
+            GROUP BY 1, 2, 3
+            ON CONFLICT (period, category_id, bucket) DO UPDATE SET
+                units = {category_sales}.units + EXCLUDED.units,
+                revenue = {category_sales}.revenue + EXCLUDED.revenue,
+                orders = {category_sales}.orders + EXCLUDED.orders
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, [start, end])
+
+    def rebuild(self, name):
+        """Empty the rollups and forget the mark, so the next ``advance`` starts over."""
+        with transaction.atomic(using=self.db):
+            self.select_for_update().filter(name=name).delete()
+            ProductSales.objects.using(self.db).all().delete()
+            CategorySales.objects.using(self.db).all().delete()
+
+
+class RollupMark(models.Model):
+    """High-water mark on ``Order.created_at`` up to which the sales rollups are complete."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    position = models.DateTimeField(null=True)
+
+    objects = RollupMarkQuerySet.as_manager()
@@ -0,0 +1,164 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek pagination over a unique, indexed ordering.
+
+    Every page is a range scan that starts right after the last row of the
+    previous page, so the cost of a page does not depend on how deep it is.
+    All ordering fields must sort in the same direction and the last one must
+    be unique (normally the primary key).
+    """
+
+    ordering = ("created_at", "id")
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([row async for row in queryset])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.limit = self.get_page_size(request)
+        self.fields = [name.lstrip("-") for name in self.ordering]
+        self.descending = self.ordering[0].startswith("-")
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position))
+        # One extra row tells whether there is a next page.
+        return queryset[: self.limit + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.limit
+        self.page = rows[: self.limit]
+        return self.page
+
+    def stream_queryset(self, queryset, chunk_size=100):
+        """
+        Yield the rows of ``queryset``, from ``get_page_queryset``, as a
+        server-side cursor fetches them.
+
+        The page queryset is built first, so that a bad cursor is reported
+        before a response starts. ``has_next`` and the next link are only
+        known once the rows are exhausted.
+        """
+        rows = queryset.iterator(chunk_size=chunk_size)
+        self.has_next, self.page = False, []
+        for count, row in enumerate(rows):
+            if count == self.limit:
+                self.has_next = True
+                break
+            self.page = [row]
+            yield row
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def seek_filter(self, position):
+        lookup = "lt" if self.descending else "gt"
+        bound = "lte" if self.descending else "gte"
+        # The redundant bound on the leading column lets Postgres turn the
+        # OR below into a single index range scan.
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            equal = {field: position[j] for j, field in enumerate(self.fields[:i])}
+            condition |= Q(**equal, **{f"{name}__{lookup}": position[i]})
+        return Q(**{f"{self.fields[0]}__{bound}": position[0]}) & condition
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            if len(raw) != len(self.fields):
+                raise ValueError
+            return [
+                self.parse_value(model, name, value)
+                for name, value in zip(self.fields, raw)
+            ]
+        except (TypeError, ValueError, UnicodeEncodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def parse_value(self, model, name, value):
+        return model._meta.get_field(name).to_python(value)
+
+    def encode_cursor(self, row):
+        values = []
+        for name in self.fields:
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            values.append(value.isoformat() if hasattr(value, "isoformat") else str(value))
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode("ascii")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class SearchRankPagination(KeysetPagination):
+    """Keyset pages over ``rank`` annotated search results, best match first."""
+
+    ordering = ("-rank", "-id")
+
+    def parse_value(self, model, name, value):
+        if name == "rank":
+            return float(value)
+        return super().parse_value(model, name, value)
+
+
+class OrderHistoryPagination(KeysetPagination):
+    """Newest orders first; ``order_id`` breaks ties between equal timestamps."""
+
+    ordering = ("-created_at", "-order_id")
+    page_size = 20
+    max_page_size = 100
+
+
+class SalesReportPagination(KeysetPagination):
+    """Rollup rows in time order."""
+
+    ordering = ("bucket", "id")
+    page_size = 100
+    max_page_size = 1000
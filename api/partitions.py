@@ -0,0 +1,123 @@
+"""
+Monthly partitions of ``api_order`` and ``api_orderitem``.
+
+Migration 0013 converts both tables when ``ORDER_PARTITIONING`` is set. Each
+month gets a ``<table>_pYYYY_MM`` partition of each table, created ahead of
+time by ``ensure_partitions``; rows outside every month land in
+``<table>_default`` until their month is created. Old months are taken out of the live tables with
+``archive``.
+"""
+import re
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+
+TABLES = ("api_order", "api_orderitem")
+PARTITION_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def month_of(moment):
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = 'api_order'::regclass")
+        return cursor.fetchone()[0]
+
+
+def partitions(table):
+    """``{month: partition name}`` of the monthly partitions attached to ``table``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [table],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+    months = {}
+    for name in names:
+        match = PARTITION_NAME.search(name)
+        if match:
+            months[datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)] = name
+    return months
+
+
+def ensure_partitions(now, ahead):
+    """Create the missing partitions from ``now``'s month to ``ahead`` months later; returns their names."""
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = {table: partitions(table) for table in TABLES}
+        month = month_of(now)
+        for _ in range(ahead + 1):
+            missing = [table for table in TABLES if month not in existing[table]]
+            if missing:
+                created += create_month(cursor, missing, month)
+            month = next_month(month)
+    return created
+
+
+def create_month(cursor, tables, month):
+    """
+    Create ``month``'s partition of each of ``tables``; returns their names.
+
+    Rows of the month that were written before it had a partition sit in the
+    default partitions, and Postgres will not add a partition whose range the
+    default one still holds rows of, so they are taken out first and put back
+    through the parent afterwards. Lines come out before their orders and go
+    back in after them, so the foreign key holds throughout. The default
+    partitions stay locked until the transaction ends.
+    """
+    bounds = [month, next_month(month)]
+    for table in reversed(TABLES):
+        cursor.execute(f"CREATE TEMPORARY TABLE {table}_moved (LIKE {table})")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {table}_default WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {table}_moved SELECT * FROM moved",
+            bounds,
+        )
+    names = []
+    for table in tables:
+        name = f"{table}_p{month:%Y_%m}"
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)", bounds)
+        names.append(name)
+    for table in TABLES:
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {table}_moved")
+        cursor.execute(f"DROP TABLE {table}_moved")
+    return names
+
+
+def archive(before, drop=False):
+    """
+    Detach the monthly partitions that end on or before ``before``.
+
+    Each month's lines are detached before its orders. The detached line
+    table keeps a standalone foreign key to the live orders table; that key
+    is dropped so the order partition can follow. With ``drop`` the
+    detached tables are dropped, otherwise they stay behind as plain tables
+    to dump or query. Returns the months archived.
+    """
+    orders, lines = partitions("api_order"), partitions("api_orderitem")
+    months = sorted(month for month in orders if next_month(month) <= before)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for month in months:
+            if month in lines:
+                name = lines[month]
+                cursor.execute(f"ALTER TABLE api_orderitem DETACH PARTITION {name}")
+                cursor.execute(
+                    "SELECT conname FROM pg_constraint "
+                    "WHERE conrelid = %s::regclass AND confrelid = 'api_order'::regclass",
+                    [name],
+                )
+                for (constraint,) in cursor.fetchall():
+                    cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {constraint}")
+                if drop:
+                    cursor.execute(f"DROP TABLE {name}")
+            cursor.execute(f"ALTER TABLE api_order DETACH PARTITION {orders[month]}")
+            if drop:
+                cursor.execute(f"DROP TABLE {orders[month]}")
+    return months
@@ -0,0 +1,288 @@
+import fcntl
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseNotFound
+import orjson
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("request_profile", default=None)
+_totals = defaultdict(Counter)
+_totals_lock = threading.Lock()
+
+METRICS = (
+    ("requests", "counter", "Profiled requests."),
+    ("request_seconds", "counter", "Wall time spent in profiled requests."),
+    ("sql_queries", "counter", "SQL statements run by profiled requests."),
+    ("sql_seconds", "counter", "Time spent waiting on SQL in profiled requests."),
+    ("duplicate_queries", "counter", "Statements that repeated an earlier one in the same request."),
+    ("n_plus_one_requests", "counter", "Profiled requests that looked like an N+1 query pattern."),
+    ("serialize_seconds", "counter", "Time spent producing serializer data in profiled requests."),
+)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = Counter()
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries[sql] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.queries.values())
+
+    def repeated(self, threshold):
+        return {sql: count for sql, count in self.queries.items() if count >= threshold}
+
+
+@contextmanager
+def serializing():
+    """Count the block as serialization time of the current profile."""
+    profile = _current.get()
+    if profile is None or profile.serializing:
+        yield
+        return
+    # Nested serializers run inside the outer one; time the outer only.
+    profile.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.serializing = False
+        profile.serialize_time += time.perf_counter() - start
+
+
+def _timed_data(data):
+    def wrapper(serializer):
+        with serializing():
+            return data.fget(serializer)
+
+    return property(wrapper)
+
+
+def install_serializer_timing():
+    """Make ``serializer.data`` report its time to the current profile."""
+    if not getattr(BaseSerializer, "_profiled", False):
+        BaseSerializer.data = _timed_data(BaseSerializer.data)
+        BaseSerializer._profiled = True
+
+
+def endpoint_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    return match.view_name or match.route
+
+
+def record(endpoint, profile, elapsed, n_plus_one):
+    with _totals_lock:
+        totals = _totals[endpoint]
+        totals["requests"] += 1
+        totals["request_seconds"] += elapsed
+        totals["sql_queries"] += profile.query_count
+        totals["sql_seconds"] += profile.sql_time
+        totals["duplicate_queries"] += profile.duplicates
+        totals["n_plus_one_requests"] += int(n_plus_one)
+        totals["serialize_seconds"] += profile.serialize_time
+        if settings.QUERY_PROFILING_METRICS_DIR:
+            _write(_path(str(os.getpid())), _totals)
+
+
+def snapshot():
+    """Per-endpoint totals recorded by this process."""
+    with _totals_lock:
+        return {endpoint: dict(totals) for endpoint, totals in _totals.items()}
+
+
+def reset():
+    with _totals_lock:
+        _totals.clear()
+
+
+def _path(name):
+    return os.path.join(settings.QUERY_PROFILING_METRICS_DIR, f"{name}.json")
+
+
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return {}
+
+
+def _write(path, totals):
+    # Readers see the old file or the new one, never a partial write.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(orjson.dumps(totals))
+    os.replace(temporary, path)
+
+
+def retire():
+    """
+    Fold this process's totals into the ``retired`` series of
+    ``QUERY_PROFILING_METRICS_DIR``, so exiting workers leave no file behind
+    and their counts are kept.
+    """
+    if not settings.QUERY_PROFILING_METRICS_DIR:
+        return
+    with _totals_lock, open(_path("retired") + ".lock", "wb") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired = defaultdict(Counter, {
+            endpoint: Counter(totals) for endpoint, totals in _read(_path("retired")).items()
+        })
+        for endpoint, totals in _totals.items():
+            retired[endpoint].update(totals)
+        _write(_path("retired"), retired)
+        try:
+            os.remove(_path(str(os.getpid())))
+        except FileNotFoundError:
+            pass
+        _totals.clear()
+
+
+def collect():
+    """
+    Per-process totals, keyed by pid.
+
+    With ``QUERY_PROFILING_METRICS_DIR`` set, every worker writes its totals
+    there and all of them are read, so each scrape sees the same counters
+    whichever worker serves it. Otherwise only this process's are returned.
+    """
+    directory = settings.QUERY_PROFILING_METRICS_DIR
+    if not directory:
+        return {str(os.getpid()): snapshot()}
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    except FileNotFoundError:
+        names = []
+    collected = {name.removesuffix(".json"): _read(os.path.join(directory, name)) for name in names}
+    return {pid: totals for pid, totals in collected.items() if totals}
+
+
+def server_timing(profile, elapsed):
+    return ", ".join((
+        f'db;dur={profile.sql_time * 1000:.1f};desc="{profile.query_count} queries"',
+        f"serialize;dur={profile.serialize_time * 1000:.1f}",
+        f"total;dur={elapsed * 1000:.1f}",
+    ))
+
+
+@contextmanager
+def profiling(profile):
+    """Report the block's queries and serializer time to ``profile``."""
+    token = _current.set(profile)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            yield
+    finally:
+        _current.reset(token)
+
+
+class QueryProfilingMiddleware:
+    """
+    Samples requests and records their SQL and serializer cost per URL name.
+
+    A sampled request is added to the totals served by ``metrics_view`` and,
+    unless its response is streamed, gets a ``Server-Timing`` header.
+    Streamed responses are recorded once their body has been sent. Requests that run the same statement
+    ``QUERY_PROFILING_REPEAT_THRESHOLD`` times or more are logged as likely
+    N+1 patterns. Async requests pass through unprofiled, because their
+    queries run on other threads.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            # The handler awaits the coroutine returned here.
+            return self.get_response(request)
+        if random.random() >= settings.QUERY_PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        start = time.perf_counter()
+        with profiling(profile):
+            response = self.get_response(request)
+        if response.streaming and not response.is_async:
+            # The body, and the queries that produce it, run after this
+            # returns, so the request is recorded once it has been sent.
+            response.streaming_content = self.stream(request, profile, start, response.streaming_content)
+            return response
+        elapsed = self.finish(request, profile, start)
+        response["Server-Timing"] = server_timing(profile, elapsed)
+        return response
+
+    def stream(self, request, profile, start, chunks):
+        with profiling(profile):
+            yield from chunks
+        self.finish(request, profile, start)
+
+    def finish(self, request, profile, start):
+        elapsed = time.perf_counter() - start
+        endpoint = endpoint_name(request)
+        repeated = profile.repeated(settings.QUERY_PROFILING_REPEAT_THRESHOLD)
+        if repeated:
+            logger.warning(
+                "Possible N+1 in %s: %s", endpoint,
+                "; ".join(f"{count}x {sql[:200]}" for sql, count in repeated.items()),
+            )
+        record(endpoint, profile, elapsed, bool(repeated))
+        return elapsed
+
+
+def render_metrics(collected):
+    lines = []
+    for name, kind, description in METRICS:
+        metric = f"api_endpoint_{name}_total"
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for pid, totals in sorted(collected.items()):
+            for endpoint, values in sorted(totals.items()):
+                lines.append(f'{metric}{{endpoint="{endpoint}",pid="{pid}"}} {values.get(name, 0)}')
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the totals from ``collect``."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseNotFound()
+    if not token and not settings.DEBUG:
+        return HttpResponseNotFound()
+    return HttpResponse(render_metrics(collect()), content_type="text/plain; version=0.0.4")
@@ -0,0 +1,53 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` output, produced by orjson.
+
+    Types orjson does not write the way DRF's encoder does (datetimes,
+    dates, times, dataclasses, Decimal, ...) are handed to that encoder, so
+    the bytes match. Pretty-printed or ASCII-only output, and anything
+    orjson rejects (integers over 64 bits, unknown types), goes through
+    ``JSONRenderer``. Known differences: floats below 1e-4 or from 1e16 up
+    are spelled differently (``0.00001`` for Python's ``1e-05``), and NaN
+    is written as null where ``JSONRenderer`` raises.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def __init__(self):
+        self.default = self.encoder_class().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Keep the output a strict JavaScript subset, as JSONRenderer does.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class StreamingJSONListRenderer(ORJSONRenderer):
+    """
+    Writes a JSON list a batch at a time, for ``StreamingHttpResponse``.
+
+    ``render_stream`` yields ``prefix``, the items of each batch as it
+    arrives, and then ``suffix()``, which is only called once the batches are
+    exhausted, so it can describe them (such as a next-page link).
+    """
+
+    def render_stream(self, batches, prefix=b"", suffix=None):
+        opening, started = prefix + b"[", False
+        for batch in batches:
+            if batch:
+                # The opening goes out with the first items rather than alone.
+                yield (b"," if started else opening) + self.render(batch)[1:-1]
+                started = True
+        yield (b"" if started else opening) + b"]" + (suffix() if suffix is not None else b"")
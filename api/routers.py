@@ -0,0 +1,116 @@
+"""
+Routes reads of opted-in views to ``DATABASE_REPLICAS``.
+
+Everything reads from the primary unless a view marks the request with
+``ReplicaReadMixin``. A user who has just written is pinned to the primary
+for ``REPLICA_PIN_SECONDS`` by a marker in the catalog cache, so they read
+their own writes even though the replicas lag behind.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+
+_reads = ContextVar("replica_reads", default=None)
+
+
+def _pin_key(user_id):
+    return f"replica:pin:{user_id}"
+
+
+class ReplicaReads:
+    """Replica routing of one request; the user's pin is looked up on its first read."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._alias = None
+
+    @property
+    def alias(self):
+        if self._alias is None:
+            cache = caches[settings.CATALOG_CACHE_ALIAS]
+            pinned = self.user_id is not None and cache.get(_pin_key(self.user_id)) is not None
+            self._alias = "default" if pinned else random.choice(settings.DATABASE_REPLICAS)
+        return self._alias
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, whatever the request allows."""
+    token = _reads.set(None)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        reads = _reads.get()
+        return reads.alias if reads is not None else "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaReadMixin:
+    """Serve this view's GET, HEAD and OPTIONS requests from a replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._replica_token is not None:
+                _reads.reset(self._replica_token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and settings.DATABASE_REPLICAS:
+            self._replica_token = _reads.set(ReplicaReads(request.user.id))
+
+
+class ReplicaPinMiddleware:
+    """Pins the user to the primary after each successful write request."""
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        user_id = self.writer(request, response)
+        if user_id is not None:
+            caches[settings.CATALOG_CACHE_ALIAS].set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        user_id = self.writer(request, response)
+        if user_id is not None:
+            await caches[settings.CATALOG_CACHE_ALIAS].aset(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def writer(self, request, response):
+        if not settings.DATABASE_REPLICAS or request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        user = getattr(request, "user", None)
+        return user.id if user is not None and user.is_authenticated else None
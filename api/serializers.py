@@ -1,16 +1,46 @@
+from django.conf import settings
 
 from rest_framework import serializers
-from .models import User, Product, Order, Category, Cart, CartItem
+from .models import ROLLUP_PERIODS, User, Product, Order, OrderItem, Category, Cart, CartItem, ProductSales, CategorySales
 from django.contrib.auth import authenticate
+from django.db import IntegrityError, transaction
+
+DUPLICATE_EMAIL = {"email": "User with this email already exists."}
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """Accepts a ``fields`` kwarg restricting which fields are serialized."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+def current_stock(stock, shards, live_stock):
+    """``Product.current_stock`` from columns; needs ``with_live_stock()``."""
+    return live_stock if shards else stock
+
+
+def available_stock(stock, shards, live_stock, reserved):
+    return max(current_stock(stock, shards, live_stock) - reserved, 0)
+
 
 class CartItemSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
+    # See api.compiled; needs ``with_line_totals()``.
+    compiled_fields = {"total_price": (("line_total",), lambda line_total: line_total)}
+
     class Meta:
         model = CartItem
         fields = ["id", "product", "quantity", "total_price"]
 
     def get_total_price(self, obj):
+        if hasattr(obj, "line_total"):
+            return obj.line_total
         return obj.product.price * obj.quantity
 
 class UserCartSerializer(serializers.ModelSerializer):
@@ -23,10 +53,32 @@ class UserCartSerializer(serializers.ModelSerializer):
         fields = ["id", "user", "cart_items", "total_price"]
     
     def get_total_price(self, obj):
-        return sum(
-            item.product.price * item.quantity
-            for item in obj.items.all()
-        )
+        if hasattr(obj, "items_total"):
+            return obj.items_total or 0
+        return obj.total_price
+
+class CartOperationSerializer(serializers.Serializer):
+    OPS = ("add", "set", "remove")
+
+    op = serializers.ChoiceField(choices=OPS, default="add")
+    # Product ids are bigints.
+    product_id = serializers.IntegerField(max_value=2**63 - 1)
+    quantity = serializers.IntegerField(min_value=0, max_value=settings.CART_ITEM_MAX_QUANTITY, default=1)
+
+    def validate(self, data):
+        if data["op"] == "add" and data["quantity"] == 0:
+            raise serializers.ValidationError({"quantity": "Must be at least 1 when adding."})
+        return data
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_operations(self, operations):
+        product_ids = {operation["product_id"] for operation in operations}
+        found = set(Product.objects.filter(id__in=product_ids).values_list("id", flat=True))
+        if product_ids - found:
+            raise serializers.ValidationError(f"Unknown products: {sorted(product_ids - found)}")
+        return operations
 
 class UserSerializer(serializers.ModelSerializer):
 
@@ -39,23 +91,26 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         model = User
         fields = ("first_name", "last_name", "email", "password", "phone", "is_active")
         extra_kwargs = {
-            'password': {'write_only': True} 
+            'password': {'write_only': True},
+            'email': {'required': True, 'allow_blank': False},
         }
      
     def create(self, validated_data):
-
-        if User.objects.filter(email=validated_data["email"]).exists():
-            raise serializers.ValidationError({"email": "User with this email already exists."})
-
-        user = User.objects.create_user(
-            first_name = validated_data.get("first_name",""),
-            last_name = validated_data.get("last_name",""),
-            phone = validated_data.get("phone"),
-            username=validated_data["email"],
-            password=validated_data["password"],
-            email = validated_data["email"],
-            is_active = validated_data.get("is_active", True)
-        )
+        # Email uniqueness is enforced by the database; the cart is created
+        # by the post_save signal inside the same transaction.
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    first_name = validated_data.get("first_name",""),
+                    last_name = validated_data.get("last_name",""),
+                    phone = validated_data.get("phone"),
+                    username=validated_data["email"],
+                    password=validated_data["password"],
+                    email = validated_data["email"],
+                    is_active = validated_data.get("is_active", True)
+                )
+        except IntegrityError:
+            raise serializers.ValidationError(DUPLICATE_EMAIL)
         return user
 
 
@@ -89,26 +144,105 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             "email":{"required":True}
         }
 
+    def update(self, instance, validated_data):
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(DUPLICATE_EMAIL)
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = "__all__"
 
-class ProductSerializer(serializers.ModelSerializer):
+class CategorySummarySerializer(serializers.ModelSerializer):
+    product_count = serializers.IntegerField(read_only=True)
+    in_stock_count = serializers.IntegerField(read_only=True)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ("id", "name", "product_count", "in_stock_count", "min_price", "max_price")
+
+class ProductSerializer(DynamicFieldsModelSerializer):
+    available = serializers.IntegerField(read_only=True)
+
+    # See api.compiled.
+    compiled_fields = {
+        "stock": (("stock", "shards", "live_stock"), current_stock),
+        "available": (("stock", "shards", "live_stock", "reserved"), available_stock),
+    }
+
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ("search_vector", "reserved", "shards")
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if "stock" in data:
+            data["stock"] = instance.current_stock
+        return data
+
+    def update(self, instance, validated_data):
+        # A sharded product's stock is spread over its shards, which
+        # ``Product.save`` leaves alone.
+        stock = validated_data.pop("stock", None) if instance.shards else None
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if stock is not None:
+                instance.stock = instance.live_stock = Product.objects.rebalance(instance.pk, stock=stock)
+        return instance
+
+class ProductSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    category = serializers.IntegerField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+class SalesReportSerializer(serializers.Serializer):
+    by = serializers.ChoiceField(choices=("product", "category"), default="product")
+    period = serializers.ChoiceField(choices=ROLLUP_PERIODS, default="day")
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    product = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        other = "category" if data["by"] == "product" else "product"
+        if other in data:
+            raise serializers.ValidationError({other: f"Not available when reporting by {data['by']}."})
+        return data
+
+class ProductSalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductSales
+        fields = ("period", "bucket", "product", "units", "revenue", "orders", "min_price", "max_price")
+
+class CategorySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CategorySales
+        fields = ("period", "bucket", "category", "units", "revenue", "orders")
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.name", read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ("product", "product_name", "quantity", "price", "line_total")
 
 class OrderSerializer(serializers.ModelSerializer):
-    products = serializers.PrimaryKeyRelatedField(many=True, queryset=Product.objects.all())
+    items = OrderItemSerializer(many=True, read_only=True)
     user = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = Order
         fields = (
             "order_id",
+            "created_at",
             "total_price",
             "status",
             "user",
-            "products"
+            "items"
         )
\ No newline at end of file
@@ -1,8 +1,32 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import User, Cart
+from .authentication import forget_user_state
+from .cache import invalidate_on_commit
+from .models import User, Cart, Category, Product, StockHold
 
 @receiver(post_save, sender=User)
 def create_user_cart(sender, instance, created, **kwargs):
-    if created or not Cart.objects.filter(user=instance).exists():
-        Cart.objects.get_or_create(user=instance)
+    if created:
+        Cart.objects.create(user=instance)
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_holds(sender, instance, **kwargs):
+    # The cascade would drop the holds without giving their units back.
+    held = StockHold.objects.filter(cart_id=instance.pk).values_list("product_id", flat=True)
+    if held:
+        StockHold.objects.hold(instance.pk, dict.fromkeys(held, 0))
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user_state(sender, instance, **kwargs):
+    forget_user_state(instance.pk)
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    invalidate_on_commit(Product, [instance.pk])
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, instance, signal, **kwargs):
+    invalidate_on_commit(Category, [instance.pk])
+    if signal is post_delete:
+        # Products of a deleted category were re-pointed with a bulk UPDATE.
+        invalidate_on_commit(Product)
@@ -0,0 +1,91 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import get_connection, mail_admins, EmailMessage
+from django.utils import timezone
+
+from . import partitions
+from .models import Order, OrderEvent, Product, RollupMark, StockHold
+
+logger = logging.getLogger(__name__)
+
+
+# Set while a run of process_placed_orders is queued; see api.events.
+PROCESSING_QUEUED_KEY = "events:processing-queued"
+
+
+@shared_task(ignore_result=True)
+def process_placed_orders():
+    """
+    Side effects of the placed orders in the outbox.
+
+    Events are claimed a batch of ``ORDER_EVENTS_BATCH_SIZE`` at a time, and
+    each one is deleted as soon as its confirmation is sent. If a batch fails
+    part way, the events still left are retried once their claim runs out
+    (by the next queued run or the beat schedule), without sending the
+    earlier confirmations again. Only a worker dying between a send and the
+    delete sends that confirmation twice.
+    """
+    # Events published from now on need a run of their own.
+    cache.delete(PROCESSING_QUEUED_KEY)
+    while events := OrderEvent.objects.claim(settings.ORDER_EVENTS_BATCH_SIZE):
+        orders = Order.objects.filter(order_id__in=[event.order_id for event in events])
+        orders = {
+            order.order_id: order
+            for order in orders.select_related("user").prefetch_related("items__product")
+        }
+        alert_low_stock({item.product_id for order in orders.values() for item in order.items.all()})
+
+        with get_connection() as connection:
+            for event in events:
+                order = orders.get(event.order_id)
+                if order is not None:
+                    send_order_confirmation(connection, order)
+                event.delete()
+
+
+def send_order_confirmation(connection, order):
+    if not order.user.email:
+        return
+    lines = [f"{item.quantity} x {item.product.name} @ {item.price}" for item in order.items.all()]
+    body = "\n".join([f"Thanks for your order {order.order_id}.", "", *lines, "", f"Total: {order.total_price}"])
+    connection.send_messages([EmailMessage(f"Order {order.order_id} confirmed", body, to=[order.user.email])])
+
+
+def alert_low_stock(product_ids):
+    low = list(
+        Product.objects.with_live_stock()
+        .filter(id__in=product_ids, live_stock__lte=settings.LOW_STOCK_THRESHOLD)
+        .values_list("name", "live_stock")
+    )
+    if low:
+        lines = [f"{name}: {stock} left" for name, stock in low]
+        logger.warning("Low stock: %s", ", ".join(lines))
+        mail_admins("Low stock", "\n".join(lines))
+
+
+@shared_task(ignore_result=True)
+def release_expired_holds():
+    released = StockHold.objects.release_expired()
+    if released:
+        logger.info("Released expired stock holds on %d products", released)
+
+
+@shared_task(ignore_result=True)
+def roll_up_sales():
+    until = timezone.now() - timedelta(seconds=settings.SALES_ROLLUP_LAG)
+    chunks = RollupMark.objects.advance("sales", until, timedelta(seconds=settings.SALES_ROLLUP_CHUNK))
+    if chunks:
+        logger.info("Rolled up %d chunks of orders into sales", chunks)
+
+
+@shared_task(ignore_result=True)
+def create_order_partitions():
+    if not partitions.is_partitioned():
+        return
+    created = partitions.ensure_partitions(timezone.now(), settings.ORDER_PARTITIONS_AHEAD)
+    if created:
+        logger.info("Created order partitions %s", ", ".join(created))
@@ -1,3 +1,1716 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import os
+import runpy
+import tempfile
+import threading
+import uuid
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache, caches
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import compression, partitions, profiling
+from .cache import cache_stats, get_cache
+from .compiled import compile_serializer
+from .models import (
+    User, Category, CategoryStats, InventoryShard, Product, Cart, CartItem, Order, OrderEvent, OrderItem, StockHold,
+    ProductSales, CategorySales, RollupMark,
+)
+from .renderers import ORJSONRenderer, StreamingJSONListRenderer
+from .serializers import CartItemSerializer, CategorySerializer, OrderSerializer, ProductSerializer, UserCartSerializer
+from .tasks import process_placed_orders, release_expired_holds
+
+
+class ProductListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="shopper@example.com", password="pass")
+        cls.category = Category.objects.create(name="Books")
+        Product.objects.bulk_create(
+            Product(
+                name=f"Book {i}",
+                description="A long description",
+                price=Decimal("10.00") + i,
+                stock=5,
+                category=cls.category,
+            )
+            for i in range(7)
+        )
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_keyset_pages_cover_catalog_once(self):
+        seen = []
+        url = "/api/products/?page_size=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+        expected = list(Product.objects.order_by("created_at", "id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_page_query_count_is_flat(self):
+        response = self.client.get("/api/products/?page_size=3")
+        with self.assertNumQueries(1):
+            self.client.get(response.data["next"])
+
+    def test_fields_projection(self):
+        response = self.client.get("/api/products/?fields=id,name,bogus")
+        self.assertEqual(set(response.data["results"][0]), {"id", "name"})
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/products/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+class CartReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="cart@example.com", password="pass")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Item {i}", description="", price=Decimal("2.50"), stock=10)
+            for i in range(10)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, count):
+        CartItem.objects.bulk_create(
+            CartItem(cart=self.user.cart, product=product, quantity=2)
+            for product in self.products[:count]
+        )
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        for count in (0, 1, 10):
+            CartItem.objects.all().delete()
+            self.fill_cart(count)
+            with self.assertNumQueries(2):
+                response = self.client.get("/api/cart/")
+            self.assertEqual(len(response.data["cart_items"]), count)
+
+    def test_totals(self):
+        self.fill_cart(3)
+        response = self.client.get("/api/cart/")
+        self.assertEqual(response.data["total_price"], Decimal("15.00"))
+        self.assertEqual(response.data["cart_items"][0]["total_price"], Decimal("5.00"))
+        self.assertEqual(self.user.cart.total_price, Decimal("15.00"))
+
+    def test_empty_cart_total(self):
+        response = self.client.get("/api/cart/")
+        self.assertEqual(response.data["total_price"], 0)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer@example.com", password="pass")
+        cls.book = Product.objects.create(name="Book", description="", price=Decimal("12.00"), stock=3)
+        cls.pen = Product.objects.create(name="Pen", description="", price=Decimal("1.50"), stock=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_checkout(self):
+        CartItem.objects.create(cart=self.user.cart, product=self.book, quantity=2)
+        CartItem.objects.create(cart=self.user.cart, product=self.pen, quantity=4)
+
+        response = self.client.post("/api/orders/")
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(order_id=response.data["order_id"])
+        self.assertEqual(order.total_price, Decimal("30.00"))
+        self.assertEqual(
+            set(order.items.values_list("product_id", "quantity", "price", "line_total")),
+            {(self.book.id, 2, Decimal("12.00"), Decimal("24.00")), (self.pen.id, 4, Decimal("1.50"), Decimal("6.00"))},
+        )
+        self.book.refresh_from_db()
+        self.pen.refresh_from_db()
+        self.assertEqual((self.book.stock, self.pen.stock), (1, 6))
+        self.assertFalse(self.user.cart.items.exists())
+
+    def test_insufficient_stock_changes_nothing(self):
+        CartItem.objects.create(cart=self.user.cart, product=self.book, quantity=5)
+        CartItem.objects.create(cart=self.user.cart, product=self.pen, quantity=1)
+
+        response = self.client.post("/api/orders/")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Book", response.data["error"])
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.user.cart.items.count(), 2)
+
+    def test_empty_cart(self):
+        response = self.client.post("/api/orders/")
+        self.assertEqual(response.status_code, 400)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "needs row-level locking")
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_hot_product_is_never_oversold(self):
+        self.check_not_oversold(shards=0)
+
+    def test_sharded_hot_product_is_never_oversold(self):
+        self.check_not_oversold(shards=4)
+
+    def check_not_oversold(self, shards):
+        stock, buyers = 10, 25
+        product = Product.objects.create(name="Hot", description="", price=Decimal("5.00"), stock=stock)
+        Product.objects.rebalance(product.pk, shards)
+        users = [User.objects.create_user(username=f"buyer{i}", password=None) for i in range(buyers)]
+        for user in users:
+            CartItem.objects.create(cart=user.cart, product=product, quantity=1)
+
+        statuses = []
+        barrier = threading.Barrier(buyers)
+
+        def checkout(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                statuses.append(client.post("/api/orders/").status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(user,)) for user in users]
+        with self.assertLogs("api.tasks", "WARNING") as logs:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertIn("Low stock: Hot: 0 left", "\n".join(logs.output))
+        self.assertEqual(statuses.count(201), stock)
+        self.assertEqual(statuses.count(400), buyers - stock)
+        self.assertEqual(Product.objects.get(pk=product.pk).current_stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), stock)
+
+    def test_checkout_racing_hold_expiry_counts_the_hold_once(self):
+        user = User.objects.create_user(username="racer", password=None)
+        product = Product.objects.create(name="Drop", description="", price=Decimal("5.00"), stock=5)
+        client = APIClient()
+        client.force_authenticate(user)
+        client.post("/api/cart/", {"product_id": product.id, "quantity": 2}, format="json")
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        released, proceed, statuses = threading.Event(), threading.Event(), []
+
+        def release():
+            try:
+                with transaction.atomic():
+                    StockHold.objects.release_expired()
+                    released.set()
+                    proceed.wait()
+            finally:
+                connection.close()
+
+        def checkout():
+            try:
+                statuses.append(client.post("/api/orders/").status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=release), threading.Thread(target=checkout)]
+        threads[0].start()
+        released.wait()
+        threads[1].start()
+        threads[1].join(0.5)
+        proceed.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [201])
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.reserved), (3, 0))
+
+
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="browser@example.com", password="pass")
+        cls.category = Category.objects.create(name="Toys")
+        cls.product = Product.objects.create(
+            name="Kite", description="", price=Decimal("8.00"), stock=4, category=cls.category
+        )
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        before = cache_stats()
+        self.client.get("/api/products/")
+        self.client.get(f"/api/products/{self.product.id}/")
+        with self.assertNumQueries(0):
+            self.client.get("/api/products/")
+            self.client.get(f"/api/products/{self.product.id}/")
+        after = cache_stats()
+        self.assertEqual(after["hits"] - before["hits"], 2)
+        self.assertEqual(after["misses"] - before["misses"], 2)
+
+    def test_save_invalidates_list_and_detail(self):
+        self.client.get("/api/products/")
+        self.client.get(f"/api/products/{self.product.id}/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Box kite"
+            self.product.save()
+        self.assertEqual(self.client.get("/api/products/").data["results"][0]["name"], "Box kite")
+        self.assertEqual(self.client.get(f"/api/products/{self.product.id}/").data["name"], "Box kite")
+
+    def test_category_delete_invalidates_products(self):
+        self.client.get(f"/api/products/{self.product.id}/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertIsNone(self.client.get(f"/api/products/{self.product.id}/").data["category"])
+
+
+def load_settings(**environ):
+    """Run the settings module afresh with ``environ`` layered over the real environment."""
+    with mock.patch.dict(os.environ, environ):
+        return runpy.run_path(importlib.import_module(os.environ["DJANGO_SETTINGS_MODULE"]).__file__)
+
+
+class SettingsTests(SimpleTestCase):
+    production = {
+        "DJANGO_ENV": "production", "SECRET_KEY": "test",
+        "REDIS_URL": "redis://cache:6379/0", "THROTTLE_REDIS_URL": "redis://queue:6379/1",
+        "CELERY_BROKER_URL": "redis://queue:6379/0",
+    }
+
+    def test_production_requires_a_shared_catalog_cache(self):
+        self.assertEqual(load_settings(**self.production)["CACHES"]["catalog"]["LOCATION"], "redis://cache:6379/0")
+        with self.assertRaisesMessage(ImproperlyConfigured, "REDIS_URL"):
+            load_settings(**{**self.production, "REDIS_URL": ""})
+
+    def test_production_requires_a_shared_throttle_cache(self):
+        self.assertEqual(load_settings(**self.production)["CACHES"]["throttle"]["LOCATION"], "redis://queue:6379/1")
+        with self.assertRaisesMessage(ImproperlyConfigured, "THROTTLE_REDIS_URL"):
+            load_settings(**{**self.production, "THROTTLE_REDIS_URL": ""})
+
+    def test_production_requires_a_broker(self):
+        self.assertFalse(load_settings(**self.production)["CELERY_TASK_ALWAYS_EAGER"])
+        with self.assertRaisesMessage(ImproperlyConfigured, "CELERY_BROKER_URL"):
+            load_settings(**{**self.production, "CELERY_BROKER_URL": ""})
+
+    def test_replicas_require_a_shared_catalog_cache(self):
+        replicated = load_settings(DB_REPLICA_NAME="ecom_replica", REDIS_URL="redis://cache:6379/0")
+        self.assertEqual(replicated["DATABASE_REPLICAS"], ["replica"])
+        with self.assertRaisesMessage(ImproperlyConfigured, "read replicas"):
+            load_settings(DB_REPLICA_NAME="ecom_replica", REDIS_URL="")
+
+
+class StatelessAuthTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="token@example.com", email="token@example.com", password="s3cret-pass"
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        response = self.client.post(
+            "/api/auth/login/", {"email": "token@example.com", "password": "s3cret-pass"}, format="json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_user_row_is_not_loaded(self):
+        self.client.get("/api/cart/")
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/cart/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["user"], "token@example.com")
+
+    def test_full_user_is_loaded_on_demand(self):
+        response = self.client.get("/api/users/")
+        self.assertEqual(response.data["email"], "token@example.com")
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get("/api/cart/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/cart/").status_code, 401)
+
+    def test_staff_flag_is_read_from_the_user_not_the_token(self):
+        self.assertEqual(self.client.get("/api/products/export/").status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get("/api/products/export/").status_code, 200)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/products/export/").status_code, 403)
+
+
+class CatalogImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username="admin@example.com", password="pass", is_staff=True)
+        cls.existing = Product.objects.create(name="Old name", description="x", price=Decimal("1.00"), stock=1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, name, content):
+        if isinstance(content, str):
+            content = content.encode()
+        return self.client.post(
+            "/api/products/import/", {"file": SimpleUploadedFile(name, content)}, format="multipart"
+        )
+
+    def test_csv_import_upserts_and_reports_errors(self):
+        content = (
+            "id,name,description,price,stock,category\n"
+            f"{self.existing.id},New name,x,2.50,7,Garden\n"
+            ",Spade,Steel spade,19.99,3,Garden\n"
+            ",Broken,x,not-a-price,3,\n"
+        )
+        response = self.upload("products.csv", content)
+
+        self.assertEqual(response.data["imported"], 2)
+        self.assertEqual(response.data["rejected"], 1)
+        self.assertEqual(response.data["errors"][0]["row"], 3)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.stock), ("New name", 7))
+        garden = Category.objects.get(name="Garden")
+        self.assertEqual(garden.products.count(), 2)
+        # New rows must not collide with explicitly imported ids.
+        Product.objects.create(name="After", description="x", price=1, stock=1)
+
+    def test_jsonl_export_round_trips(self):
+        response = self.client.get("/api/products/export/?file_format=jsonl")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])["name"], "Old name")
+
+        Product.objects.all().delete()
+        response = self.upload("products.jsonl", "\n".join(lines))
+        self.assertEqual(response.data["imported"], 1)
+        self.assertTrue(Product.objects.filter(id=self.existing.id, name="Old name").exists())
+
+    def test_unreadable_rows_are_rejected(self):
+        response = self.upload(
+            "products.jsonl",
+            '{"name": "Rake", "description": "x", "price": "5.00", "stock": 1}\n{"name": "Hoe",\n[1, 2]\n',
+        )
+        self.assertEqual((response.status_code, response.data["imported"]), (200, 1))
+        self.assertEqual([error["row"] for error in response.data["errors"]], [2, 3])
+
+        content = "name,description,price,stock\nCaf\u00e9,x,1.00,1\nTea,x,1.00,1\n".encode("latin-1")
+        response = self.upload("products.csv", content)
+        self.assertEqual((response.status_code, response.data["imported"]), (200, 1))
+        self.assertEqual(response.data["errors"], [{"row": 1, "errors": ["Not valid UTF-8."]}])
+
+    def test_command_rejects_undecodable_rows_like_the_upload(self):
+        content = "name,description,price,stock\nCaf\u00e9,x,1.00,1\nTea,x,1.00,1\n".encode("latin-1")
+        stdout, stderr = StringIO(), StringIO()
+        with tempfile.NamedTemporaryFile(suffix=".csv") as f:
+            f.write(content)
+            f.flush()
+            call_command("import_products", f.name, stdout=stdout, stderr=stderr)
+        self.assertIn("Imported 1 products, rejected 1.", stdout.getvalue())
+        self.assertIn("Not valid UTF-8.", stderr.getvalue())
+
+    def test_last_row_wins_for_repeated_ids(self):
+        content = (
+            "id,name,description,price,stock\n"
+            f"{self.existing.id},First,x,1.00,1\n"
+            f"{self.existing.id},Second,x,1.00,2\n"
+        )
+        self.assertEqual(self.upload("products.csv", content).status_code, 200)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.stock), ("Second", 2))
+
+    def test_sharded_stock_goes_through_the_shards(self):
+        Product.objects.rebalance(self.existing.pk, 2)
+        content = f"id,name,description,price,stock\n{self.existing.id},Old name,x,1.00,9\n"
+        self.upload("products.csv", content)
+        self.assertEqual(
+            list(self.existing.inventory_shards.order_by("shard").values_list("stock", flat=True)), [5, 4]
+        )
+
+        InventoryShard.objects.filter(product=self.existing, shard=0).update(stock=1)
+        response = self.client.get("/api/products/export/?file_format=jsonl")
+        line = b"".join(response.streaming_content).decode().splitlines()[0]
+        self.assertEqual(json.loads(line)["stock"], 5)
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(User.objects.create_user(username="plain", password="pass"))
+        self.assertEqual(self.client.get("/api/products/export/").status_code, 403)
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="seeker@example.com", password="pass")
+        cls.garden = Category.objects.create(name="Garden")
+        cls.hose = Product.objects.create(
+            name="Garden hose", description="Flexible hose", price=Decimal("25.00"), stock=3, category=cls.garden
+        )
+        cls.reel = Product.objects.create(
+            name="Reel", description="Keeps a garden hose tidy", price=Decimal("40.00"), stock=3, category=cls.garden
+        )
+        cls.lamp = Product.objects.create(name="Lamp", description="Desk lamp", price=Decimal("15.00"), stock=3)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        response = self.client.get(f"/api/products/search/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search("q=hoses"), [self.hose.id, self.reel.id])
+
+    def test_filters(self):
+        self.assertEqual(self.search("q=hose&max_price=30"), [self.hose.id])
+        self.assertEqual(self.search(f"q=lamp&category={self.garden.id}"), [])
+
+    def test_keyset_pages(self):
+        first = self.client.get("/api/products/search/?q=hose&page_size=1").data
+        second = self.client.get(first["next"]).data
+        self.assertEqual([first["results"][0]["id"], second["results"][0]["id"]], [self.hose.id, self.reel.id])
+        self.assertIsNone(second["next"])
+
+    def test_vector_follows_updates(self):
+        self.lamp.description = "Lamp for the garden shed"
+        self.lamp.save()
+        self.assertIn(self.lamp.id, self.search("q=shed"))
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get("/api/products/search/").status_code, 400)
+
+
+@override_settings(ORDER_EVENTS_BATCH_SIZE=1)
+class OrderEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="mail@example.com", email="mail@example.com", password="pass")
+        cls.product = Product.objects.create(name="Mug", description="", price=Decimal("6.00"), stock=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_confirmation_is_sent_after_commit(self):
+        CartItem.objects.create(cart=self.user.cart, product=self.product, quantity=2)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post("/api/orders/")
+        self.assertEqual(mail.outbox, [])
+        # The event is stored with the order.
+        self.assertTrue(OrderEvent.objects.filter(order_id=response.data["order_id"]).exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(response.data["order_id"], mail.outbox[0].subject)
+        self.assertFalse(OrderEvent.objects.exists())
+
+    def test_events_are_processed_once(self):
+        order = Order.objects.create(user=self.user, total_price=Decimal("6.00"))
+        OrderEvent.objects.create(order_id=order.order_id)
+        process_placed_orders.delay()
+        process_placed_orders.delay()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_send_is_retried_without_resending_earlier_ones(self):
+        orders = [Order.objects.create(user=self.user, total_price=Decimal("6.00")) for _ in range(2)]
+        for order in orders:
+            OrderEvent.objects.create(order_id=order.order_id)
+        sent = []
+
+        def send_messages(messages):
+            if len(sent) == 1:
+                raise ConnectionError
+            sent.extend(messages)
+
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=send_messages):
+            with self.assertRaises(ConnectionError):
+                process_placed_orders()
+        self.assertEqual(list(OrderEvent.objects.values_list("order_id", flat=True)), [orders[1].order_id])
+
+        # Still claimed by the failed run until the claim runs out.
+        process_placed_orders.delay()
+        self.assertEqual(mail.outbox, [])
+        OrderEvent.objects.update(claimed_until=timezone.now())
+        process_placed_orders.delay()
+        self.assertEqual([message.subject for message in mail.outbox], [f"Order {orders[1].order_id} confirmed"])
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="async@example.com", password="s3cret-pass")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Async {i}", description="", price=Decimal("3.00"), stock=9) for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        response = self.client.post(
+            "/api/auth/login/", {"email": "async@example.com", "password": "s3cret-pass"}, format="json"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_product_list_matches_sync_view(self):
+        path = "products/?page_size=2&fields=id,name"
+        async_page = self.client.get(f"/api/async/{path}").json()
+        sync_page = self.client.get(f"/api/{path}").json()
+        self.assertEqual(async_page["results"], sync_page["results"])
+        self.assertEqual(
+            self.client.get(async_page["next"]).json()["results"][0]["id"], self.products[2].id
+        )
+
+    def test_cart_add_get_remove(self):
+        product = self.products[0]
+        for _ in range(2):
+            response = self.client.post("/api/async/cart/", {"product_id": product.id, "quantity": 2}, format="json")
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["quantity"], 4)
+
+        cart = self.client.get("/api/async/cart/").json()
+        self.assertEqual(cart, self.client.get("/api/cart/").json())
+        self.assertEqual(cart["total_price"], 12.0)
+
+        response = self.client.delete("/api/async/cart/", {"product_id": product.id}, format="json")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_cart_delete_needs_an_object_body(self):
+        response = self.client.delete("/api/async/cart/", [self.products[0].id], format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_cart_revalidation_matches_sync_view(self):
+        self.client.post("/api/async/cart/", {"product_id": self.products[0].id}, format="json")
+        response = self.client.get("/api/async/cart/")
+        etag = response["ETag"]
+        self.assertEqual(etag, self.client.get("/api/cart/")["ETag"])
+        self.assertIn("private", response["Cache-Control"])
+
+        response = self.client.get("/api/async/cart/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        self.client.post("/api/async/cart/", {"product_id": self.products[1].id}, format="json")
+        self.assertEqual(self.client.get("/api/async/cart/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get("/api/async/cart/").status_code, 401)
+
+
+class CartMutationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="mutate@example.com", password="pass")
+        cls.a, cls.b, cls.c = Product.objects.bulk_create(
+            Product(name=name, description="", price=Decimal("2.00"), stock=50) for name in "abc"
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_add_increments_and_holds_stock(self):
+        self.client.post("/api/cart/", {"product_id": self.a.id, "quantity": 2}, format="json")
+        # Savepoint, item upsert, hold lookup, reservation, hold upsert, release.
+        with self.assertNumQueries(6):
+            response = self.client.post("/api/cart/", {"product_id": self.a.id, "quantity": 3}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["quantity"], 5)
+        self.assertEqual(response.data["total_price"], Decimal("10.00"))
+        self.a.refresh_from_db()
+        self.assertEqual((self.a.reserved, self.a.available), (5, 45))
+
+    def test_add_unknown_product(self):
+        response = self.client.post("/api/cart/", {"product_id": 0}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch(self):
+        CartItem.objects.create(cart=self.user.cart, product=self.c, quantity=1)
+        operations = [
+            {"op": "add", "product_id": self.a.id, "quantity": 1},
+            {"op": "add", "product_id": self.a.id, "quantity": 2},
+            {"op": "set", "product_id": self.b.id, "quantity": 4},
+            {"op": "add", "product_id": self.b.id, "quantity": 1},
+            {"op": "remove", "product_id": self.c.id},
+        ]
+        response = self.client.post("/api/cart/batch/", {"operations": operations}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        quantities = {item["product"]: item["quantity"] for item in response.data["cart_items"]}
+        self.assertEqual(quantities, {self.a.id: 3, self.b.id: 5})
+        self.assertEqual(response.data["total_price"], Decimal("16.00"))
+
+    def test_out_of_range_values_are_rejected(self):
+        for data in ({"product_id": self.a.id, "quantity": 3_000_000_000}, {"product_id": 10**20}):
+            self.assertEqual(self.client.post("/api/cart/", data, format="json").status_code, 400)
+            response = self.client.post("/api/cart/batch/", {"operations": [data]}, format="json")
+            self.assertEqual(response.status_code, 400)
+
+    def test_delete_needs_an_object_body(self):
+        response = self.client.delete("/api/cart/", [self.a.id], format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.delete("/api/cart/", {"product_id": 10**20}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_quantity_is_capped(self):
+        Product.objects.rebalance(self.c.pk, 2, 10**6)
+        cap = settings.CART_ITEM_MAX_QUANTITY
+        operations = [{"product_id": self.c.id, "quantity": cap}] * 2
+        self.client.post("/api/cart/batch/", {"operations": operations}, format="json")
+        response = self.client.post("/api/cart/", {"product_id": self.c.id, "quantity": cap}, format="json")
+        self.assertEqual((response.status_code, response.data["quantity"]), (201, cap))
+
+    def test_batch_rejects_unknown_products(self):
+        response = self.client.post(
+            "/api/cart/batch/", {"operations": [{"product_id": 0, "quantity": 1}]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "needs concurrent connections")
+class ConcurrentCartAddTests(TransactionTestCase):
+    def test_concurrent_adds_are_not_lost(self):
+        user = User.objects.create_user(username="racer", password=None)
+        product = Product.objects.create(name="Hot", description="", price=Decimal("1.00"), stock=100)
+        barrier = threading.Barrier(10)
+
+        def add():
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                client.post("/api/cart/", {"product_id": product.id, "quantity": 1}, format="json")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(CartItem.objects.get(cart__user=user, product=product).quantity, 10)
+
+
+class UserAccountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def register(self, email):
+        return self.client.post(
+            "/api/auth/register/", {"email": email, "password": "s3cret-pass"}, format="json"
+        )
+
+    def test_registration_creates_user_and_cart(self):
+        # savepoint, user insert, cart insert, savepoint release
+        with self.assertNumQueries(4):
+            response = self.register("new@example.com")
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get(email="new@example.com").cart)
+
+    def test_duplicate_email_is_rejected(self):
+        self.assertEqual(self.register("dup@example.com").status_code, 201)
+        response = self.register("Dup@Example.com")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.filter(email__iexact="dup@example.com").count(), 1)
+
+    def test_profile_update_does_not_touch_cart(self):
+        user = User.objects.create_user(username="edit@example.com", email="edit@example.com")
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch("/api/users/", {"first_name": "Ed"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if "api_cart" in q["sql"]])
+
+    def test_case_variant_emails_stop_the_migration(self):
+        migration = importlib.import_module("api.migrations.0006_user_unique_email")
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX unique_user_email_ci")
+        first, second, other = (
+            User.objects.create_user(username=f"user{i}", email=email)
+            for i, email in enumerate(["Twin@example.com", "twin@EXAMPLE.com", "solo@example.com"])
+        )
+        with connection.schema_editor() as editor:
+            with self.assertRaisesMessage(RuntimeError, f"twin@example.com: user ids {first.pk}, {second.pk}"):
+                migration.check_duplicate_emails(None, editor)
+        emails = dict(User.objects.filter(pk__in=[first.pk, second.pk, other.pk]).values_list("pk", "email"))
+        self.assertEqual(emails, {user.pk: user.email for user in (first, second, other)})
+
+    def test_user_without_cart_gets_one_on_add(self):
+        user = User.objects.create_user(username="cartless@example.com")
+        product = Product.objects.create(name="Cup", description="", price=Decimal("2.00"), stock=3)
+        Cart.objects.filter(user=user).delete()
+        self.client.force_authenticate(user)
+        response = self.client.post("/api/cart/", {"product_id": product.id}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Cart.objects.get(user=user).items.get().quantity, 1)
+
+
+def throttle_rates(**rates):
+    return {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {**settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"], **rates},
+    }
+
+
+class LoginTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # A hash left over from the old PBKDF2 default.
+        cls.user = User.objects.create_user(username="login@example.com", email="login@example.com")
+        cls.user.password = PBKDF2PasswordHasher().encode("s3cret-pass", "legacysalt", iterations=1000)
+        cls.user.save()
+
+    def setUp(self):
+        caches[settings.THROTTLE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+
+    def login(self, password="s3cret-pass", email="login@example.com"):
+        return self.client.post("/api/auth/login/", {"email": email, "password": password}, format="json")
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2$argon2id$"))
+        self.assertEqual(self.login().status_code, 200)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login_account="3/min"))
+    def test_account_attempts_are_limited_before_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.login("wrong").status_code, 400)
+        with mock.patch("api.serializers.authenticate") as authenticate:
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        authenticate.assert_not_called()
+        self.assertEqual(self.login(email="other@example.com").status_code, 400)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login_account="3/min"))
+    def test_token_route_shares_the_account_limit(self):
+        for _ in range(2):
+            self.assertEqual(self.login("wrong").status_code, 400)
+        token = lambda: self.client.post(
+            "/api/token/", {"username": "login@example.com", "password": "wrong"}, format="json"
+        )
+        self.assertEqual(token().status_code, 401)
+        with mock.patch("rest_framework_simplejwt.serializers.authenticate") as authenticate:
+            self.assertEqual(token().status_code, 429)
+        authenticate.assert_not_called()
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login_ip="2/min"))
+    def test_ip_attempts_are_limited(self):
+        self.login("wrong", "a@example.com")
+        self.login("wrong", "b@example.com")
+        self.assertEqual(self.login().status_code, 429)
+
+    def test_non_object_body_is_rejected(self):
+        response = self.client.post("/api/auth/login/", ["login@example.com"], format="json")
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login_account="1/min"))
+    def test_counts_are_kept_apart_from_the_catalog_cache(self):
+        self.login("wrong")
+        get_cache().clear()
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response["Retry-After"]) <= 60)
+
+
+class OrderHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="history@example.com", password="pass")
+        other = User.objects.create_user(username="other@example.com", password="pass")
+        cls.products = Product.objects.bulk_create(
+            Product(name=f"Item {i}", description="", price=Decimal("3.00"), stock=10) for i in range(3)
+        )
+        cls.orders = Order.objects.bulk_create(
+            Order(user=cls.user, total_price=Decimal("9.00")) for _ in range(7)
+        )
+        cls.foreign = Order.objects.create(user=other, total_price=Decimal("3.00"))
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order, product=product, quantity=1, price=product.price, line_total=product.price,
+                created_at=order.created_at,
+            )
+            for order in cls.orders
+            for product in cls.products
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_cover_own_orders_once(self):
+        seen = []
+        url = "/api/orders/?page_size=3"
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(order["order_id"] for order in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(sorted(seen), sorted(str(order.order_id) for order in self.orders))
+
+    def test_detail(self):
+        order = self.orders[0]
+        response = self.client.get(f"/api/orders/{order.order_id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["items"]), 3)
+        self.assertEqual(response.data["items"][0]["product_name"], "Item 0")
+        self.assertEqual(response.data["items"][0]["line_total"], "3.00")
+
+        response = self.client.get(f"/api/orders/{self.foreign.order_id}/")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(QUERY_PROFILING_SAMPLE_RATE=1.0, METRICS_TOKEN="scrape-token")
+class QueryProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="profiled@example.com", password="pass")
+        Product.objects.create(name="Lamp", description="", price=Decimal("5.00"), stock=1)
+
+    def setUp(self):
+        profiling.reset()
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get("/api/cart/")
+        self.assertIn('db;dur=', response["Server-Timing"])
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+        self.client.get("/api/products/")
+
+        totals = profiling.snapshot()
+        self.assertEqual(totals["user_cart"]["sql_queries"], 2)
+        self.assertGreater(totals["product-list"]["serialize_seconds"], 0)
+
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertIn(
+            f'api_endpoint_sql_queries_total{{endpoint="user_cart",pid="{os.getpid()}"}} 2',
+            response.content.decode(),
+        )
+
+    @override_settings(STREAMING_LIST_MIN_ROWS=1)
+    def test_streamed_responses_are_recorded_once_sent(self):
+        response = self.client.get("/api/products/")
+        self.assertTrue(response.streaming)
+        self.assertEqual(profiling.snapshot(), {})
+
+        b"".join(response.streaming_content)
+        totals = profiling.snapshot()["product-list"]
+        self.assertEqual(totals["requests"], 1)
+        self.assertGreater(totals["sql_queries"], 0)
+        self.assertGreater(totals["serialize_seconds"], 0)
+
+    def test_workers_share_totals_through_the_metrics_dir(self):
+        profile = profiling.RequestProfile()
+        profile.queries["SELECT 1"] = 3
+        with tempfile.TemporaryDirectory() as directory, override_settings(QUERY_PROFILING_METRICS_DIR=directory):
+            with open(os.path.join(directory, "1.json"), "wb") as f:
+                f.write(orjson.dumps({"user_cart": {"sql_queries": 4}}))
+            profiling.record("user_cart", profile, 0.1, False)
+            pid = str(os.getpid())
+            self.assertEqual(profiling.collect()["1"], {"user_cart": {"sql_queries": 4}})
+            self.assertEqual(profiling.collect()[pid]["user_cart"]["sql_queries"], 3)
+
+            profiling.retire()
+            profiling.record("user_cart", profile, 0.1, False)
+            collected = profiling.collect()
+            self.assertEqual(collected["retired"]["user_cart"]["sql_queries"], 3)
+            self.assertEqual(collected[pid]["user_cart"]["sql_queries"], 3)
+
+    def test_repeated_statements_are_counted(self):
+        profile = profiling.RequestProfile()
+        with connection.execute_wrapper(profile):
+            for product in Product.objects.all():
+                Product.objects.get(pk=product.pk)
+                Product.objects.get(pk=product.pk)
+        self.assertEqual(profile.query_count, 3)
+        self.assertEqual(profile.duplicates, 1)
+        self.assertEqual(list(profile.repeated(2).values()), [2])
+
+    @override_settings(QUERY_PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get("/api/cart/")
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(profiling.snapshot(), {})
+
+
+class StockHoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username="alice@example.com", password="pass")
+        cls.bob = User.objects.create_user(username="bob@example.com", password="pass")
+        cls.product = Product.objects.create(name="Drop", description="", price=Decimal("4.00"), stock=5)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def add(self, user, quantity):
+        return self.client_for(user).post(
+            "/api/cart/", {"product_id": self.product.id, "quantity": quantity}, format="json"
+        )
+
+    def test_holds_limit_what_others_can_add(self):
+        self.assertEqual(self.add(self.alice, 3).status_code, 201)
+        self.assertEqual(self.add(self.bob, 3).status_code, 400)
+        self.assertFalse(CartItem.objects.filter(cart__user=self.bob).exists())
+        self.assertEqual(self.add(self.bob, 2).status_code, 201)
+
+        response = self.client_for(self.bob).get(f"/api/products/{self.product.id}/")
+        self.assertEqual(response.data["available"], 0)
+
+    def test_cached_product_follows_holds(self):
+        client = self.client_for(self.bob)
+        path = f"/api/products/{self.product.id}/"
+        first = client.get(path)
+        self.assertEqual(first.data["available"], 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add(self.alice, 3)
+        response = client.get(path, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual((response.status_code, response.data["available"]), (200, 2))
+
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            release_expired_holds()
+        self.assertEqual(client.get(path).data["available"], 5)
+
+    def test_remove_and_set_release_units(self):
+        self.add(self.alice, 4)
+        self.client_for(self.alice).post(
+            "/api/cart/batch/", {"operations": [{"op": "set", "product_id": self.product.id, "quantity": 1}]},
+            format="json",
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 1)
+
+        self.client_for(self.alice).delete("/api/cart/", {"product_id": self.product.id}, format="json")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_expired_holds_are_released(self):
+        self.add(self.alice, 5)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired_holds()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.reserved, self.product.available), (0, 5))
+        self.assertEqual(self.add(self.bob, 5).status_code, 201)
+
+    def test_checkout_consumes_holds(self):
+        self.add(self.alice, 2)
+        self.add(self.bob, 3)
+        self.assertEqual(self.client_for(self.alice).post("/api/orders/").status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (3, 3))
+        self.assertFalse(StockHold.objects.filter(cart__user=self.alice).exists())
+
+    def test_save_keeps_concurrent_reservations(self):
+        product = Product.objects.get(pk=self.product.pk)
+        self.add(self.alice, 2)
+        product.name = "Renamed"
+        product.save()
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.reserved), ("Renamed", 2))
+
+
+class ShardedInventoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="shard@example.com", password="pass")
+        cls.product = Product.objects.create(name="Hot", description="", price=Decimal("2.00"), stock=10)
+        Product.objects.rebalance(cls.product.pk, 4)
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, quantity):
+        self.client.post("/api/cart/", {"product_id": self.product.id, "quantity": quantity}, format="json")
+        return self.client.post("/api/orders/")
+
+    def shard_stock(self):
+        return list(self.product.inventory_shards.order_by("shard").values_list("stock", flat=True))
+
+    def test_rebalance_spreads_stock(self):
+        self.assertEqual(self.shard_stock(), [3, 3, 2, 2])
+
+    def test_checkout_takes_from_one_shard(self):
+        self.assertEqual(self.checkout(2).status_code, 201)
+        self.assertEqual(sum(self.shard_stock()), 8)
+        self.assertFalse(StockHold.objects.exists())
+        response = self.client.get(f"/api/products/{self.product.id}/")
+        self.assertEqual((response.data["stock"], response.data["available"]), (8, 8))
+
+    def test_stock_edits_are_spread_over_the_shards(self):
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_user(username="stocker", password=None, is_staff=True))
+        path = f"/api/products/{self.product.id}/"
+        response = admin.patch(path, {"stock": 100}, format="json")
+        self.assertEqual((response.data["stock"], response.data["available"]), (100, 100))
+        self.assertEqual(self.shard_stock(), [25, 25, 25, 25])
+
+        self.assertEqual(self.checkout(2).status_code, 201)
+        admin.patch(path, {"name": "Hotter"}, format="json")
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.stock, self.product.current_stock), ("Hotter", 100, 98))
+
+    def test_conditional_get_follows_shard_stock(self):
+        path = f"/api/products/{self.product.id}/"
+        etag = self.client.get(path)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.checkout(2)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data["stock"]), (200, 8))
+
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.rebalance(self.product.pk, 2, 20)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data["stock"]), (200, 20))
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_checkout_larger_than_any_shard(self):
+        self.assertEqual(self.checkout(7).status_code, 201)
+        self.assertEqual(sum(self.shard_stock()), 3)
+
+    def test_insufficient_stock_changes_nothing(self):
+        self.assertEqual(self.checkout(11).status_code, 400)
+        self.assertEqual(self.shard_stock(), [3, 3, 2, 2])
+        self.assertFalse(Order.objects.exists())
+
+    def test_rebalance_back_to_product_row(self):
+        self.checkout(4)
+        Product.objects.rebalance(self.product.pk, 0)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.shards, self.product.stock), (0, 6))
+        self.assertEqual(self.shard_stock(), [])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "needs the category stats triggers")
+class CategoryStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="stats@example.com", password="pass")
+        cls.books = Category.objects.create(name="Books")
+        cls.toys = Category.objects.create(name="Toys")
+        cls.novel = Product.objects.create(
+            name="Novel", description="", price=Decimal("12.00"), stock=1, category=cls.books
+        )
+        cls.atlas = Product.objects.create(
+            name="Atlas", description="", price=Decimal("40.00"), stock=0, category=cls.books
+        )
+        Product.objects.create(name="Comic", description="", price=Decimal("3.50"), stock=5, category=cls.books)
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stats(self, category):
+        row = CategoryStats.objects.filter(category=category).first()
+        if row is None:
+            return None
+        return (row.product_count, row.in_stock_count, row.min_price, row.max_price)
+
+    def test_counts_follow_inserts(self):
+        self.assertEqual(self.stats(self.books), (3, 2, Decimal("3.50"), Decimal("40.00")))
+        self.assertIsNone(self.stats(self.toys))
+
+    def test_price_range_is_recomputed_when_an_extreme_leaves(self):
+        self.atlas.price = Decimal("20.00")
+        self.atlas.save()
+        self.assertEqual(self.stats(self.books), (3, 2, Decimal("3.50"), Decimal("20.00")))
+
+        Product.objects.filter(name="Comic").delete()
+        self.assertEqual(self.stats(self.books), (2, 1, Decimal("12.00"), Decimal("20.00")))
+
+    def test_moving_a_product_updates_both_categories(self):
+        self.novel.category = self.toys
+        self.novel.save()
+        self.assertEqual(self.stats(self.books), (2, 1, Decimal("3.50"), Decimal("40.00")))
+        self.assertEqual(self.stats(self.toys), (1, 1, Decimal("12.00"), Decimal("12.00")))
+
+    def test_checkout_that_sells_out_updates_in_stock_count(self):
+        self.client.post("/api/cart/", {"product_id": self.novel.id, "quantity": 1}, format="json")
+        self.assertEqual(self.client.post("/api/orders/").status_code, 201)
+        self.assertEqual(self.stats(self.books), (3, 1, Decimal("3.50"), Decimal("40.00")))
+
+    def test_sharded_products_follow_sell_outs_and_restocks(self):
+        Product.objects.rebalance(self.novel.pk, shards=3, stock=3)
+        self.client.post("/api/cart/", {"product_id": self.novel.id, "quantity": 1}, format="json")
+        self.assertEqual(self.client.post("/api/orders/").status_code, 201)
+        self.assertEqual(self.stats(self.books), (3, 2, Decimal("3.50"), Decimal("40.00")))
+
+        self.client.post("/api/cart/", {"product_id": self.novel.id, "quantity": 2}, format="json")
+        self.assertEqual(self.client.post("/api/orders/").status_code, 201)
+        self.assertEqual(self.stats(self.books), (3, 1, Decimal("3.50"), Decimal("40.00")))
+
+        Product.objects.rebalance(self.novel.pk, stock=4)
+        self.assertEqual(self.stats(self.books), (3, 2, Decimal("3.50"), Decimal("40.00")))
+
+    def test_summary_is_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/category/summary/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            [(row["name"], row["product_count"], row["in_stock_count"], row["min_price"], row["max_price"])
+             for row in response.data],
+            [("Books", 3, 2, "3.50", "40.00"), ("Toys", 0, 0, None, None)],
+        )
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="etag@example.com", password="pass")
+        cls.category = Category.objects.create(name="Lamps")
+        cls.lamp = Product.objects.create(
+            name="Lamp", description="", price=Decimal("30.00"), stock=5, category=cls.category
+        )
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def revalidate(self, path, etag):
+        return self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+    def test_only_the_canonical_product_path_is_served(self):
+        self.assertEqual(self.client.get(f"/api/products/{self.lamp.id}/").status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/api/products/0{self.lamp.id}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_product_revalidation_needs_no_query(self):
+        path = f"/api/products/{self.lamp.id}/"
+        first = self.client.get(path)
+        self.assertEqual(first["Last-Modified"], http_date(self.lamp.updated_at.timestamp()))
+        self.assertIn("no-cache", first["Cache-Control"])
+
+        with self.assertNumQueries(0):
+            response = self.revalidate(path, first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lamp.price = Decimal("25.00")
+            self.lamp.save()
+        response = self.revalidate(path, first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+        self.assertEqual(response.data["price"], "25.00")
+
+    def test_list_etag_changes_with_any_category(self):
+        first = self.client.get("/api/category/")
+        self.assertEqual(self.revalidate("/api/category/", first["ETag"]).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.description = "Lighting"
+            self.category.save()
+        self.assertEqual(self.revalidate("/api/category/", first["ETag"]).status_code, 200)
+
+    def test_cart_revalidation_skips_items(self):
+        self.client.post("/api/cart/", {"product_id": self.lamp.id, "quantity": 1}, format="json")
+        first = self.client.get("/api/cart/")
+        self.assertIn("private", first["Cache-Control"])
+
+        with self.assertNumQueries(1):
+            response = self.revalidate("/api/cart/", first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_cart_etag_follows_every_change(self):
+        etags = [self.client.get("/api/cart/")["ETag"]]
+
+        def changed():
+            etag = self.client.get("/api/cart/")["ETag"]
+            self.assertNotIn(etag, etags)
+            etags.append(etag)
+
+        self.client.post("/api/cart/", {"product_id": self.lamp.id, "quantity": 1}, format="json")
+        changed()
+        self.client.post(
+            "/api/cart/batch/",
+            {"operations": [{"op": "set", "product_id": self.lamp.id, "quantity": 2}]},
+            format="json",
+        )
+        changed()
+        self.lamp.price = Decimal("31.00")
+        self.lamp.save()
+        changed()
+        self.client.delete("/api/cart/", {"product_id": self.lamp.id}, format="json")
+        changed()
+        self.client.post("/api/cart/", {"product_id": self.lamp.id, "quantity": 1}, format="json")
+        self.assertEqual(self.client.post("/api/orders/").status_code, 201)
+        changed()
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username="analyst@example.com", password="pass", is_staff=True)
+        cls.garden = Category.objects.create(name="Garden")
+        cls.rake = Product.objects.create(
+            name="Rake", description="", price=Decimal("20.00"), stock=100, category=cls.garden
+        )
+        cls.hose = Product.objects.create(name="Hose", description="", price=Decimal("15.00"), stock=100)
+        cls.day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2)
+
+    def place(self, at, *lines):
+        order = Order.objects.create(user=self.admin, total_price=sum(price * qty for _, qty, price in lines))
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, product=product, quantity=qty, price=price, line_total=price * qty,
+                created_at=order.created_at,
+            )
+            for product, qty, price in lines
+        ])
+        Order.objects.filter(pk=order.pk).update(created_at=self.day + at)
+        order.items.update(created_at=self.day + at)
+
+    def advance(self, until=timedelta(days=1)):
+        return RollupMark.objects.advance("sales", self.day + until, timedelta(hours=1))
+
+    def product_sales(self, period):
+        return list(
+            ProductSales.objects.filter(period=period, product=self.rake)
+            .order_by("bucket")
+            .values_list("bucket", "units", "revenue", "orders", "min_price", "max_price")
+        )
+
+    def test_hourly_and_daily_rollups(self):
+        self.place(timedelta(hours=9, minutes=5), (self.rake, 2, Decimal("20.00")), (self.hose, 1, Decimal("15.00")))
+        self.place(timedelta(hours=9, minutes=50), (self.rake, 1, Decimal("18.00")))
+        self.place(timedelta(hours=14), (self.rake, 3, Decimal("20.00")))
+        self.advance()
+
+        nine, two = self.day + timedelta(hours=9), self.day + timedelta(hours=14)
+        self.assertEqual(self.product_sales("hour"), [
+            (nine, 3, Decimal("58.00"), 2, Decimal("18.00"), Decimal("20.00")),
+            (two, 3, Decimal("60.00"), 1, Decimal("20.00"), Decimal("20.00")),
+        ])
+        self.assertEqual(self.product_sales("day"), [
+            (self.day, 6, Decimal("118.00"), 3, Decimal("18.00"), Decimal("20.00")),
+        ])
+        self.assertEqual(
+            set(CategorySales.objects.filter(period="day").values_list("category", "units", "revenue", "orders")),
+            {(self.garden.id, 6, Decimal("118.00"), 3), (None, 1, Decimal("15.00"), 1)},
+        )
+
+    def test_legacy_lines_are_left_out(self):
+        self.place(timedelta(hours=9), (self.rake, 2, Decimal("20.00")))
+        self.place(timedelta(hours=10), (self.rake, 1, Decimal("20.00")))
+        OrderItem.objects.filter(created_at=self.day + timedelta(hours=10)).update(legacy=True)
+        self.advance()
+        self.assertEqual(self.product_sales("day"), [
+            (self.day, 2, Decimal("40.00"), 1, Decimal("20.00"), Decimal("20.00")),
+        ])
+
+    def test_increments_count_every_order_once(self):
+        self.place(timedelta(hours=1), (self.rake, 1, Decimal("20.00")))
+        self.place(timedelta(hours=5), (self.rake, 1, Decimal("20.00")))
+        self.advance(until=timedelta(hours=3))
+        self.assertEqual(self.product_sales("day")[0][1], 1)
+
+        self.place(timedelta(hours=4), (self.rake, 2, Decimal("20.00")))
+        self.assertEqual(self.advance(), 1)
+        self.assertEqual(self.advance(), 0)
+        self.assertEqual(self.product_sales("day")[0][1:4], (4, Decimal("80.00"), 3))
+        self.assertEqual(RollupMark.objects.get(name="sales").position, self.day + timedelta(hours=5))
+
+    def test_backfill_rebuild_matches_incremental(self):
+        self.place(timedelta(hours=2), (self.rake, 1, Decimal("20.00")))
+        self.place(timedelta(hours=30), (self.rake, 2, Decimal("19.00")))
+        self.advance(until=timedelta(days=2))
+        incremental = self.product_sales("day")
+
+        call_command("backfill_sales_rollups", "--rebuild", "--chunk-hours=6", stdout=StringIO())
+        self.assertEqual(self.product_sales("day"), incremental)
+
+    def test_report_reads_rollups_only(self):
+        self.place(timedelta(hours=9), (self.rake, 2, Decimal("20.00")))
+        self.advance()
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/api/reports/sales/", {"by": "category", "period": "hour"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row["category"], row["units"], row["revenue"]) for row in response.data["results"]],
+            [(self.garden.id, 2, "40.00")],
+        )
+        self.assertFalse(any("api_order" in query["sql"] for query in queries.captured_queries))
+
+        self.assertEqual(client.get("/api/reports/sales/", {"by": "category", "product": 1}).status_code, 400)
+        client.force_authenticate(User.objects.create_user(username="shopper@example.com", password="pass"))
+        self.assertEqual(client.get("/api/reports/sales/").status_code, 403)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "needs declarative partitioning")
+class OrderPartitioningTests(TestCase):
+    migration = importlib.import_module("api.migrations.0013_order_partitioning")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="archive@example.com", password="pass")
+        cls.product = Product.objects.create(name="Vase", description="", price=Decimal("9.00"), stock=10)
+        cls.old = Order.objects.create(user=cls.user, total_price=Decimal("9.00"))
+        OrderItem.objects.create(
+            order=cls.old, product=cls.product, quantity=1, price=Decimal("9.00"), line_total=Decimal("9.00"),
+            created_at=cls.old.created_at,
+        )
+        march = datetime(2025, 3, 10, tzinfo=dt_timezone.utc)
+        Order.objects.filter(pk=cls.old.pk).update(created_at=march)
+        OrderItem.objects.filter(order=cls.old).update(created_at=march)
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            # ALTER TABLE refuses to run with deferred checks still pending.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        self.migration.convert(connection, True)
+        # The test database may have been partitioned before March had orders.
+        partitions.ensure_partitions(datetime(2025, 3, 1, tzinfo=dt_timezone.utc), 0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def partition_of(self, table, **filters):
+        with connection.cursor() as cursor:
+            key, value = next(iter(filters.items()))
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {table} WHERE {key} = %s", [value])
+            return {name for (name,) in cursor.fetchall()}
+
+    def test_orders_are_routed_to_monthly_partitions(self):
+        self.client.post("/api/cart/", {"product_id": self.product.id, "quantity": 2}, format="json")
+        response = self.client.post("/api/orders/")
+        self.assertEqual(response.status_code, 201)
+
+        order_id = uuid.UUID(response.data["order_id"])
+        self.assertEqual(order_id.version, 7)
+        month = f"{timezone.now():%Y_%m}"
+        self.assertEqual(self.partition_of("api_order", order_id=order_id), {f"api_order_p{month}"})
+        self.assertEqual(self.partition_of("api_orderitem", order_id=order_id), {f"api_orderitem_p{month}"})
+        self.assertEqual(self.partition_of("api_order", order_id=self.old.pk), {"api_order_p2025_03"})
+
+        history = self.client.get("/api/orders/").data["results"]
+        self.assertEqual([len(order["items"]) for order in history], [1, 1])
+
+    def test_archive_detaches_old_months(self):
+        self.assertEqual(partitions.archive(datetime(2025, 4, 1, tzinfo=dt_timezone.utc)), [
+            datetime(2025, 3, 1, tzinfo=dt_timezone.utc),
+        ])
+        self.assertFalse(Order.objects.filter(pk=self.old.pk).exists())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM api_orderitem_p2025_03")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_ensure_partitions_creates_missing_months(self):
+        far = timezone.now() + timedelta(days=366)
+        self.assertEqual(
+            partitions.ensure_partitions(far, 0), [f"api_order_p{far:%Y_%m}", f"api_orderitem_p{far:%Y_%m}"]
+        )
+        self.assertEqual(partitions.ensure_partitions(far, 0), [])
+
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        far = timezone.now() + timedelta(days=2 * 366)
+        Order.objects.filter(pk=self.old.pk).update(created_at=far)
+        OrderItem.objects.filter(order=self.old).update(created_at=far)
+        self.assertEqual(self.partition_of("api_order", order_id=self.old.pk), {"api_order_default"})
+
+        partitions.ensure_partitions(far, 0)
+        self.assertEqual(self.partition_of("api_order", order_id=self.old.pk), {f"api_order_p{far:%Y_%m}"})
+        self.assertEqual(self.partition_of("api_orderitem", order_id=self.old.pk), {f"api_orderitem_p{far:%Y_%m}"})
+        self.assertEqual(self.old.items.count(), 1)
+
+    def test_converts_back_to_plain_tables(self):
+        self.migration.convert(connection, False)
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(self.old.items.count(), 1)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TestCase):
+    # The replica alias mirrors the test database over its own connection,
+    # outside the test transaction, so it cannot see rows written here: it
+    # stands in for a replica that has not caught up yet.
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="replica@example.com", password="pass")
+        cls.category = Category.objects.create(name="Maps")
+        cls.atlas = Product.objects.create(
+            name="Atlas", description="", price=Decimal("40.00"), stock=5, category=cls.category
+        )
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as primary, CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response, len(primary), len(replica)
+
+    def test_catalog_and_history_reads_use_replica(self):
+        for path in ("/api/products/", "/api/category/", "/api/category/summary/", "/api/orders/"):
+            with self.subTest(path=path):
+                _, primary, replica = self.get(path)
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+        # The replica has not seen the product yet.
+        self.assertEqual(self.client.get(f"/api/products/{self.atlas.id}/").status_code, 404)
+
+    def test_writes_pin_user_to_primary(self):
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.post("/api/cart/", {"product_id": self.atlas.id, "quantity": 1}, format="json")
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(self.client.post("/api/orders/").status_code, 201)
+        self.assertEqual(len(replica), 0)
+
+        response, primary, replica = self.get("/api/orders/")
+        self.assertEqual(replica, 0)
+        self.assertEqual(len(response.data["results"]), 1)
+
+        get_cache().clear()
+        response, primary, replica = self.get("/api/orders/")
+        self.assertEqual(primary, 0)
+        self.assertEqual(response.data["results"], [])
+
+    def test_failed_write_does_not_pin(self):
+        response = self.client.post("/api/cart/", {"product_id": 0, "quantity": 1}, format="json")
+        self.assertGreaterEqual(response.status_code, 400)
+        _, primary, _ = self.get("/api/orders/")
+        self.assertEqual(primary, 0)
+
+    def test_recently_changed_catalog_is_built_from_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.atlas.price = Decimal("35.00")
+            self.atlas.save()
+        response = self.client.get(f"/api/products/{self.atlas.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["price"], "35.00")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_reads_primary(self):
+        _, primary, replica = self.get("/api/products/")
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+
+class CompiledSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="compiled@example.com", password="pass")
+        cls.category = Category.objects.create(name="Signs \u2028 & symbols", description="Ünïcode")
+        Product.objects.create(name="Plain", description="", price=Decimal("0.10"), stock=4, category=cls.category)
+        Product.objects.create(name="Orphan \u2029", description="x" * 300, price=Decimal("99999999.99"), stock=0)
+        hot = Product.objects.create(name="Hot", description="", price=Decimal("12.50"), stock=9, category=cls.category)
+        Product.objects.rebalance(hot.pk, 3)
+        Product.objects.filter(pk=hot.pk).update(reserved=2)
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertSameBytes(self, compiled_data, serializer):
+        self.assertEqual(ORJSONRenderer().render(compiled_data), JSONRenderer().render(serializer.data))
+
+    def test_product_rows_match_serializer(self):
+        queryset = Product.objects.with_live_stock().order_by("id")
+        for fields in (None, ("name", "price", "stock"), ("available", "category", "updated_at")):
+            for zone in ("UTC", "Asia/Kolkata"):
+                with self.subTest(fields=fields, zone=zone), timezone.override(zone):
+                    compiled = compile_serializer(ProductSerializer, fields, ("created_at", "id"))
+                    self.assertSameBytes(
+                        compiled.data(compiled.rows(queryset)),
+                        ProductSerializer(queryset, many=True, fields=fields and list(fields)),
+                    )
+
+    def test_category_and_cart_item_rows_match_serializer(self):
+        compiled = compile_serializer(CategorySerializer)
+        categories = Category.objects.all()
+        self.assertSameBytes(compiled.data(compiled.rows(categories)), CategorySerializer(categories, many=True))
+
+        for product in Product.objects.all():
+            self.client.post("/api/cart/", {"product_id": product.id, "quantity": 1}, format="json")
+        items = CartItem.objects.with_line_totals().order_by("id")
+        compiled = compile_serializer(CartItemSerializer)
+        self.assertSameBytes(compiled.data(compiled.rows(items)), CartItemSerializer(items, many=True))
+
+    def test_views_match_serializer_output(self):
+        for product in Product.objects.all():
+            self.client.post("/api/cart/", {"product_id": product.id, "quantity": 2}, format="json")
+        cart = Cart.objects.select_related("user").with_items().get(user=self.user)
+        self.assertEqual(self.client.get("/api/cart/").content, JSONRenderer().render(UserCartSerializer(cart).data))
+
+        products = Product.objects.with_live_stock().order_by("created_at", "id")
+        page = self.client.get("/api/products/?page_size=2")
+        self.assertEqual(
+            page.content,
+            JSONRenderer().render({"next": page.data["next"], "results": ProductSerializer(products[:2], many=True).data}),
+        )
+        rest = self.client.get(page.data["next"]).data["results"]
+        self.assertEqual([row["id"] for row in rest], [products[2].id])
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            "when": timezone.now(),
+            "day": timezone.now().date(),
+            "price": Decimal("19.99"),
+            "order": uuid.uuid4(),
+            "lazy": gettext_lazy("Invalid cursor"),
+            "big": 2 ** 70,
+            "nested": [{"a": None, 1: True, "text": "line\u2028break"}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            ORJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+
+    def test_unsupported_fields_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compile_serializer(OrderSerializer)
+
+
+@override_settings(STREAMING_LIST_MIN_ROWS=3, STREAMING_LIST_CHUNK_SIZE=2, COMPRESSION_MIN_SIZE=200)
+class StreamingCompressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="stream@example.com", password="pass")
+        category = Category.objects.create(name="Rugs")
+        Product.objects.bulk_create(
+            Product(name=f"Rug {i}", description="woven " * 50, price=Decimal("5.00") + i, stock=i, category=category)
+            for i in range(7)
+        )
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def body(self, response):
+        return b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_large_pages_stream_the_same_rows(self):
+        with override_settings(STREAMING_LIST_MIN_ROWS=100):
+            buffered = self.client.get("/api/products/?page_size=3")
+        self.assertFalse(buffered.streaming)
+
+        get_cache().clear()
+        streamed = self.client.get("/api/products/?page_size=3")
+        self.assertTrue(streamed.streaming)
+        page = json.loads(self.body(streamed))
+        self.assertEqual(page, json.loads(buffered.content))
+
+        seen = [row["id"] for row in page["results"]]
+        while page["next"]:
+            page = json.loads(self.body(self.client.get(page["next"])))
+            seen += [row["id"] for row in page["results"]]
+        self.assertEqual(seen, list(Product.objects.order_by("created_at", "id").values_list("id", flat=True)))
+
+    def test_bad_cursor_is_rejected_before_streaming(self):
+        response = self.client.get("/api/products/?page_size=3&cursor=garbage")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.streaming)
+
+    def test_render_stream(self):
+        renderer = StreamingJSONListRenderer()
+        suffix = lambda: b',"next":null}'
+        self.assertEqual(
+            b"".join(renderer.render_stream([[], [{"a": 1}], [], [{"a": 2}, {"a": 3}]], b'{"results":', suffix)),
+            b'{"results":[{"a":1},{"a":2},{"a":3}],"next":null}',
+        )
+        self.assertEqual(b"".join(renderer.render_stream([[]], b'{"results":', suffix)), b'{"results":[],"next":null}')
+
+    def test_streamed_page_revalidates(self):
+        first = self.client.get("/api/products/?page_size=5")
+        self.body(first)
+        response = self.client.get("/api/products/?page_size=5", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_choose_encoding(self):
+        best = next(iter(compression.ENCODERS))
+        self.assertEqual(compression.choose_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(compression.choose_encoding("*"), best)
+        self.assertEqual(compression.choose_encoding("gzip;q=0.5, *;q=0.1"), "gzip")
+        self.assertIsNone(compression.choose_encoding("gzip;q=0, identity"))
+        self.assertIsNone(compression.choose_encoding(""))
+
+    def test_buffered_response_is_gzipped(self):
+        response = self.client.get("/api/products/?page_size=2", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        plain = self.client.get("/api/products/?page_size=2")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        small = self.client.get("/api/products/?page_size=1&fields=id", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(small.has_header("Content-Encoding"))
+
+    def test_streamed_response_is_compressed_incrementally(self):
+        plain = self.body(self.client.get("/api/products/?page_size=7"))
+        for coding in compression.ENCODERS:
+            with self.subTest(coding=coding):
+                response = self.client.get("/api/products/?page_size=7", HTTP_ACCEPT_ENCODING=coding)
+                self.assertEqual(response["Content-Encoding"], coding)
+                self.assertFalse(response.has_header("Content-Length"))
+                chunks = list(response.streaming_content)
+                self.assertGreater(len(chunks), 1)
+                decoded = {
+                    "gzip": gzip.decompress,
+                    "br": lambda data: compression.brotli.decompress(data),
+                    "zstd": lambda data: compression.zstandard.ZstdDecompressor().decompressobj().decompress(data),
+                }[coding](b"".join(chunks))
+                self.assertEqual(decoded, plain)
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginRateThrottle(SimpleRateThrottle):
+    """
+    Allows the scope's rate of login attempts per key in each fixed window.
+
+    Attempts are counted with an atomic ``incr`` in the ``throttle`` cache,
+    which is shared between workers and never evicts keys, so concurrent
+    attempts cannot slip past the limit the way they can through
+    ``SimpleRateThrottle``'s read-modify-write history. A client may spend
+    one window's allowance at its end and the next at its start.
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE_ALIAS]
+
+    @property
+    def THROTTLE_RATES(self):
+        # Read per request so overridden settings take effect.
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.window_end = (window + 1) * self.duration
+        key = f"{key}:{window}"
+        self.cache.add(key, 0, self.duration)
+        return self.cache.incr(key) <= self.num_requests
+
+    def wait(self):
+        return self.window_end - self.now
+
+
+class LoginIPThrottle(LoginRateThrottle):
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class LoginAccountThrottle(LoginRateThrottle):
+    scope = "login_account"
+    # The body field naming the account. Usernames are the sign-up email, so
+    # both login routes count against the same key.
+    field = "email"
+
+    def get_cache_key(self, request, view):
+        # The body may be any JSON value, such as a list.
+        email = request.data.get(self.field) if isinstance(request.data, dict) else None
+        if not isinstance(email, str) or not email:
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": email.strip().lower()}
+
+
+class TokenAccountThrottle(LoginAccountThrottle):
+    field = "username"
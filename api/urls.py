@@ -7,6 +7,10 @@ from .views import (
     CategoryViewSet, 
     ProductViewSet,
     UserCartView,
+    UserCartBatchView,
+    UserOrderView,
+    UserOrderDetailView,
+    SalesReportView,
 )
 
 
@@ -21,4 +25,8 @@ urlpatterns = [
     path("auth/login/", UserLoginView.as_view(), name="user_login"),
     path("users/", GetUpdateUserView.as_view(), name="get_or_update_user"),
     path("cart/", UserCartView.as_view(), name="user_cart"),
+    path("cart/batch/", UserCartBatchView.as_view(), name="user_cart_batch"),
+    path("orders/", UserOrderView.as_view(), name="user_orders"),
+    path("orders/<uuid:order_id>/", UserOrderDetailView.as_view(), name="user_order_detail"),
+    path("reports/sales/", SalesReportView.as_view(), name="sales_report"),
 ] + router.urls
\ No newline at end of file
@@ -1,37 +1,114 @@
+import codecs
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
 from rest_framework import generics, views, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import ( 
     UserSerializer,
     UserRegisterSerializer, 
     UserLoginSerializer, 
     UserUpdateSerializer,
     CategorySerializer,
+    CategorySummarySerializer,
     ProductSerializer,
     OrderSerializer,
     UserCartSerializer,
+    ProductSearchSerializer,
+    CartItemSerializer,
+    CartOperationSerializer,
+    CartBatchSerializer,
+    SalesReportSerializer,
+    ProductSalesSerializer,
+    CategorySalesSerializer,
     )
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.db.models import Case, F, Sum, PositiveIntegerField, When
-from .models import User, Cart, Order, Product, Category, CartItem, OrderItem
+from django.db.models import Case, F, FloatField, PositiveIntegerField, Prefetch, Q, When
+from django.db.models.functions import Cast, Coalesce
+from .models import (
+    User, Cart, Order, Product, Category, CartItem, OrderItem, StockHold, InventoryShard, InsufficientStock,
+    ProductSales, CategorySales,
+)
+from .authentication import ClaimsRefreshToken
+from .cache import CachedResponseMixin, entity_tag, invalidate_on_commit, not_modified, set_validators
+from .catalog_io import FORMATS, export_products, import_products, read_rows
+from .compiled import CompiledListMixin, compile_serializer
+from .events import publish_order_placed
+from .pagination import KeysetPagination, OrderHistoryPagination, SalesReportPagination, SearchRankPagination
+from .routers import ReplicaReadMixin
+from .throttling import LoginAccountThrottle, LoginIPThrottle, TokenAccountThrottle
+
+
+
+# Serialized product fields computed from other columns.
+DERIVED_PRODUCT_FIELDS = {"stock": ("stock", "shards"), "available": ("stock", "reserved", "shards")}
+
+
+def parse_product_fields(requested):
+    """Known product fields named in a ``fields=a,b`` parameter, or None."""
+    if not requested:
+        return None
+    allowed = {field.name for field in Product._meta.concrete_fields} - {"search_vector", "reserved", "shards"}
+    allowed |= set(DERIVED_PRODUCT_FIELDS)
+    fields = [name for name in requested.split(",") if name in allowed]
+    return fields or None
+
+
+def project_products(queryset, fields, pagination_class):
+    if not fields:
+        return queryset
+    columns = [column for name in fields for column in DERIVED_PRODUCT_FIELDS.get(name, (name,))]
+    # The keyset columns are always needed to build the next cursor.
+    ordering = [name.lstrip("-") for name in pagination_class.ordering]
+    concrete = {field.name for field in Product._meta.concrete_fields}
+    return queryset.only(*columns, *(name for name in ordering if name in concrete))
+
 
+def cart_entity_tag(cart, format):
+    """
+    ETag of a cart from ``Cart.objects.with_totals()``. The version covers
+    item changes and ``priced_at`` price changes, so a revalidation is
+    answered before any item is loaded.
+    """
+    return entity_tag(cart.version, cart.priced_at, format)
+
+
+def cart_item_rows(cart):
+    items = CartItem.objects.with_line_totals().filter(cart_id=cart.id)
+    return compile_serializer(CartItemSerializer).rows(items)
+
+
+def cart_data(cart, rows):
+    """UserCartSerializer's output, with the items read as rows by ``cart_item_rows``."""
+    items = compile_serializer(CartItemSerializer).data(rows)
+    return {"id": cart.id, "user": str(cart.user), "cart_items": items, "total_price": cart.items_total or 0}
 
 
 class UserRegisterView(generics.CreateAPIView):
     users = User.objects.all()
     serializer_class = UserRegisterSerializer
 
+class TokenObtainView(TokenObtainPairView):
+    throttle_classes = [LoginIPThrottle, TokenAccountThrottle]
+
+
 class UserLoginView(generics.GenericAPIView):
     serializer_class = UserLoginSerializer
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
         
-        refresh = RefreshToken.for_user(user=user)
+        refresh = ClaimsRefreshToken.for_user(user=user)
         r_token = str(refresh)
         access = str(refresh.access_token)
 
@@ -47,9 +124,9 @@ class GetUpdateUserView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated,]
 
     def get_object(self):
-        return self.request.user
+        return get_object_or_404(User, pk=self.request.user.pk)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, CachedResponseMixin, CompiledListMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
@@ -60,17 +137,102 @@ class CategoryViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        """Product counts and price ranges per category, read from ``CategoryStats``."""
+        categories = Category.objects.order_by("name", "id").annotate(
+            product_count=Coalesce("stats__product_count", 0),
+            in_stock_count=Coalesce("stats__in_stock_count", 0),
+            min_price=F("stats__min_price"),
+            max_price=F("stats__max_price"),
+        )
+        return Response(CategorySummarySerializer(categories, many=True).data)
+
+class ProductViewSet(ReplicaReadMixin, CachedResponseMixin, CompiledListMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.defer("search_vector").with_live_stock()
     serializer_class = ProductSerializer
+    pagination_class = KeysetPagination
+    streamed = True
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'import_catalog', 'export_catalog']:
             permission_classes = [IsAdminUser]
         else:
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def get_file_format(self, default=None):
+        file_format = self.request.query_params.get("file_format", default)
+        if file_format not in FORMATS:
+            return None
+        return file_format
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_catalog(self, request):
+        """Upsert products from an uploaded CSV or JSON Lines ``file``."""
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"error": "Upload the catalog as 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = self.get_file_format(upload.name.rsplit(".", 1)[-1].lower())
+        if file_format is None:
+            return Response({"error": "file_format must be csv or jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Undecodable bytes are kept as surrogates, so read_rows can reject
+        # just the records they are in.
+        lines = codecs.iterdecode(upload, "utf-8", errors="surrogateescape")
+        result = import_products(read_rows(lines, file_format))
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export_catalog(self, request):
+        file_format = self.get_file_format("csv")
+        if file_format is None:
+            return Response({"error": "file_format must be csv or jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+        response = StreamingHttpResponse(export_products(file_format), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="products.{file_format}"'
+        return response
+
+    @action(detail=False, methods=["get"], pagination_class=SearchRankPagination)
+    def search(self, request):
+        """Full-text search over name and description, best matches first."""
+        params = ProductSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        query = SearchQuery(filters["q"], config="english", search_type="websearch")
+        queryset = self.get_queryset().filter(search_vector=query)
+        if "category" in filters:
+            queryset = queryset.filter(category_id=filters["category"])
+        if "min_price" in filters:
+            queryset = queryset.filter(price__gte=filters["min_price"])
+        if "max_price" in filters:
+            queryset = queryset.filter(price__lte=filters["max_price"])
+        # ts_rank() is a real; as a double it round-trips exactly through the cursor.
+        queryset = queryset.annotate(rank=Cast(SearchRank(F("search_vector"), query), FloatField()))
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_requested_fields(self):
+        """Fields selected with ``?fields=a,b`` on reads, or None for all of them."""
+        if self.action not in ("list", "retrieve", "search"):
+            return None
+        return parse_product_fields(self.request.query_params.get("fields"))
+
+    def get_queryset(self):
+        return project_products(super().get_queryset(), self.get_requested_fields(), self.pagination_class)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_compiled_serializer(self, fields=None):
+        fields = self.get_requested_fields()
+        return super().get_compiled_serializer(tuple(fields) if fields else None)
+
 class UserCartView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = UserCartSerializer
@@ -78,81 +240,222 @@ class UserCartView(generics.GenericAPIView):
     
     def get(self, request):
         """List items in the user's cart."""
-        cart = request.user.cart
-        serializer = UserCartSerializer(cart)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        cart = get_object_or_404(Cart.objects.select_related("user").with_totals(), user_id=request.user.id)
+        etag = cart_entity_tag(cart, request.accepted_renderer.format)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
 
-    def post(self, request):
-        product_id = request.data.get("product_id")
-        quantity = request.data.get("quantity", 1)
+        response = Response(cart_data(cart, cart_item_rows(cart)), status=status.HTTP_200_OK)
+        set_validators(response, etag, private=True)
+        return response
 
-        product = get_object_or_404(Product, id=product_id)
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
-        
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart, product=product, defaults={"quantity": quantity}
-        )
+    def post(self, request):
+        data = CartOperationSerializer(data=request.data)
+        data.is_valid(raise_exception=True)
+        if data.validated_data["op"] != "add":
+            return Response({"error": "Use the batch endpoint for set/remove"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        try:
+            items = CartItem.objects.add(
+                request.user.id, {data.validated_data["product_id"]: data.validated_data["quantity"]}
+            )
+        except InsufficientStock:
+            return Response({"error": "Insufficient stock"}, status=status.HTTP_400_BAD_REQUEST)
+        if not items:
+            return Response({"detail": "No Product matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(CartItemSerializer(items[0]).data, status=status.HTTP_201_CREATED)
 
-        return Response(self.get_serializer(cart_item).data, status=status.HTTP_201_CREATED)
-    
     def delete(self, request):
-        product_id = request.data.get("product_id")
-        cart_item = get_object_or_404(CartItem, cart=self.request.user.cart, product_id=product_id)
-        cart_item.delete()
+        # The body may be any JSON value, such as a list.
+        if not isinstance(request.data, dict):
+            return Response({"detail": "Expected a JSON object."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            product_id = int(request.data.get("product_id"))
+        except (TypeError, ValueError):
+            product_id = None
+        deleted = product_id is not None and CartItem.objects.remove(request.user.id, [product_id])
+        if not deleted:
+            return Response({"detail": "No CartItem matches the given query."}, status=status.HTTP_404_NOT_FOUND)
         return Response({"detail": "Item removed from cart"}, status=status.HTTP_204_NO_CONTENT)
 
-class UserOrderView(generics.GenericAPIView):
+class UserCartBatchView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
+    serializer_class = CartBatchSerializer
 
-    @transaction.atomic
     def post(self, request):
-        cart_items = Cart.objects.select_related("product").filter(user=request.user).select_for_update()
+        """Apply a list of add/set/remove operations and return the cart."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            CartItem.objects.apply(request.user.id, serializer.validated_data["operations"])
+        except InsufficientStock:
+            return Response({"error": "Insufficient stock"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not cart_items.exists():
-            return Response({"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Build product_id → (product, quantity) mapping
-        product_map = {item.product.id: item for item in cart_items}
-
-        # Stock check
-        for p in product_map.values():
-            if p.product.stock < p.quantity:
-                return Response(
-                    {"error": f"Insufficient stock for product {p.product.name}"},
-                    status=status.HTTP_400_BAD_REQUEST
+        cart = get_object_or_404(Cart.objects.select_related("user").with_items(), user_id=request.user.id)
+        return Response(UserCartSerializer(cart).data, status=status.HTTP_200_OK)
+
+class UserOrderQuerysetMixin:
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Two queries whatever the page holds: the orders, then all of their
+        # lines with the product names joined in.
+        lines = OrderItem.objects.select_related("product").only(
+            "order_id", "product_id", "product__name", "quantity", "price", "line_total"
+        )
+        return (
+            Order.objects.filter(user_id=self.request.user.id)
+            .select_related("user")
+            .prefetch_related(Prefetch("items", queryset=lines.order_by("id")))
+        )
+
+
+class UserOrderView(ReplicaReadMixin, UserOrderQuerysetMixin, generics.ListAPIView):
+    pagination_class = OrderHistoryPagination
+
+    def post(self, request):
+        """Turn the user's cart into an order."""
+        with transaction.atomic():
+            # Locks the cart, which serializes concurrent checkouts of it
+            # without touching any row shared with other users.
+            cart_id = Cart.objects.touch(request.user.id)
+            if cart_id is None:
+                return Response({"detail": "No Cart matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+            cart_items = list(CartItem.objects.filter(cart_id=cart_id).values_list(
+                "id", "product_id", "quantity", "product__shards", "product__price", "product__name"
+            ))
+            if not cart_items:
+                return Response({"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST)
+
+            quantities = defaultdict(int)
+            sharded = {}
+            for _, product_id, quantity, shards, price, name in cart_items:
+                quantities[product_id] += quantity
+                if shards:
+                    sharded[product_id] = (price, name)
+            plain = {pid: qty for pid, qty in quantities.items() if pid not in sharded}
+            prices = {pid: price for pid, (price, _) in sharded.items()}
+
+            if plain:
+                # Units this cart already holds are counted in ``reserved`` but
+                # are available to it. The holds are locked before the products,
+                # as ``StockHold.objects.hold`` and ``release_expired`` do, so an
+                # expiring hold is either released first or not at all.
+                held = dict(
+                    StockHold.objects.select_for_update()
+                    .filter(cart_id=cart_id, product_id__in=plain)
+                    .order_by("product_id")
+                    .values_list("product_id", "quantity")
                 )
 
-        # Calculate total price
-        total_price = Sum(p.product.price * p.quantity for p in product_map.values())
-        order = Order.objects.create(user=request.user, total_price=total_price)
-        
-        # Create order items in one query
-        OrderItem.objects.bulk_create([
-            OrderItem(
-                order=order,
-                product=p.product,
-                quantity=p.quantity,
-                price=p.product.price
-            )
-            for p in product_map.values()
-        ])
-
-        # Bulk stock update in one query
-        Product.objects.filter(id__in=product_map.keys()).update(
-            stock=Case(
-                *[
-                    When(id=pid, then=F('stock') - item.quantity)
-                    for pid, item in product_map.items()
-                ],
-                output_field=PositiveIntegerField()
+                # Lock the products in id order so that checkouts sharing
+                # products always queue up instead of deadlocking.
+                locked = {
+                    pid: (price, stock - reserved + held.get(pid, 0), name)
+                    for pid, price, stock, reserved, name in Product.objects.select_for_update()
+                    .filter(id__in=plain)
+                    .order_by("id")
+                    .values_list("id", "price", "stock", "reserved", "name")
+                }
+                short = [name for pid, (_, available, name) in locked.items() if available < plain[pid]]
+                if short:
+                    return Response(
+                        {"error": f"Insufficient stock for product {', '.join(short)}"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                prices.update((pid, price) for pid, (price, _, _) in locked.items())
+
+                # Take the stock and drop this cart's holds in one statement. A
+                # row is only updated while it still has enough stock, so a
+                # short count means we would oversell.
+                in_stock = reduce(or_, (
+                    Q(id=pid, stock__gte=F("reserved") - held.get(pid, 0) + qty)
+                    for pid, qty in plain.items()
+                ))
+                reserved = Product.objects.filter(in_stock).update(
+                    stock=Case(
+                        *[When(id=pid, then=F("stock") - qty) for pid, qty in plain.items()],
+                        output_field=PositiveIntegerField(),
+                    ),
+                    reserved=Case(
+                        *[When(id=pid, then=F("reserved") - held.get(pid, 0)) for pid in plain],
+                        output_field=PositiveIntegerField(),
+                    ),
+                )
+                if reserved != len(plain):
+                    transaction.set_rollback(True)
+                    return Response({"error": "Insufficient stock"}, status=status.HTTP_400_BAD_REQUEST)
+                if held:
+                    StockHold.objects.filter(cart_id=cart_id, product_id__in=held).delete()
+
+            # Sharded products never lock their product row; see InventoryShard.
+            for pid in sorted(sharded):
+                if not InventoryShard.objects.take(pid, quantities[pid]):
+                    transaction.set_rollback(True)
+                    return Response(
+                        {"error": f"Insufficient stock for product {sharded[pid][1]}"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+            order = Order.objects.create(
+                user_id=request.user.id,
+                total_price=sum(prices[pid] * qty for pid, qty in quantities.items()),
             )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, product_id=pid, quantity=qty, price=prices[pid], line_total=prices[pid] * qty,
+                    created_at=order.created_at,
+                )
+                for pid, qty in quantities.items()
+            ])
+
+            CartItem.objects.filter(id__in=[item[0] for item in cart_items]).delete()
+            # Sharded products were invalidated by ``take``.
+            invalidate_on_commit(Product, plain)
+            publish_order_placed(order.order_id)
+
+        return Response(
+            {"message": "Order placed successfully", "order_id": str(order.order_id)},
+            status=status.HTTP_201_CREATED
         )
 
-        # Clear User cart
-        cart_items.delete()
 
-        return Response({"message": "Order placed successfully", "order_id": str(order.order_id)})
+class UserOrderDetailView(ReplicaReadMixin, UserOrderQuerysetMixin, generics.RetrieveAPIView):
+    lookup_field = "order_id"
+
+
+class SalesReportView(generics.ListAPIView):
+    """
+    Units and revenue per product or category and hour or day.
+
+    Served from the rollup tables only; orders placed in the last
+    ``SALES_ROLLUP_LAG`` seconds, or since the last rollup run, are not in it yet.
+    """
+
+    permission_classes = [IsAdminUser]
+    pagination_class = SalesReportPagination
+
+    def list(self, request, *args, **kwargs):
+        params = SalesReportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        self.params = params.validated_data
+        return super().list(request, *args, **kwargs)
+
+    def get_serializer_class(self):
+        return ProductSalesSerializer if self.params["by"] == "product" else CategorySalesSerializer
+
+    def get_queryset(self):
+        params = self.params
+        model = ProductSales if params["by"] == "product" else CategorySales
+        queryset = model.objects.filter(period=params["period"])
+        if "start" in params:
+            queryset = queryset.filter(bucket__gte=params["start"])
+        if "end" in params:
+            queryset = queryset.filter(bucket__lt=params["end"])
+        if "product" in params:
+            queryset = queryset.filter(product_id=params["product"])
+        if "category" in params:
+            queryset = queryset.filter(category_id=params["category"])
+        return queryset
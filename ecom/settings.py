@@ -10,14 +10,21 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+# DJANGO_ENV=production switches to the production profile at the end of
+# this file.
+
+DJANGO_ENV = os.environ.get("DJANGO_ENV", "development")
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = "django-insecure-7%&^4nl8xq1^l6-hb-bw#(w6+52db0u^#u$9qfp85)&4+n#n(e"
@@ -37,19 +44,23 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_simplejwt",
     "api",
 ]
 
 MIDDLEWARE = [
+    "api.profiling.QueryProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "api.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.routers.ReplicaPinMiddleware",
 ]
 
 ROOT_URLCONF = "ecom.urls"
@@ -82,19 +93,193 @@ DATABASES = {
         # "ENGINE": "django.db.backends.sqlite3",
         # "NAME": BASE_DIR / "db.sqlite3",
         "ENGINE": "django.db.backends.postgresql",
-        "NAME": "ecom_db",
-        "USER": "postgres",
-        "PASSWORD": "postgres",
-        "HOST": "127.0.0.1",
-        "PORT": 5432
+        "NAME": os.environ.get("DB_NAME", "ecom_db"),
+        "USER": os.environ.get("DB_USER", "postgres"),
+        "PASSWORD": os.environ.get("DB_PASSWORD", "postgres"),
+        "HOST": os.environ.get("DB_HOST", "127.0.0.1"),
+        "PORT": os.environ.get("DB_PORT", 5432)
 
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The catalog cache uses Redis when REDIS_URL is set (configure the server
+# with an LRU maxmemory-policy) and falls back to the per-process LRU cache,
+# which is only fit for a single development process: the production profile
+# requires REDIS_URL.
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+# Login throttles count attempts in their own cache, which must never evict
+# keys (an evicted counter resets its limit): point THROTTLE_REDIS_URL at a
+# Redis with maxmemory-policy noeviction, such as another db of the broker's.
+THROTTLE_REDIS_URL = os.environ.get("THROTTLE_REDIS_URL")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    } if REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catalog",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": THROTTLE_REDIS_URL,
+    } if THROTTLE_REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "throttle",
+    },
+}
+
+CATALOG_CACHE_ALIAS = "catalog"
+
+CATALOG_CACHE_TIMEOUT = 300
+
+THROTTLE_CACHE_ALIAS = "throttle"
+
+# Product pages of at least this many rows (and unpaginated product lists)
+# are streamed from a server-side cursor, STREAMING_LIST_CHUNK_SIZE rows at
+# a time, instead of being built in memory.
+STREAMING_LIST_MIN_ROWS = 200
+STREAMING_LIST_CHUNK_SIZE = 200
+
+# Smaller buffered responses are sent uncompressed; streamed ones are
+# flushed to the client every COMPRESSION_FLUSH_SIZE bytes of input.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_FLUSH_SIZE = 64 * 1024
+
+# Celery
+# Without a broker, tasks run eagerly inside the calling process. The broker
+# must not evict keys (maxmemory-policy noeviction), so it cannot share a
+# Redis server with the catalog cache.
+
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL")
+
+CELERY_TASK_ALWAYS_EAGER = not CELERY_BROKER_URL
+
+CELERY_TASK_IGNORE_RESULT = True
+
+CELERY_BEAT_SCHEDULE = {
+    "release-expired-holds": {
+        "task": "api.tasks.release_expired_holds",
+        "schedule": 30.0,
+    },
+    "roll-up-sales": {
+        "task": "api.tasks.roll_up_sales",
+        "schedule": 60.0,
+    },
+    "process-order-events": {
+        "task": "api.tasks.process_placed_orders",
+        "schedule": 60.0,
+    },
+    "create-order-partitions": {
+        "task": "api.tasks.create_order_partitions",
+        "schedule": 24 * 60 * 60.0,
+    },
+}
+
+# Order-placed events wait in the outbox for up to ORDER_EVENTS_MAX_DELAY
+# seconds, so that checkouts close together are processed in one task, in
+# batches of ORDER_EVENTS_BATCH_SIZE. A worker has ORDER_EVENTS_CLAIM_TIMEOUT
+# seconds to finish a batch before other workers may take it over.
+ORDER_EVENTS_BATCH_SIZE = 20
+
+ORDER_EVENTS_MAX_DELAY = 1.0
+
+ORDER_EVENTS_CLAIM_TIMEOUT = 5 * 60
+
+LOW_STOCK_THRESHOLD = 5
+
+# Most units of one product a cart item may hold.
+CART_ITEM_MAX_QUANTITY = 10_000
+
+# Seconds a cart keeps its stock hold after the item was last changed.
+STOCK_HOLD_TTL = 15 * 60
+
+# Orders join the sales rollups once they are this many seconds old, so that
+# checkouts still committing are not passed by the high-water mark.
+SALES_ROLLUP_LAG = 120
+
+# Seconds of order time folded into the rollups per transaction.
+SALES_ROLLUP_CHUNK = 60 * 60
+
+# When set before running migration 0013, orders and order lines are
+# range-partitioned by created_at month; see api.partitions.
+ORDER_PARTITIONING = os.environ.get("ORDER_PARTITIONING", "0") == "1"
+
+# Months of empty partitions kept ready ahead of the current one.
+ORDER_PARTITIONS_AHEAD = 3
+
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "orders@localhost")
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'api.authentication.StatelessJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Login attempts are limited before any password is hashed.
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get("LOGIN_IP_RATE", "60/min"),
+        'login_account': os.environ.get("LOGIN_ACCOUNT_RATE", "10/min"),
+    },
+}
+
+SIMPLE_JWT = {
+    "TOKEN_OBTAIN_SERIALIZER": "api.authentication.ClaimsTokenObtainPairSerializer",
+    "TOKEN_USER_CLASS": "api.authentication.ClaimsUser",
+}
+
+# Share of requests whose SQL and serializer cost is recorded (0 disables
+# profiling). Totals are served at /metrics, labelled by process; set
+# METRICS_TOKEN to expose them outside DEBUG.
+QUERY_PROFILING_SAMPLE_RATE = float(os.environ.get("QUERY_PROFILING_SAMPLE_RATE", 0.05))
+
+# Directory the worker processes share their totals through, so /metrics
+# reports every worker whichever one serves it. Without it, each worker
+# reports only its own. gunicorn.conf.py empties it when the server starts.
+QUERY_PROFILING_METRICS_DIR = os.environ.get("QUERY_PROFILING_METRICS_DIR")
+
+# A statement run this many times in one request is reported as an N+1.
+QUERY_PROFILING_REPEAT_THRESHOLD = 5
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Seconds a user's active, staff and superuser flags are trusted before they
+# are re-read.
+AUTH_USER_STATE_CACHE_TIMEOUT = 30
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+# New hashes use PASSWORD_HASHER; hashes from the other hashers still verify
+# and are upgraded on the user's next login. Compare the options with
+# ``manage.py bench_login``.
+
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "api.hashers.TunedArgon2PasswordHasher")
+
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [
+    hasher for hasher in (
+        "api.hashers.TunedArgon2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+        "django.contrib.auth.hashers.ScryptPasswordHasher",
+    ) if hasher != PASSWORD_HASHER
+]
+
+PASSWORD_ARGON2 = {
+    "time_cost": int(os.environ.get("ARGON2_TIME_COST", 2)),
+    "memory_cost": int(os.environ.get("ARGON2_MEMORY_COST", 19456)),  # KiB
+    "parallelism": int(os.environ.get("ARGON2_PARALLELISM", 1)),
 }
 
 # Password validation
@@ -137,3 +322,71 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Production profile
+# https://docs.djangoproject.com/en/5.2/ref/databases/#connection-pool
+
+if DJANGO_ENV == "production":
+    DEBUG = False
+
+    SECRET_KEY = os.environ["SECRET_KEY"]
+
+    ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", "").split(",")
+
+    STATIC_ROOT = BASE_DIR / "staticfiles"
+
+    # Workers must share the catalog cache's version counters, or each one
+    # keeps serving responses another has invalidated.
+    if not REDIS_URL:
+        raise ImproperlyConfigured("REDIS_URL must be set in production; the catalog cache has to be shared.")
+    if not THROTTLE_REDIS_URL:
+        raise ImproperlyConfigured("THROTTLE_REDIS_URL must be set in production; login limits have to be shared.")
+    # Without a broker, tasks would run inside the requests that queue them
+    # and beat's schedule (such as releasing expired holds) would never run.
+    if not CELERY_BROKER_URL:
+        raise ImproperlyConfigured("CELERY_BROKER_URL must be set in production; tasks need a worker and beat.")
+
+    # Each worker process keeps a psycopg pool. Set DB_POOL=0 when a pooler
+    # such as PgBouncer sits in front of Postgres, to fall back to
+    # persistent per-thread connections.
+    # Health checks validate pooled connections on checkout as well.
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+    if os.environ.get("DB_POOL", "1") == "1":
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+                "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+                "max_idle": 300,
+            },
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+
+
+# Read replicas
+# Catalog and order-history reads go to the replica when DB_REPLICA_HOST (or
+# DB_REPLICA_NAME, for a second local database) is set; see api.routers.
+# Otherwise the alias only mirrors the primary and nothing is routed to it.
+
+DATABASES["replica"] = {
+    **DATABASES["default"],
+    "HOST": os.environ.get("DB_REPLICA_HOST", DATABASES["default"]["HOST"]),
+    "NAME": os.environ.get("DB_REPLICA_NAME", DATABASES["default"]["NAME"]),
+    "TEST": {"MIRROR": "default"},
+}
+
+DATABASE_REPLICAS = ["replica"] if os.environ.get("DB_REPLICA_HOST") or os.environ.get("DB_REPLICA_NAME") else []
+
+# The read-your-writes pins and recent-change markers are kept in the catalog
+# cache; a per-process cache would only pin the worker that saw the write.
+if DATABASE_REPLICAS and not REDIS_URL:
+    raise ImproperlyConfigured("REDIS_URL must be set to use read replicas; the catalog cache has to be shared.")
+
+DATABASE_ROUTERS = ["api.routers.ReplicaRouter"]
+
+# Seconds a user keeps reading from the primary after a write; should exceed
+# the usual replication lag.
+REPLICA_PIN_SECONDS = float(os.environ.get("REPLICA_PIN_SECONDS", 5))
@@ -1,16 +1,19 @@
 
 from django.contrib import admin
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenRefreshView
 from django.urls import path, include
 
+from api.profiling import metrics_view
+from api.views import TokenObtainView
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
+    # Opt-in async variants of the catalog and cart endpoints.
+    path("api/async/", include("api.async_urls")),
 
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', TokenObtainView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path("metrics", metrics_view, name="metrics"),
 ]
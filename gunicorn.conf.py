@@ -0,0 +1,46 @@
+"""
+Gunicorn settings for the production profile.
+
+WSGI (default):  gunicorn ecom.wsgi:application -c gunicorn.conf.py
+ASGI:            GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker \\
+                 gunicorn ecom.asgi:application -c gunicorn.conf.py
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+
+# Only used by gthread workers. Keep workers * threads within what the
+# database pools (DB_POOL_MAX_SIZE per worker) can serve.
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+keepalive = 5
+
+timeout = 30
+
+graceful_timeout = 30
+
+# Recycle workers periodically to bound memory growth.
+max_requests = 2000
+
+max_requests_jitter = 200
+
+accesslog = "-"
+
+
+def on_starting(server):
+    # Totals left by an earlier run would be reported as this one's.
+    directory = os.environ.get("QUERY_PROFILING_METRICS_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def worker_exit(server, worker):
+    from api import profiling
+
+    profiling.retire()